@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+from datetime import date, datetime
+
+from database.database import Database
+
+
+class ActivityTracker:
+    """
+    Копит время последней активности пользователей и счётчики событий (поиски, добавления в избранное) в памяти
+    и раз в flush_interval секунд пишет всё пачкой вместо UPDATE на каждый клик.
+    Вместе с last_activity ведутся дневные сводки daily_stats и last_seen_days (Database.record_activity),
+    из которых app/stats.py отвечает на вопросы о статистике.
+    """
+
+    def __init__(self, db: Database, flush_interval=10):
+        self.db = db
+        self.flush_interval = flush_interval
+        self._pending = {}
+        # (день, событие) -> число
+        self._counts = {}
+        self._lock = asyncio.Lock()
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def touch(self, user_id):
+        self._pending[user_id] = datetime.now()
+
+    def count(self, event, user_id):
+        """Событие для дневной сводки (searches или favorites); заодно отмечает активность пользователя."""
+        key = (date.today(), event)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self.touch(user_id)
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending and not self._counts:
+                return
+            pending, self._pending = self._pending, {}
+            counts, self._counts = self._counts, {}
+
+            started = time.perf_counter()
+            try:
+                if pending:
+                    await self.db.record_activity(pending)
+            except Exception as e:
+                logging.error(f"Failed to flush last_activity for {len(pending)} users: {e}")
+                # Возвращаем несохранённое, не затирая более свежие отметки
+                for user_id, last_activity in pending.items():
+                    self._pending.setdefault(user_id, last_activity)
+                pending = {}
+            try:
+                if counts:
+                    await self.db.add_daily_counts(counts)
+            except Exception as e:
+                logging.error(f"Failed to flush daily counters {counts}: {e}")
+                for key, count in counts.items():
+                    self._counts[key] = self._counts.get(key, 0) + count
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.flushed_rows += len(pending)
+            self.last_flush_ms = round(elapsed_ms, 2)
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self):
+        return {
+            'buffered': len(self._pending),
+            'buffered_events': sum(self._counts.values()),
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+            'last_flush_ms': self.last_flush_ms,
+            'max_flush_ms': self.max_flush_ms,
+        }
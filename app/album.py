@@ -0,0 +1,145 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
+
+from app.photo_cache import PhotoCache
+
+ACTION_TEXT = "Выберите действие:"
+
+
+class AlbumRenderer:
+    """
+    Перерисовка карточки объекта при листании выдачи без удаления и повторной отправки всего альбома.
+
+    На экране: альбом из album_size фото (подпись - у первого) и следующее за ним сообщение с клавиатурой.
+    Если фото нет - одно текстовое сообщение с карточкой и клавиатурой (album_size = 0).
+    Совпадающие слоты альбома редактируются параллельно, лишние удаляются, недостающие досылаются.
+    """
+
+    def __init__(self, photo_cache: PhotoCache):
+        self.photo_cache = photo_cache
+        self.renders = 0
+        self.api_calls = 0
+        self.fallbacks = 0
+        self.last_api_calls = 0
+
+    async def _call(self, counter, coro):
+        counter[0] += 1
+        try:
+            return await coro
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return None
+            raise
+
+    async def _delete(self, bot, chat_id, message_ids, counter):
+        async def delete(message_id):
+            try:
+                await self._call(counter, bot.delete_message(chat_id, message_id))
+            except TelegramBadRequest as e:
+                logging.warning(f"Message {message_id} not deleted: {e}")
+
+        await asyncio.gather(*(delete(message_id) for message_id in message_ids))
+
+    async def _send_photos(self, bot, chat_id, media, counter):
+        """send_media_group принимает от 2 до 10 фото - одно отправляем обычным send_photo."""
+        if len(media) > 1:
+            return await self._call(counter, bot.send_media_group(chat_id, media=media))
+        photo = media[0]
+        return [await self._call(counter, bot.send_photo(chat_id, photo=photo.media, caption=photo.caption,
+                                                         parse_mode=photo.parse_mode))]
+
+    async def _send_new(self, bot, chat_id, property_id, photos, media, caption, markup, counter):
+        if photos:
+            album = await self._send_photos(bot, chat_id, media, counter)
+            await self.photo_cache.remember(property_id, photos, album)
+            action = await self._call(counter, bot.send_message(chat_id, ACTION_TEXT, reply_markup=markup))
+            return [msg.message_id for msg in album] + [action.message_id], len(album)
+
+        action = await self._call(counter, bot.send_message(chat_id, caption, parse_mode=ParseMode.HTML,
+                                                            reply_markup=markup))
+        return [action.message_id], 0
+
+    async def _edit(self, bot, chat_id, old_ids, album_size, property_id, photos, media, caption, markup, counter):
+        old_album, action_id = old_ids[:album_size], old_ids[-1]
+
+        if not photos:
+            # Карточка без фото: альбом убираем, текст и клавиатуру пишем в сообщение действий
+            await asyncio.gather(
+                self._delete(bot, chat_id, old_album, counter),
+                self._call(counter, bot.edit_message_text(caption, chat_id=chat_id, message_id=action_id,
+                                                          parse_mode=ParseMode.HTML, reply_markup=markup)),
+            )
+            return [action_id], 0
+
+        if not old_album:
+            # Раньше была текстовая карточка - альбом перед ней не вставить, отправляем заново
+            await self._delete(bot, chat_id, [action_id], counter)
+            return await self._send_new(bot, chat_id, property_id, photos, media, caption, markup, counter)
+
+        kept = min(len(media), len(old_album))
+        grows = len(media) > len(old_album)
+
+        tasks = [
+            self._call(counter, bot.edit_message_media(media=media[i], chat_id=chat_id, message_id=old_album[i]))
+            for i in range(kept)
+        ]
+        tasks.append(self._delete(bot, chat_id, old_album[kept:], counter))
+        if grows:
+            # Новые фото окажутся после клавиатуры - переносим её в конец
+            tasks.append(self._delete(bot, chat_id, [action_id], counter))
+        else:
+            tasks.append(self._call(counter, bot.edit_message_reply_markup(chat_id=chat_id, message_id=action_id,
+                                                                           reply_markup=markup)))
+        results = await asyncio.gather(*tasks)
+        await self.photo_cache.remember(property_id, photos[:kept], results[:kept])
+
+        album_ids = old_album[:kept]
+        if not grows:
+            return album_ids + [action_id], len(album_ids)
+
+        extra = await self._send_photos(bot, chat_id, media[kept:], counter)
+        await self.photo_cache.remember(property_id, photos[kept:], extra)
+        action = await self._call(counter, bot.send_message(chat_id, ACTION_TEXT, reply_markup=markup))
+        album_ids += [msg.message_id for msg in extra]
+        return album_ids + [action.message_id], len(album_ids)
+
+    async def render(self, bot: Bot, chat_id, old_ids, album_size, property_id, photos, caption, markup,
+                     media=None):
+        """
+        Возвращает (message_ids, album_size) для сохранения в FSM.
+        media - альбом, заранее собранный через PhotoCache.media_group (например, предвыборкой страниц).
+        """
+        counter = [0]
+        if photos and media is None:
+            media = await self.photo_cache.media_group(property_id, photos, caption=caption)
+        try:
+            if old_ids and album_size is not None and album_size < len(old_ids):
+                result = await self._edit(bot, chat_id, old_ids, album_size, property_id, photos, media, caption,
+                                          markup, counter)
+            else:
+                await self._delete(bot, chat_id, old_ids or [], counter)
+                result = await self._send_new(bot, chat_id, property_id, photos, media, caption, markup, counter)
+        except TelegramBadRequest as e:
+            logging.error(f"Error editing media group, sending a new one: {e}")
+            self.fallbacks += 1
+            await self._delete(bot, chat_id, old_ids or [], counter)
+            result = await self._send_new(bot, chat_id, property_id, photos, media, caption, markup, counter)
+
+        self.renders += 1
+        self.api_calls += counter[0]
+        self.last_api_calls = counter[0]
+        logging.debug(f"Property page rendered with {counter[0]} Bot API calls")
+        return result
+
+    def stats(self):
+        return {
+            'renders': self.renders,
+            'api_calls': self.api_calls,
+            'api_calls_per_render': round(self.api_calls / self.renders, 2) if self.renders else 0.0,
+            'last_api_calls': self.last_api_calls,
+            'fallbacks': self.fallbacks,
+        }
@@ -0,0 +1,197 @@
+import bisect
+import logging
+
+from app.broadcast import Broadcaster
+from database.database import Database
+from database.properties import RENT_TYPE_VALUES, parse_price_range
+
+
+def normalize_filter(search_filter):
+    """Фильтр поиска в каноническом виде: списки отсортированы, чтобы одинаковые подписки совпадали."""
+    return {
+        facet: sorted(value) if isinstance(value, list) else value
+        for facet, value in search_filter.items()
+    }
+
+
+def describe_filter(search_filter):
+    """Короткое описание сохранённого поиска для списка подписок."""
+    parts = []
+    if search_filter.get('rent_type'):
+        parts.append(search_filter['rent_type'])
+    for facet in ('property_types', 'locations'):
+        if search_filter.get(facet):
+            parts.append(", ".join(search_filter[facet]))
+    if search_filter.get('bedrooms'):
+        parts.append(f"спален от {min(map(int, search_filter['bedrooms']))}")
+    if search_filter.get('bathrooms'):
+        parts.append(f"ванных от {min(map(int, search_filter['bathrooms']))}")
+    if search_filter.get('price_range'):
+        parts.append(f"{search_filter['price_range']}฿")
+    return "; ".join(parts) or "все объекты"
+
+
+def render_new_properties_digest(new_properties):
+    message_text = "Новые объекты недвижимости:\n\n"
+    for property in new_properties:
+        message_text += (
+            f"🏠 <b>{property['name']}</b>\n"
+            f"📍 <b>Расположение:</b> {property['location']}\n"
+            f"🌊 <b>Удаленность от моря:</b> {property['distance_to_sea']} метров\n"
+            f"💰 <b>Стоимость в месяц:</b> {property['monthly_price']}฿\n"
+            "-----------------------\n"
+        )
+    return message_text
+
+
+class SubscriptionIndex:
+    """
+    Индекс сохранённых поисков по фасетам - обратная сторона SearchIndex.
+    Подписки пронумерованы, для каждого значения фасета хранится битовая маска подписок, которые его принимают,
+    и отдельно маска подписок без ограничения по этому фасету. Новый объект сверяется AND-ом масок по фасетам,
+    так что стоимость сопоставления зависит от числа фасетов и значений, а не от числа подписчиков.
+    Условия те же, что у SearchIndex и build_search_conditions: подписка получит ровно то, что нашёл бы поиск.
+    """
+
+    FACETS = ('rent_type', 'property_types', 'locations', 'bedrooms', 'bathrooms', 'price_range')
+
+    def __init__(self, subscriptions):
+        """subscriptions - словари с ключами search_id, user_id, search_filter."""
+        self.subscriptions = list(subscriptions)
+        self.all = (1 << len(self.subscriptions)) - 1
+        self._any = dict.fromkeys(self.FACETS, 0)
+        self._rent_types = {}
+        self._types = {}
+        self._locations = {}
+        thresholds = {'bedrooms': {}, 'bathrooms': {}}
+        self._prices = {}
+
+        for rank, subscription in enumerate(self.subscriptions):
+            bit = 1 << rank
+            search_filter = subscription['search_filter']
+
+            rent_type = search_filter.get('rent_type')
+            if not rent_type:
+                self._any['rent_type'] |= bit
+            for value in RENT_TYPE_VALUES.get(rent_type, ()) if rent_type else ():
+                self._rent_types[value] = self._rent_types.get(value, 0) | bit
+
+            for facet, masks in (('property_types', self._types), ('locations', self._locations)):
+                selected = search_filter.get(facet)
+                if not selected:
+                    self._any[facet] |= bit
+                for value in selected or ():
+                    key = value.strip().lower()
+                    masks[key] = masks.get(key, 0) | bit
+
+            for facet in ('bedrooms', 'bathrooms'):
+                selected = search_filter.get(facet)
+                if not selected:
+                    self._any[facet] |= bit
+                    continue
+                threshold = min(map(int, selected))
+                thresholds[facet][threshold] = thresholds[facet].get(threshold, 0) | bit
+
+            price_range = search_filter.get('price_range')
+            if not price_range:
+                self._any['price_range'] |= bit
+            else:
+                self._prices[price_range] = self._prices.get(price_range, 0) | bit
+
+        # "от N": объект с b спальнями подходит всем подпискам с порогом <= b - храним накопленные маски
+        self._thresholds = {}
+        for facet, masks in thresholds.items():
+            keys = sorted(masks)
+            cumulative = []
+            mask = 0
+            for key in keys:
+                mask |= masks[key]
+                cumulative.append(mask)
+            self._thresholds[facet] = (keys, cumulative)
+        self._price_bounds = [(parse_price_range(price_range), mask) for price_range, mask in self._prices.items()]
+
+    def _threshold_mask(self, facet, value):
+        keys, cumulative = self._thresholds[facet]
+        position = bisect.bisect_right(keys, value) - 1
+        return cumulative[position] if position >= 0 else 0
+
+    def match(self, property):
+        """Маска подписок, которым подходит объект (строка properties)."""
+        mask = self.all
+        mask &= self._any['rent_type'] | self._rent_types.get(property.get('rent_type'), 0)
+        if mask:
+            property_type = (property.get('property_type') or '').strip().lower()
+            mask &= self._any['property_types'] | self._types.get(property_type, 0)
+        if mask:
+            location = (property.get('location') or '').strip().lower()
+            mask &= self._any['locations'] | self._locations.get(location, 0)
+        for facet in ('bedrooms', 'bathrooms'):
+            if mask:
+                mask &= self._any[facet] | self._threshold_mask(facet, property.get(facet) or 0)
+        if mask:
+            price = property.get('monthly_price') or 0
+            price_mask = self._any['price_range']
+            for (min_price, max_price), range_mask in self._price_bounds:
+                if min_price <= price <= max_price:
+                    price_mask |= range_mask
+            mask &= price_mask
+        return mask
+
+    def matches(self, property):
+        mask = self.match(property)
+        matched = []
+        while mask:
+            low = mask & -mask
+            matched.append(self.subscriptions[low.bit_length() - 1])
+            mask ^= low
+        return matched
+
+
+def match_new_properties(subscriptions, new_properties):
+    """{user_id: [объекты]} - каждому пользователю только то, что подошло хотя бы к одной его подписке."""
+    index = SubscriptionIndex(subscriptions)
+    per_user = {}
+    for property in new_properties:
+        for subscription in index.matches(property):
+            matched = per_user.setdefault(subscription['user_id'], [])
+            if not matched or matched[-1] is not property:
+                matched.append(property)
+    return per_user
+
+
+async def send_property_alerts(broadcaster: Broadcaster, db: Database, new_properties, notified_at):
+    """
+    Рассылает подписчикам подошедшие им новые объекты. Пользователи с одинаковым набором совпадений
+    получают одно и то же сообщение одним вызовом broadcast.
+    Подписки читаются пачками и сверяются по мере чтения: в памяти остаются только id совпавших объектов
+    по пользователям. Рассылка начинается после чтения - серверный курсор не держится открытым во время отправки.
+    notified_at - отметка прогона: получившим рассылку она пишется в last_notified, и при продолжении прерванного
+    прогона они пропускаются. Пользователей, которым писал предыдущий прогон, отметка не отсекает, даже если
+    он был меньше суток назад.
+    """
+    subscriptions = 0
+    per_user = {}
+    async for batch in db.iter_alert_subscriptions(notified_at):
+        subscriptions += len(batch)
+        # Поиски одного пользователя могут попасть в разные пачки - совпадения объединяем
+        for user_id, matched in match_new_properties(batch, new_properties).items():
+            per_user.setdefault(user_id, set()).update(property['property_id'] for property in matched)
+
+    by_id = {property['property_id']: property for property in new_properties}
+    position = {property_id: number for number, property_id in enumerate(by_id)}
+    groups = {}
+    for user_id, property_ids in per_user.items():
+        key = tuple(sorted(property_ids, key=position.__getitem__))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = ([by_id[property_id] for property_id in key], [])
+        group[1].append(user_id)
+
+    stats = {'subscriptions': subscriptions, 'users': len(per_user), 'total': 0, 'sent': 0, 'failed': 0}
+    for matched, user_ids in groups.values():
+        group_stats = await broadcaster.broadcast(user_ids, render_new_properties_digest(matched),
+                                                  notified_at=notified_at)
+        for name in ('total', 'sent', 'failed'):
+            stats[name] += group_stats[name]
+    logging.info(f"Property alerts: {len(new_properties)} new properties, {stats}")
+    return stats
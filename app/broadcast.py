@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from database.database import Database
+
+
+class RateLimiter:
+    """Равномерно распределяет вызовы: не чаще rate в секунду."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        """Сдвигает все следующие слоты (после RetryAfter от Telegram)."""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class Broadcaster:
+    """
+    Рассылка одного и того же сообщения пачке пользователей.
+    Соблюдает лимиты Telegram (~30 сообщений/с всего и 1 сообщение/с в один чат),
+    а last_notified обновляет одним UPDATE на батч.
+    """
+
+    def __init__(self, bot: Bot, db: Database, workers=10, global_rate=30, per_chat_interval=1.0,
+                 batch_size=100, max_retries=3):
+        self.bot = bot
+        self.db = db
+        self.workers = workers
+        self.limiter = RateLimiter(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._last_sent = {}
+
+    async def _wait_chat(self, chat_id):
+        last_sent = self._last_sent.get(chat_id)
+        if last_sent is not None:
+            delay = last_sent + self.per_chat_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def _prune_last_sent(self):
+        """Отметки старше per_chat_interval уже не задерживают отправку - без очистки словарь растёт с каждым чатом."""
+        now = time.monotonic()
+        expired = [chat_id for chat_id, last_sent in self._last_sent.items()
+                   if last_sent + self.per_chat_interval <= now]
+        for chat_id in expired:
+            del self._last_sent[chat_id]
+
+    async def _send(self, chat_id, text, parse_mode):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_chat(chat_id)
+            await self.limiter.wait()
+            try:
+                await self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+                self._last_sent[chat_id] = time.monotonic()
+                return True
+            except TelegramRetryAfter as e:
+                logging.warning(f"Broadcast flood control, retry after {e.retry_after}s (chat {chat_id})")
+                self.limiter.pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                logging.info(f"Broadcast skipped user {chat_id}: {e}")
+                return False
+            except Exception as e:
+                logging.error(f"Error sending message to user {chat_id}: {e}")
+                return False
+        return False
+
+    async def _mark_notified(self, user_ids, notified_at):
+        if not user_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        query = f"UPDATE users SET last_notified = %s WHERE user_id IN ({placeholders})"
+        await self.db.execute_query(query, (notified_at, *user_ids))
+
+    async def broadcast(self, user_ids, text, parse_mode=ParseMode.HTML, notified_at=None):
+        started = time.monotonic()
+        queue = asyncio.Queue()
+        for user_id in user_ids:
+            queue.put_nowait(user_id)
+
+        stats = {'total': queue.qsize(), 'sent': 0, 'failed': 0}
+        delivered = []
+        flush_lock = asyncio.Lock()
+
+        async def flush(force=False):
+            async with flush_lock:
+                if notified_at is None or not delivered or (len(delivered) < self.batch_size and not force):
+                    return
+                batch = delivered[:]
+                delivered.clear()
+                try:
+                    await self._mark_notified(batch, notified_at)
+                except Exception as e:
+                    logging.error(f"Failed to update last_notified for {len(batch)} users: {e}")
+
+        async def worker():
+            while True:
+                try:
+                    user_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if await self._send(user_id, text, parse_mode):
+                    stats['sent'] += 1
+                    delivered.append(user_id)
+                    await flush()
+                else:
+                    stats['failed'] += 1
+
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+        await flush(force=True)
+        self._prune_last_sent()
+
+        elapsed = time.monotonic() - started
+        stats['seconds'] = round(elapsed, 2)
+        stats['per_second'] = round(stats['sent'] / elapsed, 2) if elapsed > 0 else 0.0
+        logging.info(f"Broadcast finished: {stats}")
+        return stats
@@ -0,0 +1,209 @@
+"""
+Протокол callback_data: короткий тег и упакованные поля через ':' (не больше 64 байт, лимит Telegram).
+Например, "fa:7pg" - добавить в избранное объект 9988 (числа в base36), "tt:villa:1" - отметить тип "villa".
+
+Данные разбираются один раз фильтром единственного обработчика роутера table.router, настоящий обработчик
+находится по тегу в таблице, а поля приходят в него именованными аргументами (property_id, page, value, add).
+Роутер подключается к диспетчеру как обычный, поэтому внутренние middleware и фильтры уровня диспетчера
+срабатывают для обработчиков таблицы так же, как для остальных.
+Старые строки вида "fav_123" / "toggle_type|villa|add" с уже отправленных клавиатур тоже понимаются.
+"""
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import CallbackQuery
+
+MAX_CALLBACK_DATA = 64
+SEPARATOR = ':'
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def pack_int(value):
+    if value < 0:
+        return '-' + pack_int(-value)
+    packed = ''
+    while True:
+        value, digit = divmod(value, 36)
+        packed = DIGITS[digit] + packed
+        if not value:
+            return packed
+
+
+def unpack_int(packed):
+    return int(packed, 36)
+
+
+PACKERS = {
+    int: (pack_int, unpack_int),
+    str: (str, str),
+    bool: (lambda value: '1' if value else '0', lambda packed: packed == '1'),
+}
+
+
+class CallbackSpec:
+    def __init__(self, tag, legacy, *fields):
+        self.tag = tag
+        self.legacy = legacy
+        self.fields = fields
+
+    def pack(self, **values):
+        parts = [self.tag]
+        for name, kind in self.fields:
+            packed = PACKERS[kind][0](values[name])
+            if SEPARATOR in packed:
+                raise ValueError(f"Callback field {name} contains '{SEPARATOR}': {packed!r}")
+            parts.append(packed)
+        data = SEPARATOR.join(parts)
+        if len(data.encode()) > MAX_CALLBACK_DATA:
+            raise ValueError(f"Callback data is longer than {MAX_CALLBACK_DATA} bytes: {data!r}")
+        return data
+
+    def unpack(self, parts):
+        if len(parts) != len(self.fields):
+            return None
+        try:
+            return {name: PACKERS[kind][1](part) for (name, kind), part in zip(self.fields, parts)}
+        except ValueError:
+            return None
+
+    def __repr__(self):
+        return f"CallbackSpec({self.tag!r}, {self.legacy!r})"
+
+
+SPECS = {}
+
+
+def spec(tag, legacy, *fields):
+    if tag in SPECS:
+        raise ValueError(f"Duplicate callback tag: {tag}")
+    SPECS[tag] = CallbackSpec(tag, legacy, *fields)
+    return SPECS[tag]
+
+
+PROPERTY_ID = ('property_id', int)
+OPTION = (('value', str), ('add', bool))
+
+# Главное меню
+START_SEARCH = spec('ss', 'start_search')
+FAVORITES = spec('fv', 'favorites')
+PROFILE = spec('pr', 'profile')
+BEST_PROPERTIES = spec('bp', 'best_properties')
+BACK_TO_MAIN = spec('bm', 'back_to_main')
+
+# Воронка поиска: выбор значения фасета, "продолжить" и "пропустить" на каждом шаге
+SELECT_RENT_TYPE = spec('rt', 'select_rent_type', *OPTION)
+TOGGLE_TYPE = spec('tt', 'toggle_type', *OPTION)
+TOGGLE_DISTRICT = spec('td', 'toggle_district', *OPTION)
+SELECT_BEDS = spec('sb', 'select_beds', *OPTION)
+SELECT_BATHS = spec('sh', 'select_baths', *OPTION)
+SELECT_PRICE = spec('sp', 'select_price', *OPTION)
+CONTINUE_RENT_TYPE = spec('cr', 'continue_rent_type_selection')
+SKIP_RENT_TYPE = spec('kr', 'skip_rent_type_selection')
+CONTINUE_TYPE = spec('ct', 'continue_type_selection')
+SKIP_TYPE = spec('kt', 'skip_type_selection')
+CONTINUE_DISTRICT = spec('cd', 'continue_district_selection')
+SKIP_DISTRICT = spec('kd', 'skip_district_selection')
+CONTINUE_BEDS = spec('cb', 'continue_beds_selection')
+SKIP_BEDS = spec('kb', 'skip_beds_selection')
+CONTINUE_BATHS = spec('ch', 'continue_baths_selection')
+SKIP_BATHS = spec('kh', 'skip_baths_selection')
+CONTINUE_PRICE = spec('cp', 'continue_price_selection')
+SKIP_PRICE = spec('kp', 'skip_price_selection')
+GO_BACK = spec('gb', 'go_back')
+
+# Выдача
+PREV_PAGE = spec('pp', 'prev_page')
+NEXT_PAGE = spec('np', 'next_page')
+CURRENT_PAGE = spec('cu', 'current_page')
+GO_TO_PAGE = spec('pg', 'page', ('page', int))
+ADD_FAVORITE = spec('fa', 'fav', PROPERTY_ID)
+DETAILS = spec('de', 'details', PROPERTY_ID)
+NOOP = spec('no', 'noop')
+SAVE_SEARCH = spec('sv', 'save_search')
+
+# Избранное
+FAVORITES_PAGE = spec('fq', 'favorites_page', ('page', int))
+SHOW_FAVORITE = spec('sw', 'show', PROPERTY_ID)
+REMOVE_FAVORITE = spec('dl', 'del', PROPERTY_ID)
+BACK_TO_FAVORITES = spec('bf', 'back_to_favorites')
+
+# Профиль
+UPDATE_EMAIL = spec('ue', 'update_email')
+UPDATE_PHONE = spec('up', 'update_phone_number')
+SAVED_SEARCHES = spec('al', 'saved_searches')
+DELETE_SAVED_SEARCH = spec('ad', 'delete_saved_search', ('search_id', int))
+
+LEGACY = {callback_spec.legacy: callback_spec for callback_spec in SPECS.values()}
+
+
+def _decode_legacy(data):
+    callback_spec = LEGACY.get(data)
+    if callback_spec is not None and not callback_spec.fields:
+        return callback_spec, {}
+
+    if '|' in data:
+        # "toggle_type|villa|add"
+        parts = data.split('|')
+        callback_spec = LEGACY.get(parts[0])
+        if callback_spec is not None and callback_spec.fields == OPTION and len(parts) == 3:
+            return callback_spec, {'value': parts[1], 'add': parts[2] == 'add'}
+        return None
+
+    # "fav_123", "page_4"
+    name, _, value = data.rpartition('_')
+    callback_spec = LEGACY.get(name)
+    if callback_spec is not None and len(callback_spec.fields) == 1 and value.isdigit():
+        return callback_spec, {callback_spec.fields[0][0]: int(value)}
+    return None
+
+
+def decode(data):
+    """(CallbackSpec, поля) или None, если данные не из этого протокола (например, aiogram_dialog)."""
+    if not data:
+        return None
+    parts = data.split(SEPARATOR)
+    callback_spec = SPECS.get(parts[0])
+    if callback_spec is not None:
+        values = callback_spec.unpack(parts[1:])
+        if values is not None:
+            return callback_spec, values
+    return _decode_legacy(data)
+
+
+class CallbackTable:
+    """
+    Таблица тег -> обработчик; заменяет последовательную проверку F.data-фильтров во всех роутерах.
+    Вместо них в router один обработчик: его фильтр декодирует callback_data и находит обработчик по тегу,
+    неизвестные данные и теги без обработчика фильтр не пропускает - они идут дальше по роутерам как обычно.
+    """
+
+    def __init__(self, name='callbacks'):
+        self.handlers = {}
+        self.router = Router(name=name)
+        self.router.callback_query(self._match)(self._dispatch)
+
+    def handler(self, callback_spec: CallbackSpec):
+        def register(callback):
+            if callback_spec.tag in self.handlers:
+                raise ValueError(f"Callback {callback_spec} already has a handler")
+            self.handlers[callback_spec.tag] = CallableObject(callback)
+            return callback
+        return register
+
+    async def _match(self, callback_query: CallbackQuery):
+        decoded = decode(callback_query.data)
+        if decoded is None:
+            return False
+        callback_spec, values = decoded
+        target = self.handlers.get(callback_spec.tag)
+        if target is None:
+            return False
+        # callback_spec и callback_handler читает HandlerLabelMiddleware для меток метрик
+        return {**values, 'callback_spec': callback_spec, 'callback_handler': target}
+
+    @staticmethod
+    async def _dispatch(callback_query: CallbackQuery, callback_handler: CallableObject, **data):
+        return await callback_handler.call(callback_query, **data)
+
+
+table = CallbackTable()
+handler = table.handler
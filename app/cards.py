@@ -0,0 +1,93 @@
+SUMMARY = 'summary'
+DETAILS = 'details'
+FAVORITE = 'favorite'
+
+
+def _summary_text(property):
+    return (
+        f"🏠 <b>{property['name']}</b>\n\n"
+        f"📍 <b>Расположение:</b> {property['location']}\n"
+        f"🌊 <b>Удаленность от моря:</b> {property['distance_to_sea']}\n"
+        f"🛏️ <b>Количество спален:</b> {property['bedrooms']}\n"
+        f"🛁 <b>Количество ванных:</b> {property['bathrooms']}\n"
+        f"💵 <b>Залог:</b> {property.get('booking_deposit_fixed', 'Нет данных')}฿\n"
+        f"🔒 <b>Сохраненный депозит:</b> {property.get('security_deposit', 'Нет данных')}฿\n"
+    )
+
+
+def _details_text(property):
+    return (
+        f"🏠 <b>{property['name']}</b>\n\n"
+        f"📍 <b>Расположение:</b> {property['location']}\n"
+        f"🌊 <b>Удаленность от моря:</b> {property['distance_to_sea']}\n"
+        f"🏷️ <b>Категория:</b> {property['property_type']}\n\n"
+        f"💰 <b>Стоимость в месяц:</b> {property['monthly_price']}฿\n"
+        f"💰 <b>Стоимость постуточно:</b> {property['daily_price']}฿\n"
+        f"💵 <b>Залог:</b> {property['booking_deposit_fixed']}฿\n"
+        f"🔒 <b>Сохраненный депозит:</b> {property['security_deposit']}฿\n\n"
+        f"🛏️ <b>Количество спален:</b> {property['bedrooms']}\n"
+        f"🛁 <b>Количество ванных:</b> {property['bathrooms']}\n"
+        f"🏊 <b>Бассейн:</b> {'Да' if property['pool'] else 'Нет'}\n"
+        f"🍴 <b>Кухня:</b> {'Да' if property['kitchen'] else 'Нет'}\n"
+        f"🧹 <b>Уборка:</b> {'Да' if property['cleaning'] else 'Нет'}\n"
+        f"💡 <b>Утилиты:</b> {property['utility_bill']}\n\n"
+        f"📜 <b>Описание:</b> {property['description']}\n\n"
+    )
+
+
+# Карточка в избранном совпадает с подробной, но кэшируется отдельно, чтобы их можно было развести
+TEMPLATES = {
+    SUMMARY: _summary_text,
+    DETAILS: _details_text,
+    FAVORITE: _details_text,
+}
+
+
+class CardCache:
+    """
+    Готовые HTML-карточки объектов по ключу (property_id, вариант) с версией строки - updated_at.
+    Если строка в БД изменилась, версия не совпадёт и карточка перерисуется; каталог дополнительно
+    сбрасывает карточки изменённых и удалённых объектов при обновлении.
+    """
+
+    def __init__(self):
+        self._cards = {}
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, property, variant):
+        key = (property['property_id'], variant)
+        version = property.get('updated_at')
+        cached = self._cards.get(key)
+        if cached is not None and version is not None and cached[0] == version:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        text = TEMPLATES[variant](property)
+        if version is not None:
+            self._cards[key] = (version, text)
+        return text
+
+    def invalidate(self, property_id):
+        for variant in TEMPLATES:
+            self._cards.pop((property_id, variant), None)
+
+    def clear(self):
+        self._cards.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._cards),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+card_cache = CardCache()
+
+
+def render_card(property, variant):
+    return card_cache.render(property, variant)
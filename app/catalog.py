@@ -0,0 +1,180 @@
+import asyncio
+import bisect
+import logging
+import time
+
+from database.database import Database
+from database import properties as queries
+from app.cards import card_cache
+from app.search_index import SearchIndex
+
+
+def sort_key(property):
+    """Порядок выдачи: monthly_price по убыванию, затем property_id по убыванию."""
+    return -(property['monthly_price'] or 0), -property['property_id']
+
+
+class PropertyCatalog:
+    """
+    Каталог объектов в памяти процесса.
+    Загружается при старте, затем догружает изменённые строки по водяному знаку updated_at.
+    Данные не старше max_staleness секунд; при enabled=False все запросы идут в БД.
+    """
+
+    def __init__(self, db: Database, enabled=True, max_staleness=60):
+        self.db = db
+        self.enabled = enabled
+        self.max_staleness = max_staleness
+        self._properties = {}
+        self._sorted = []
+        self.index = SearchIndex([])
+        self._watermark = None
+        self._ratings_state = None
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+        self.version = 0
+
+    def _put(self, property):
+        property['_type'] = (property.get('property_type') or '').strip().lower()
+        property['_location'] = (property.get('location') or '').strip().lower()
+        self._properties[property['property_id']] = property
+        updated_at = property.get('updated_at')
+        if updated_at and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    def _is_changed(self, row):
+        """Строки с updated_at, равным водяному знаку, приходят при каждом обновлении - сверяем с тем, что есть."""
+        property = self._properties.get(row['property_id'])
+        return property is None or any(property.get(column) != value for column, value in row.items())
+
+    def _rebuild(self):
+        self._sorted = sorted(self._properties.values(), key=sort_key)
+        self.index = SearchIndex(self._sorted)
+        self.version += 1
+
+    async def load(self):
+        if not self.enabled:
+            logging.info("Property catalog is disabled, queries go to the database.")
+            return
+        async with self._lock:
+            rows = await queries.fetch_properties(self.db)
+            self._properties = {}
+            self._watermark = None
+            self._ratings_state = None
+            card_cache.clear()
+            for row in rows:
+                self._put(row)
+            self._rebuild()
+            self._refreshed_at = time.monotonic()
+        logging.info(f"Property catalog loaded: {len(self._properties)} properties")
+
+    async def refresh(self):
+        """
+        Догружает изменения. Индекс пересобирается и version растёт, только если что-то действительно
+        изменилось: иначе предвыборка страниц (PagePrefetcher) теряла бы готовые слоты на каждом тике.
+        """
+        async with self._lock:
+            rows = await queries.fetch_properties(self.db, updated_since=self._watermark) \
+                if self._watermark is not None else await queries.fetch_properties(self.db)
+            changed = [row for row in rows if self._is_changed(row)]
+            for row in changed:
+                self._put(row)
+                card_cache.invalidate(row['property_id'])
+
+            state = await queries.fetch_catalog_state(self.db)
+            deleted = set()
+            # Все новые строки уже в каталоге, поэтому расхождение в числе объектов означает удаления
+            if state['properties'] != len(self._properties):
+                deleted = set(self._properties) - await queries.fetch_property_ids(self.db)
+                for property_id in deleted:
+                    del self._properties[property_id]
+                    card_cache.invalidate(property_id)
+
+            rated = 0
+            ratings_state = (state['ratings'], state['ratings_updated_at'])
+            if ratings_state != self._ratings_state:
+                ratings = await queries.fetch_ratings(self.db)
+                for property_id, property in self._properties.items():
+                    avg_rating = ratings.get(property_id)
+                    if property.get('avg_rating') != avg_rating:
+                        property['avg_rating'] = avg_rating
+                        # Рейтинг не меняет updated_at объекта - карточку сбрасываем сами
+                        card_cache.invalidate(property_id)
+                        rated += 1
+                self._ratings_state = ratings_state
+
+            if changed or deleted or rated:
+                self._rebuild()
+                logging.info(f"Property catalog refreshed: {len(changed)} changed, {len(deleted)} deleted, "
+                             f"{rated} ratings updated")
+            self._refreshed_at = time.monotonic()
+
+    async def ensure_fresh(self):
+        # Если обновление уже идёт, не ждём его - отдаём текущие данные
+        if time.monotonic() - self._refreshed_at > self.max_staleness and not self._lock.locked():
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Лучше отдать немного устаревшие данные, чем ошибку пользователю
+                logging.error(f"Property catalog refresh failed: {e}")
+
+    async def run_refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.max_staleness / 2)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"Property catalog refresh failed: {e}")
+
+    async def search(self, search_filter):
+        await self.ensure_fresh()
+        return self.index.search(search_filter)
+
+    async def count(self, search_filter):
+        if not self.enabled:
+            return await queries.count_properties(self.db, search_filter)
+        await self.ensure_fresh()
+        return self.index.count(search_filter)
+
+    async def facet_counts(self, search_filter, facet, values):
+        """Счётчики для кнопок фильтра; без каталога не считаем, чтобы не делать лишних запросов."""
+        if not self.enabled:
+            return None
+        await self.ensure_fresh()
+        return self.index.facet_counts(search_filter, facet, values)
+
+    async def page(self, search_filter, keyset=None, direction='next'):
+        if not self.enabled:
+            return await queries.fetch_property_page(self.db, search_filter, keyset, direction)
+
+        results = await self.search(search_filter)
+        if keyset is None:
+            return results[0] if results else None
+
+        price, property_id = keyset
+        position = (-price, -property_id)
+        if direction == 'next':
+            index = bisect.bisect_right(results, position, key=sort_key)
+        else:
+            index = bisect.bisect_left(results, position, key=sort_key) - 1
+        return results[index] if 0 <= index < len(results) else None
+
+    async def at(self, search_filter, offset):
+        if not self.enabled:
+            return await queries.fetch_property_at(self.db, search_filter, offset)
+        results = await self.search(search_filter)
+        return results[offset] if 0 <= offset < len(results) else None
+
+    async def get(self, property_id):
+        if not self.enabled:
+            return await queries.fetch_property(self.db, property_id)
+        await self.ensure_fresh()
+        return self._properties.get(property_id)
+
+    async def names(self, property_ids):
+        """{property_id: name} для объектов, которые ещё есть в каталоге."""
+        if not self.enabled:
+            return await queries.fetch_property_names(self.db, property_ids)
+        await self.ensure_fresh()
+        return {property_id: self._properties[property_id]['name']
+                for property_id in property_ids if property_id in self._properties}
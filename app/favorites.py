@@ -0,0 +1,90 @@
+import time
+
+from app.catalog import PropertyCatalog
+from database import properties as queries
+from database.database import Database
+
+
+class FavoritesService:
+    """
+    Избранное пользователей: множество id объектов на пользователя в памяти процесса.
+    Проверка "уже в избранном" отвечается из множества, добавление и удаление пишутся в БД сразу (write-through).
+    Множество загружается при первом обращении и перечитывается не реже раза в ttl секунд -
+    так правки, сделанные другой репликой бота, доходят и сюда. Держим не больше max_users пользователей.
+    """
+
+    def __init__(self, db: Database, catalog: PropertyCatalog, page_size=8, max_users=10000, ttl=300):
+        self.db = db
+        self.catalog = catalog
+        self.page_size = page_size
+        self.max_users = max_users
+        self.ttl = ttl
+        # user_id -> (время загрузки, {property_id: None}) - dict как упорядоченное множество
+        self._sets = {}
+        self.hits = 0
+        self.loads = 0
+        self.duplicates = 0
+
+    async def _ids(self, user_id):
+        cached = self._sets.pop(user_id, None)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            self.hits += 1
+        else:
+            self.loads += 1
+            favorite_ids = await queries.fetch_favorite_ids(self.db, user_id)
+            cached = (time.monotonic(), dict.fromkeys(favorite_ids))
+        # Переставляем в конец: вытесняются давно не заходившие пользователи
+        self._sets[user_id] = cached
+        while len(self._sets) > self.max_users:
+            del self._sets[next(iter(self._sets))]
+        return cached[1]
+
+    async def contains(self, user_id, property_id):
+        return property_id in await self._ids(user_id)
+
+    async def add(self, user_id, property_id):
+        """
+        False, если объект уже в избранном. Повтор из множества в памяти отвечается без запроса к БД;
+        множество может отставать (ttl, другие реплики), поэтому INSERT ещё раз проверяет дубликат в самой БД.
+        """
+        favorite_ids = await self._ids(user_id)
+        if property_id in favorite_ids:
+            self.duplicates += 1
+            return False
+        added = await self.db.add_property_to_favorites(user_id, property_id)
+        favorite_ids[property_id] = None
+        if not added:
+            self.duplicates += 1
+        return added
+
+    async def remove(self, user_id, property_id):
+        await self.db.execute_query("DELETE FROM favorites WHERE user_id = %s AND property_id = %s",
+                                    (user_id, property_id))
+        cached = self._sets.get(user_id)
+        if cached is not None:
+            cached[1].pop(property_id, None)
+
+    async def page(self, user_id, page):
+        """
+        ([(property_id, name), ...], page, pages) для страницы меню избранного.
+        Удалённые из каталога объекты отбрасываются до разбиения на страницы - иначе страница из одних
+        удалённых объектов выглядела бы как пустое избранное. Названия берутся одним запросом (или из каталога).
+        """
+        favorite_ids = list(await self._ids(user_id))
+        names = await self.catalog.names(favorite_ids) if favorite_ids else {}
+        available = [property_id for property_id in favorite_ids if property_id in names]
+        pages = max(1, -(-len(available) // self.page_size))
+        page = min(max(page, 0), pages - 1)
+        start = page * self.page_size
+        visible = available[start:start + self.page_size]
+        return [(property_id, names[property_id]) for property_id in visible], page, pages
+
+    def stats(self):
+        total = self.hits + self.loads
+        return {
+            'users': len(self._sets),
+            'hits': self.hits,
+            'loads': self.loads,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'duplicates': self.duplicates,
+        }
@@ -1,16 +1,18 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo, ReplyKeyboardMarkup, KeyboardButton
 
+import app.callbacks as cb
+
 main = InlineKeyboardMarkup(inline_keyboard=[
     [
-        InlineKeyboardButton(text="🏠 Поиск недвижимости", callback_data="start_search")
+        InlineKeyboardButton(text="🏠 Поиск недвижимости", callback_data=cb.START_SEARCH.pack())
     ],
     [
-        InlineKeyboardButton(text="📌 Избранное", callback_data="favorites")
+        InlineKeyboardButton(text="📌 Избранное", callback_data=cb.FAVORITES.pack())
 
     ],
     [
-        InlineKeyboardButton(text="👤 Профиль", callback_data="profile"),
-        InlineKeyboardButton(text="📸 Блог о Самуи", callback_data="best_properties")
+        InlineKeyboardButton(text="👤 Профиль", callback_data=cb.PROFILE.pack()),
+        InlineKeyboardButton(text="📸 Блог о Самуи", callback_data=cb.BEST_PROPERTIES.pack())
     ],
     [
         InlineKeyboardButton(text="🏝️ Наш сайт", web_app=WebAppInfo(url='https://tropicalsamui.com/'))
@@ -0,0 +1,206 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+
+# Границы корзин гистограмм задержки, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """
+    Реестр метрик процесса: гистограммы задержек и счётчики с метками, плюс коллекторы -
+    функции stats() сервисов, чьи числовые поля отдаются как gauge. render() - текстовый формат Prometheus.
+    """
+
+    def __init__(self, prefix='bot'):
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = []
+
+    def histogram(self, name, help_text, labels=()):
+        self._help[name] = (help_text, labels)
+        self._histograms.setdefault(name, {})
+
+    def counter(self, name, help_text, labels=()):
+        self._help[name] = (help_text, labels)
+        self._counters.setdefault(name, {})
+
+    def observe(self, name, labels, seconds):
+        series = self._histograms[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(seconds)
+
+    def inc(self, name, labels, value=1):
+        series = self._counters[name]
+        series[labels] = series.get(labels, 0) + value
+
+    def add_collector(self, name, stats):
+        """stats() -> dict; числовые значения экспортируются как <prefix>_<name>_<ключ>."""
+        self._collectors.append((name, stats))
+
+    def render(self):
+        lines = []
+        for name, series in self._histograms.items():
+            help_text, label_names = self._help[name]
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{_format_labels(label_names, labels, ('le', bound))} {cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(label_names, labels)} {histogram.sum:.6f}")
+                lines.append(f"{full_name}_count{_format_labels(label_names, labels)} {histogram.count}")
+
+        for name, series in self._counters.items():
+            help_text, label_names = self._help[name]
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} counter")
+            for labels, value in series.items():
+                lines.append(f"{full_name}{_format_labels(label_names, labels)} {value}")
+
+        for name, stats in self._collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                logging.error(f"Metrics collector {name} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    full_name = f"{self.prefix}_{name}_{key}"
+                    lines.append(f"# TYPE {full_name} gauge")
+                    lines.append(f"{full_name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для update: время и ошибки обработчиков с метками router и handler.
+    Для callback_query handler - тег callback_data (start_search, next_page, show, fav, ...),
+    для остальных - имя функции обработчика, которое оставляет HandlerLabelMiddleware.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        metrics.histogram('handler_duration_seconds', "Update handling time", ('router', 'handler'))
+        metrics.counter('handler_errors_total', "Handler exceptions", ('router', 'handler'))
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        route = data['metrics_route'] = {}
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            labels = (route.get('router', 'unhandled'), route.get('handler', event.event_type))
+            self.metrics.observe('handler_duration_seconds', labels, elapsed)
+            if failed:
+                self.metrics.inc('handler_errors_total', labels)
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware: запоминает, какой обработчик какого роутера выбран для события.
+    Для callback_query из таблицы app.callbacks - настоящий обработчик и тег, уже разобранные её фильтром.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        route = data.get('metrics_route')
+        handler_object = data.get('callback_handler') or data.get('handler')
+        if route is not None and handler_object is not None:
+            callback = handler_object.callback
+            route['router'] = getattr(callback, '__module__', '').rpartition('.')[2] or 'unknown'
+            callback_spec = data.get('callback_spec')
+            route['handler'] = callback_spec.legacy if callback_spec is not None \
+                else getattr(callback, '__name__', type(callback).__name__)
+        return await handler(event, data)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки каждого вызова Bot API по методу."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        metrics.histogram('api_request_duration_seconds', "Bot API request time", ('method',))
+        metrics.counter('api_errors_total', "Failed Bot API requests", ('method', 'error'))
+
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, '__api_method__', type(method).__name__)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.metrics.inc('api_errors_total', (name, type(e).__name__))
+            raise
+        finally:
+            self.metrics.observe('api_request_duration_seconds', (name,), time.perf_counter() - started)
+
+
+async def run_metrics_server(metrics: Metrics, host, port):
+    """Локальный HTTP-эндпоинт /metrics в текстовом формате Prometheus."""
+
+    async def handle(request: web.Request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logging.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class DependencyMiddleware(BaseMiddleware):
+    """Передает общие сервисы приложения (db, photo_cache, ...) в хендлеры как именованные аргументы."""
+
+    def __init__(self, **dependencies):
+        self.dependencies = dependencies
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        data.update(self.dependencies)
+        return await handler(event, data)
+
+
+class AdmissionControlMiddleware(BaseMiddleware):
+    """
+    Контроль нагрузки на обработчики:
+    - не больше limit обработчиков одновременно (пул БД и Bot API не захлёбываются при всплеске);
+    - обновления одного чата выполняются строго по очереди (двойной клик по next_page не гоняется сам с собой);
+    - если в очереди уже max_queue обновлений, новые отбрасываются с ответом пользователю.
+    """
+
+    def __init__(self, limit, max_queue=500, overload_text="Бот сейчас перегружен, попробуйте ещё раз через пару секунд."):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.overload_text = overload_text
+        self.semaphore = asyncio.Semaphore(limit)
+        self._chat_locks = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.shed = 0
+        self.admitted = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def _shed(self, event):
+        self.shed += 1
+        logging.warning(f"Update shed: queue depth {self.waiting}, in flight {self.in_flight}")
+        callback_query = getattr(event, 'callback_query', None)
+        if callback_query is not None:
+            try:
+                await callback_query.answer(self.overload_text)
+            except Exception as e:
+                logging.error(f"Failed to answer shed callback: {e}")
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if self.waiting >= self.max_queue:
+            return await self._shed(event)
+
+        chat = data.get('event_chat')
+        chat_id = chat.id if chat else None
+        lock = None
+        if chat_id is not None:
+            lock, users = self._chat_locks.get(chat_id, (asyncio.Lock(), 0))
+            self._chat_locks[chat_id] = (lock, users + 1)
+
+        started = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            if lock is not None:
+                await lock.acquire()
+            try:
+                await self.semaphore.acquire()
+            except BaseException:
+                if lock is not None:
+                    lock.release()
+                raise
+        except BaseException:
+            self._release_chat(chat_id)
+            raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - started
+        self.admitted += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+
+        self.in_flight += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+            if lock is not None:
+                lock.release()
+            self._release_chat(chat_id)
+
+    def _release_chat(self, chat_id):
+        if chat_id is None:
+            return
+        lock, users = self._chat_locks[chat_id]
+        if users <= 1:
+            del self._chat_locks[chat_id]
+        else:
+            self._chat_locks[chat_id] = (lock, users - 1)
+
+    def stats(self):
+        avg_wait = self.wait_time_total / self.admitted if self.admitted else 0.0
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'max_queue_depth': self.max_waiting,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'wait_avg_ms': round(avg_wait * 1000, 2),
+            'wait_max_ms': round(self.wait_time_max * 1000, 2),
+        }
+
+
+class PrefetchCancelMiddleware(BaseMiddleware):
+    """
+    Отменяет предвыборку страниц, когда пользователь ушёл из состояния просмотра выдачи.
+    Переходы из выдачи, которые состояние не меняют (главное меню, избранное, профиль), отменяют её сами.
+    """
+
+    def __init__(self, prefetcher, keep_state):
+        self.prefetcher = prefetcher
+        self.keep_state = keep_state
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            chat = data.get('event_chat')
+            state = data.get('state')
+            if chat is not None and state is not None and self.prefetcher.active(chat.id):
+                if await state.get_state() != self.keep_state:
+                    self.prefetcher.cancel(chat.id)
@@ -0,0 +1,103 @@
+import logging
+
+from aiogram.enums import ParseMode
+from aiogram.types import InputMediaPhoto
+
+from database.database import Database
+
+
+def property_photos(property, only_http=False):
+    photos = [property[f'photo{i}'] for i in range(1, 10) if property.get(f'photo{i}')]
+    if only_http:
+        photos = [photo for photo in photos if photo.startswith('http')]
+    return photos
+
+
+class PhotoCache:
+    """
+    Кэш URL фотографии -> file_id Telegram.
+    После первой отправки Telegram не скачивает картинку заново, а берет ее по file_id.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._file_ids = {}
+        self._property_urls = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        query = "SELECT url, property_id, file_id FROM photo_file_ids"
+        rows = await self.db.fetch_all(query, ())
+        for url, property_id, file_id in rows:
+            self._file_ids[url] = file_id
+            self._property_urls.setdefault(property_id, set()).add(url)
+        logging.info(f"Photo cache loaded: {len(self._file_ids)} file_ids")
+
+    async def media_group(self, property_id, urls, caption=None):
+        """Собирает альбом, подставляя file_id вместо URL там, где он уже известен."""
+        known_urls = self._property_urls.get(property_id)
+        if known_urls and not known_urls <= set(urls):
+            # Фото объекта изменились - старые file_id больше не нужны
+            await self.invalidate(property_id, keep=urls)
+
+        media = []
+        for i, url in enumerate(urls):
+            file_id = self._file_ids.get(url)
+            if file_id:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if i == 0 and caption is not None:
+                media.append(InputMediaPhoto(media=file_id or url, caption=caption, parse_mode=ParseMode.HTML))
+            else:
+                media.append(InputMediaPhoto(media=file_id or url))
+        return media
+
+    async def remember(self, property_id, urls, messages):
+        """Сохраняет file_id из ответа answer_media_group / edit_message_media."""
+        new_rows = []
+        for url, message in zip(urls, messages):
+            if not getattr(message, 'photo', None) or url in self._file_ids:
+                continue
+            file_id = message.photo[-1].file_id
+            self._file_ids[url] = file_id
+            self._property_urls.setdefault(property_id, set()).add(url)
+            new_rows.append((url, property_id, file_id))
+
+        if not new_rows:
+            return
+
+        query = """
+        INSERT INTO photo_file_ids (url, property_id, file_id) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE property_id = VALUES(property_id), file_id = VALUES(file_id)
+        """
+        try:
+            async with self.db.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await self.db.executemany(cursor, query, new_rows)
+                    await conn.commit()
+        except Exception as e:
+            logging.error(f"Failed to persist photo file_ids for property {property_id}: {e}")
+
+    async def invalidate(self, property_id, keep=()):
+        stale_urls = self._property_urls.get(property_id, set()) - set(keep)
+        for url in stale_urls:
+            self._file_ids.pop(url, None)
+        self._property_urls[property_id] = self._property_urls.get(property_id, set()) - stale_urls
+
+        if not stale_urls:
+            return
+        placeholders = ", ".join(["%s"] * len(stale_urls))
+        query = f"DELETE FROM photo_file_ids WHERE property_id = %s AND url IN ({placeholders})"
+        await self.db.execute_query(query, (property_id, *stale_urls))
+        logging.info(f"Photo cache invalidated for property {property_id}: {len(stale_urls)} urls")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._file_ids),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
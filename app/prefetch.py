@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+
+from app.catalog import PropertyCatalog
+from app.photo_cache import PhotoCache
+from database.properties import property_keyset
+
+
+def filter_key(search_filter):
+    return json.dumps(search_filter, sort_keys=True, ensure_ascii=False)
+
+
+class PagePrefetcher:
+    """
+    Пока пользователь смотрит страницу k выдачи, в фоне готовит страницы k+1 и k-1:
+    строку объекта, подпись, клавиатуру и альбом с уже подставленными file_id.
+    Следующее листание берёт готовый слот и не ходит ни в каталог, ни в БД.
+
+    budget - сколько страниц на пользователя держим готовыми (сначала следующая, потом предыдущая),
+    max_users - сколько пользователей со слотами храним одновременно (самые давние вытесняются).
+    """
+
+    def __init__(self, catalog: PropertyCatalog, photo_cache: PhotoCache, budget=2, max_users=1000):
+        self.catalog = catalog
+        self.photo_cache = photo_cache
+        self.budget = budget
+        self.max_users = max_users
+        self._slots = {}
+        self._tasks = {}
+        self.prepared = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+
+    def active(self, user_id):
+        return user_id in self._slots or user_id in self._tasks
+
+    def schedule(self, user_id, search_filter, keyset, page, total, render):
+        """
+        Запускает подготовку соседних страниц. render(property, page, total) -> (text, markup, photos)
+        - тот же рендер, которым показывается страница, чтобы подготовленный слот ничем не отличался.
+        """
+        self.cancel(user_id, count=False)
+        if self.budget <= 0:
+            return
+
+        self._slots[user_id] = {}
+        while len(self._slots) > self.max_users:
+            self.cancel(next(iter(self._slots)), count=False)
+
+        task = asyncio.create_task(self._prefetch(user_id, search_filter, keyset, page, total, render))
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda done: self._tasks.pop(user_id, None) if self._tasks.get(user_id) is done
+                               else None)
+
+    async def _prefetch(self, user_id, search_filter, keyset, page, total, render):
+        neighbours = [('next', page + 1), ('prev', page - 1)]
+        key = filter_key(search_filter)
+        try:
+            for direction, neighbour in neighbours[:self.budget]:
+                if not 0 <= neighbour < total:
+                    continue
+                property = await self.catalog.page(search_filter, keyset, direction)
+                if not property:
+                    continue
+                text, markup, photos = render(property, neighbour, total)
+                media = await self.photo_cache.media_group(property['property_id'], photos, caption=text) \
+                    if photos else None
+
+                slots = self._slots.get(user_id)
+                if slots is None:
+                    return
+                slots[(key, neighbour, total)] = {
+                    'version': self.catalog.version,
+                    'property': property,
+                    'keyset': property_keyset(property),
+                    'text': text,
+                    'markup': markup,
+                    'photos': photos,
+                    'media': media,
+                }
+                self.prepared += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Page prefetch failed for user {user_id}: {e}")
+
+    def take(self, user_id, search_filter, page, total):
+        """Готовый слот для страницы или None, если его нет или каталог с тех пор обновился."""
+        slot = self._slots.get(user_id, {}).pop((filter_key(search_filter), page, total), None)
+        if slot is None or slot['version'] != self.catalog.version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return slot
+
+    def cancel(self, user_id, count=True):
+        """Пользователь ушёл из выдачи: останавливаем подготовку и освобождаем слоты."""
+        task = self._tasks.pop(user_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            if count:
+                self.cancelled += 1
+        self._slots.pop(user_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'users': len(self._slots),
+            'running': len(self._tasks),
+            'prepared': self.prepared,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'cancelled': self.cancelled,
+        }
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from database.database import Database
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+def _parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        expression, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if expression == '*':
+            start, end = low, high
+        elif '-' in expression:
+            start, end = map(int, expression.split('-'))
+        else:
+            start = int(expression)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    Расписание в формате cron из пяти полей: минута, час, день месяца, месяц, день недели (0 и 7 - воскресенье).
+    Поддерживаются *, списки, диапазоны и шаг: "0 10 * * *", "*/15 8-22 * * 1-5".
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _parse_cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        # Как в cron: если заданы и день месяца, и день недели, достаточно любого из них
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """Ближайшая минута строго после moment, подходящая под расписание."""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+class Job:
+    def __init__(self, name, schedule, func, retry_delay=300):
+        self.name = name
+        self.schedule = CronSchedule(schedule)
+        self.func = func
+        self.retry_delay = retry_delay
+
+
+class JobContext:
+    """
+    Передаётся в функцию задачи. checkpoint - сохранённый прогресс прерванного прогона (пустой словарь для нового);
+    save() записывает новый прогресс в jobs, чтобы после падения следующий прогон продолжил с этого места.
+    """
+
+    def __init__(self, scheduler, job, run_id, checkpoint):
+        self.scheduler = scheduler
+        self.name = job.name
+        self.run_id = run_id
+        self.checkpoint = checkpoint or {}
+        self.resumed = bool(checkpoint)
+        self.items = 0
+
+    async def save(self, checkpoint, items=0):
+        self.checkpoint = checkpoint
+        self.items += items
+        await self.scheduler.save_checkpoint(self.name, checkpoint)
+
+    def add_items(self, count):
+        self.items += count
+
+
+class Scheduler:
+    """
+    Планировщик периодических задач поверх таблицы jobs - переживает перезапуски и работает на нескольких репликах.
+
+    Задачу запускает та реплика, которая первой взяла аренду (lease_owner, lease_until) на просроченный
+    next_run_at; пока задача идёт, аренда продлевается. Если реплика упала, аренда истекает и задачу
+    подхватывает другая, продолжая с последней контрольной точки. next_run_at сдвигается по расписанию
+    только после успешного прогона, упавший прогон повторяется через retry_delay.
+    Каждый прогон записывается в job_runs: длительность, число обработанных элементов, статус и ошибка.
+    """
+
+    def __init__(self, db: Database, poll_interval=30, lease=300):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+        self._running = {}
+        self._loop_task = None
+        self.runs = 0
+        self.failed = 0
+
+    def add(self, name, schedule, func, retry_delay=300):
+        """func(job: JobContext) - корутина; schedule - строка cron."""
+        self.jobs[name] = Job(name, schedule, func, retry_delay=retry_delay)
+
+    async def _register(self):
+        now = datetime.now()
+        for job in self.jobs.values():
+            # При смене расписания next_run_at пересчитывается, иначе остаётся как был
+            await self.db.execute_query("""
+            INSERT INTO jobs (name, schedule, next_run_at) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                next_run_at = IF(schedule <> VALUES(schedule), VALUES(next_run_at), next_run_at),
+                schedule = VALUES(schedule)
+            """, (job.name, job.schedule.expression, job.schedule.next_after(now)))
+
+    async def _acquire(self, job):
+        now = datetime.now()
+        cursor = await self.db.execute_query("""
+        UPDATE jobs SET lease_owner = %s, lease_until = %s
+        WHERE name = %s AND next_run_at <= %s AND (lease_until IS NULL OR lease_until < %s)
+        """, (self.owner, now + timedelta(seconds=self.lease), job.name, now, now))
+        if cursor.rowcount != 1:
+            return None
+        row = await self.db.fetch_one("SELECT checkpoint FROM jobs WHERE name = %s", (job.name,))
+        return json.loads(row[0]) if row and row[0] else {}
+
+    async def _fenced_update(self, name, assignments, params):
+        """UPDATE jobs только пока аренда наша - реплика, потерявшая аренду, ничего не перезапишет."""
+        cursor = await self.db.execute_query(
+            f"UPDATE jobs SET {assignments} WHERE name = %s AND lease_owner = %s", (*params, name, self.owner)
+        )
+        if cursor.rowcount != 1:
+            # Без CLIENT.FOUND_ROWS rowcount - число изменённых, а не найденных строк: запись тех же значений
+            # (например, неизменившейся контрольной точки) даёт 0 при живой аренде - владельца перепроверяем
+            row = await self.db.fetch_one("SELECT lease_owner FROM jobs WHERE name = %s", (name,))
+            if not row or row[0] != self.owner:
+                raise LeaseLost(f"Job {name} is no longer leased by {self.owner}")
+
+    async def save_checkpoint(self, name, checkpoint):
+        await self._fenced_update(name, "checkpoint = %s", (json.dumps(checkpoint, ensure_ascii=False),))
+
+    async def _heartbeat(self, name, task):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self._fenced_update(name, "lease_until = %s",
+                                          (datetime.now() + timedelta(seconds=self.lease),))
+            except LeaseLost as e:
+                logging.error(f"{e}, cancelling the run")
+                task.cancel()
+                return
+            except Exception as e:
+                logging.error(f"Failed to extend lease of job {name}: {e}")
+
+    async def _execute(self, job, checkpoint):
+        started_at = datetime.now()
+        started = time.perf_counter()
+        cursor = await self.db.execute_query(
+            "INSERT INTO job_runs (job_name, owner, started_at, status) VALUES (%s, %s, %s, 'running')",
+            (job.name, self.owner, started_at)
+        )
+        context = JobContext(self, job, cursor.lastrowid, checkpoint)
+        if context.resumed:
+            logging.info(f"Job {job.name} resumes from checkpoint")
+
+        heartbeat = asyncio.create_task(self._heartbeat(job.name, asyncio.current_task()))
+        status, error = 'ok', None
+        try:
+            await job.func(context)
+            await self._fenced_update(
+                job.name,
+                "checkpoint = NULL, next_run_at = %s, lease_owner = NULL, lease_until = NULL, "
+                "last_run_at = %s, last_status = %s",
+                (job.schedule.next_after(datetime.now()), started_at, status)
+            )
+        except asyncio.CancelledError:
+            # Остановка бота: аренду отпускаем, next_run_at не трогаем - после перезапуска прогон продолжится
+            status = 'cancelled'
+            await self._release(job.name, None, started_at, status)
+            raise
+        except Exception as e:
+            status, error = 'failed', str(e)
+            self.failed += 1
+            logging.exception(f"Job {job.name} failed: {e}")
+            await self._release(job.name, datetime.now() + timedelta(seconds=job.retry_delay), started_at, status)
+        finally:
+            heartbeat.cancel()
+            self.runs += 1
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            try:
+                await self.db.execute_query("""
+                UPDATE job_runs SET finished_at = %s, status = %s, items = %s, duration_ms = %s, error = %s
+                WHERE run_id = %s
+                """, (datetime.now(), status, context.items, duration_ms, error, context.run_id))
+            except Exception as e:
+                logging.error(f"Failed to record run of job {job.name}: {e}")
+            logging.info(f"Job {job.name} finished: {status}, {context.items} items, {duration_ms} ms")
+
+    async def _release(self, name, next_run_at, started_at, status):
+        assignments = "lease_owner = NULL, lease_until = NULL, last_run_at = %s, last_status = %s"
+        params = (started_at, status)
+        if next_run_at is not None:
+            assignments += ", next_run_at = %s"
+            params += (next_run_at,)
+        try:
+            await self._fenced_update(name, assignments, params)
+        except Exception as e:
+            logging.error(f"Failed to release job {name}: {e}")
+
+    async def _poll(self):
+        for job in self.jobs.values():
+            if job.name in self._running:
+                continue
+            checkpoint = await self._acquire(job)
+            if checkpoint is None:
+                continue
+            task = asyncio.create_task(self._execute(job, checkpoint))
+            self._running[job.name] = task
+            task.add_done_callback(lambda done, name=job.name: self._running.pop(name, None))
+
+    async def run(self):
+        await self._register()
+        logging.info(f"Scheduler {self.owner} started: {', '.join(self.jobs)}")
+        while True:
+            try:
+                await self._poll()
+            except Exception as e:
+                logging.error(f"Scheduler poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = [task for task in (self._loop_task, *self._running.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            'owner': self.owner,
+            'jobs': list(self.jobs),
+            'running': list(self._running),
+            'runs': self.runs,
+            'failed': self.failed,
+        }
@@ -0,0 +1,97 @@
+from database.properties import RENT_TYPE_VALUES, parse_price_range
+
+
+def iter_bits(bits):
+    """Номера установленных битов по возрастанию."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс по фасетам поиска для каталога в памяти.
+    Объекты пронумерованы в порядке выдачи (monthly_price по убыванию), для каждого значения фасета
+    хранится битовая маска номеров объектов. Фильтр = AND масок выбранных фасетов, результат уже отсортирован.
+    """
+
+    # Ключи search_filter (см. make_search_filter), по которым строятся маски
+    FACETS = ('rent_type', 'property_types', 'locations', 'bedrooms', 'bathrooms', 'price_range')
+
+    def __init__(self, sorted_properties):
+        self.properties = list(sorted_properties)
+        self.all = (1 << len(self.properties)) - 1
+        self._types = {}
+        self._locations = {}
+        self._rent_types = {}
+        for rank, property in enumerate(self.properties):
+            bit = 1 << rank
+            self._types[property['_type']] = self._types.get(property['_type'], 0) | bit
+            self._locations[property['_location']] = self._locations.get(property['_location'], 0) | bit
+            rent_type = property.get('rent_type')
+            self._rent_types[rent_type] = self._rent_types.get(rent_type, 0) | bit
+        self._cache = {}
+
+    def _range_mask(self, key, column, predicate):
+        mask = self._cache.get(key)
+        if mask is None:
+            mask = 0
+            for rank, property in enumerate(self.properties):
+                if predicate(property[column] or 0):
+                    mask |= 1 << rank
+            self._cache[key] = mask
+        return mask
+
+    def facet_mask(self, facet, value):
+        """Маска для одного значения фасета (в том виде, как оно лежит в фильтре)."""
+        if facet == 'rent_type':
+            mask = 0
+            for rent_type in RENT_TYPE_VALUES.get(value, ()):
+                mask |= self._rent_types.get(rent_type, 0)
+            return mask
+        if facet == 'property_types':
+            return self._types.get(value.strip().lower(), 0)
+        if facet == 'locations':
+            return self._locations.get(value.strip().lower(), 0)
+        if facet in ('bedrooms', 'bathrooms'):
+            threshold = int(value)
+            return self._range_mask((facet, threshold), facet, lambda x: x >= threshold)
+        if facet == 'price_range':
+            min_price, max_price = parse_price_range(value)
+            return self._range_mask((facet, value), 'monthly_price', lambda x: min_price <= x <= max_price)
+        raise ValueError(f"Unknown facet: {facet}")
+
+    def selection_mask(self, facet, selected):
+        """Маска выбора пользователя по фасету; пустой выбор - без ограничений."""
+        if not selected:
+            return self.all
+        if facet in ('bedrooms', 'bathrooms'):
+            # "от N спален": достаточно минимального выбранного значения
+            return self.facet_mask(facet, min(map(int, selected)))
+        if isinstance(selected, (list, tuple, set, frozenset)):
+            mask = 0
+            for value in selected:
+                mask |= self.facet_mask(facet, value)
+            return mask
+        return self.facet_mask(facet, selected)
+
+    def match(self, search_filter, exclude=None):
+        mask = self.all
+        for facet in self.FACETS:
+            if facet != exclude:
+                mask &= self.selection_mask(facet, search_filter.get(facet))
+                if not mask:
+                    break
+        return mask
+
+    def count(self, search_filter):
+        return self.match(search_filter).bit_count()
+
+    def search(self, search_filter):
+        return [self.properties[rank] for rank in iter_bits(self.match(search_filter))]
+
+    def facet_counts(self, search_filter, facet, values):
+        """Сколько объектов будет найдено при выборе каждого значения фасета с учётом остальных фильтров."""
+        base = self.match(search_filter, exclude=facet)
+        return {value: (base & self.facet_mask(facet, value)).bit_count() for value in values}
@@ -0,0 +1,47 @@
+import time
+from datetime import date, timedelta
+
+from database.database import Database
+
+
+class StatsService:
+    """
+    Статистика для админов из дневных сводок daily_stats и last_seen_days, которые ведёт ActivityTracker:
+    ни один запрос не читает users, так что стоимость не растёт с числом пользователей.
+    Ответы кэшируются на ttl секунд - повторные /stats не ходят в БД.
+    """
+
+    def __init__(self, db: Database, ttl=60):
+        self.db = db
+        self.ttl = ttl
+        self._cache = {}
+        self.hits = 0
+        self.loads = 0
+
+    async def _cached(self, key, load):
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            self.hits += 1
+            return cached[1]
+        self.loads += 1
+        value = await load()
+        self._cache[key] = (time.monotonic(), value)
+        return value
+
+    async def summary(self):
+        """Всего пользователей, новые, активные, поиски и избранное за 7 и 30 дней."""
+        return await self._cached('summary', self.db.get_detailed_user_statistics)
+
+    async def trend(self, days=14):
+        """[(день, новые, активные, поиски, избранное)] за последние days дней, дни без событий - нулями."""
+
+        async def load():
+            since = date.today() - timedelta(days=days - 1)
+            rows = {row[0]: tuple(row[1:]) for row in await self.db.get_daily_stats(since)}
+            return [(day, *rows.get(day, (0, 0, 0, 0)))
+                    for day in (since + timedelta(days=offset) for offset in range(days))]
+
+        return await self._cached(('trend', days), load)
+
+    def stats(self):
+        return {'cached': len(self._cache), 'hits': self.hits, 'loads': self.loads}
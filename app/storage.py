@@ -0,0 +1,292 @@
+import json
+import logging
+import time
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, DEFAULT_DESTINY
+from aiogram.fsm.storage.memory import MemoryStorage
+
+try:
+    from redis.asyncio import Redis
+except ImportError:  # redis нужен только для FSM_STORAGE = 'redis'
+    Redis = None
+
+FORMAT_VERSION = 1
+
+# Теги полей данных FSM, которые кодируются компактно; всё остальное уходит в JSON-хвост
+TAG_PAGE = 1
+TAG_TOTAL = 2
+TAG_ALBUM_SIZE = 3
+TAG_MESSAGE_IDS = 4
+TAG_SELECTED_TYPES = 5
+TAG_SELECTED_DISTRICTS = 6
+TAG_EXTRA = 15
+
+INT_FIELDS = {'page': TAG_PAGE, 'total': TAG_TOTAL, 'album_size': TAG_ALBUM_SIZE}
+STR_LIST_FIELDS = {'selected_types': TAG_SELECTED_TYPES, 'selected_districts': TAG_SELECTED_DISTRICTS}
+
+
+class StateTooLarge(ValueError):
+    pass
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _is_uint(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _json_default(value):
+    # monthly_price из MySQL может прийти Decimal (keyset в search_filter)
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_data(data: Dict[str, Any]) -> bytes:
+    """
+    Компактное двоичное представление данных FSM воронки поиска:
+    числа - varint, message_ids - varint-дельты (id в альбоме идут подряд), списки строк - длина + utf-8.
+    Неизвестные ключи и значения неожиданных типов сохраняются JSON-хвостом.
+    """
+    out = bytearray([FORMAT_VERSION])
+    extra = {}
+    for name, value in data.items():
+        if name in INT_FIELDS and _is_uint(value):
+            out.append(INT_FIELDS[name])
+            _write_varint(out, value)
+        elif name == 'message_ids' and isinstance(value, list) and all(_is_uint(item) for item in value):
+            out.append(TAG_MESSAGE_IDS)
+            _write_varint(out, len(value))
+            previous = 0
+            for message_id in value:
+                _write_varint(out, _zigzag(message_id - previous))
+                previous = message_id
+        elif name in STR_LIST_FIELDS and isinstance(value, list) and all(isinstance(item, str) for item in value):
+            out.append(STR_LIST_FIELDS[name])
+            _write_varint(out, len(value))
+            for item in value:
+                encoded = item.encode()
+                _write_varint(out, len(encoded))
+                out += encoded
+        else:
+            extra[name] = value
+
+    if extra:
+        encoded = json.dumps(extra, separators=(',', ':'), ensure_ascii=False, default=_json_default).encode()
+        out.append(TAG_EXTRA)
+        _write_varint(out, len(encoded))
+        out += encoded
+    return bytes(out)
+
+
+def decode_data(raw: bytes) -> Dict[str, Any]:
+    if raw[0] != FORMAT_VERSION:
+        raise ValueError(f"Unknown FSM data format version: {raw[0]}")
+
+    names = {tag: name for name, tag in {**INT_FIELDS, **STR_LIST_FIELDS}.items()}
+    data = {}
+    pos = 1
+    while pos < len(raw):
+        tag = raw[pos]
+        pos += 1
+        if tag in (TAG_PAGE, TAG_TOTAL, TAG_ALBUM_SIZE):
+            data[names[tag]], pos = _read_varint(raw, pos)
+        elif tag == TAG_MESSAGE_IDS:
+            count, pos = _read_varint(raw, pos)
+            message_ids = []
+            previous = 0
+            for _ in range(count):
+                delta, pos = _read_varint(raw, pos)
+                previous += _unzigzag(delta)
+                message_ids.append(previous)
+            data['message_ids'] = message_ids
+        elif tag in (TAG_SELECTED_TYPES, TAG_SELECTED_DISTRICTS):
+            count, pos = _read_varint(raw, pos)
+            items = []
+            for _ in range(count):
+                length, pos = _read_varint(raw, pos)
+                items.append(raw[pos:pos + length].decode())
+                pos += length
+            data[names[tag]] = items
+        elif tag == TAG_EXTRA:
+            length, pos = _read_varint(raw, pos)
+            data.update(json.loads(raw[pos:pos + length]))
+            pos += length
+        else:
+            raise ValueError(f"Unknown FSM data tag: {tag}")
+    return data
+
+
+class LocalKeyValue:
+    """Хранилище ключ-значение с TTL в памяти процесса - замена Redis для одного экземпляра и локальных проверок."""
+
+    PURGE_EVERY = 1024
+
+    def __init__(self):
+        self._items = {}
+        self._writes = 0
+
+    async def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._items[key]
+            return None
+        return value
+
+    async def set(self, key, value, ttl=None):
+        self._items[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    async def delete(self, key):
+        self._items.pop(key, None)
+
+    def purge(self):
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._items.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._items[key]
+
+    def __len__(self):
+        return len(self._items)
+
+    async def close(self):
+        self._items.clear()
+
+
+class RedisKeyValue:
+    def __init__(self, url):
+        if Redis is None:
+            raise RuntimeError("FSM_STORAGE = 'redis' requires the redis package")
+        self.redis = Redis.from_url(url)
+
+    async def get(self, key):
+        return await self.redis.get(key)
+
+    async def set(self, key, value, ttl=None):
+        await self.redis.set(key, value, ex=ttl or None)
+
+    async def delete(self, key):
+        await self.redis.delete(key)
+
+    async def close(self):
+        await self.redis.close()
+
+
+class CompactStorage(BaseStorage):
+    """
+    FSM-хранилище поверх ключ-значение (Redis или LocalKeyValue).
+    Данные хранятся в компактном двоичном виде (encode_data), у ключей есть TTL -
+    брошенные воронки поиска исчезают сами. Несколько реплик бота с одним Redis видят общее состояние.
+    """
+
+    def __init__(self, store, state_ttl=None, data_ttl=None, max_data_size=4096, prefix='fsm'):
+        self.store = store
+        self.state_ttl = state_ttl
+        self.data_ttl = data_ttl
+        self.max_data_size = max_data_size
+        self.prefix = prefix
+        self.reads = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.max_size_seen = 0
+        self.rejected = 0
+
+    def build_key(self, key: StorageKey, part):
+        parts = [self.prefix, str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id:
+            parts.append(str(key.thread_id))
+        if key.business_connection_id:
+            parts.append(str(key.business_connection_id))
+        if key.destiny != DEFAULT_DESTINY:
+            parts.append(key.destiny)
+        parts.append(part)
+        return ':'.join(parts)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if state is None:
+            await self.store.delete(self.build_key(key, 'state'))
+        else:
+            await self.store.set(self.build_key(key, 'state'), state.encode(), ttl=self.state_ttl)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        value = await self.store.get(self.build_key(key, 'state'))
+        return value.decode() if value is not None else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if not data:
+            await self.store.delete(self.build_key(key, 'data'))
+            return
+
+        raw = encode_data(data)
+        if self.max_data_size and len(raw) > self.max_data_size:
+            self.rejected += 1
+            logging.error(f"FSM data for chat {key.chat_id} is {len(raw)} bytes, limit {self.max_data_size}")
+            raise StateTooLarge(f"FSM data is {len(raw)} bytes, limit is {self.max_data_size}")
+
+        await self.store.set(self.build_key(key, 'data'), raw, ttl=self.data_ttl)
+        self.writes += 1
+        self.bytes_written += len(raw)
+        self.max_size_seen = max(self.max_size_seen, len(raw))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        self.reads += 1
+        raw = await self.store.get(self.build_key(key, 'data'))
+        return decode_data(raw) if raw else {}
+
+    async def close(self) -> None:
+        await self.store.close()
+
+    def stats(self):
+        return {
+            'reads': self.reads,
+            'writes': self.writes,
+            'avg_size': round(self.bytes_written / self.writes, 1) if self.writes else 0.0,
+            'max_size': self.max_size_seen,
+            'rejected': self.rejected,
+        }
+
+
+def build_storage(kind, redis_url=None, state_ttl=None, data_ttl=None, max_data_size=4096):
+    """FSM-хранилище по настройке FSM_STORAGE: 'memory' (MemoryStorage aiogram), 'local' или 'redis'."""
+    if kind == 'memory':
+        return MemoryStorage()
+    if kind == 'local':
+        store = LocalKeyValue()
+    elif kind == 'redis':
+        store = RedisKeyValue(redis_url)
+    else:
+        raise ValueError(f"Unknown FSM storage: {kind}")
+    return CompactStorage(store, state_ttl=state_ttl, data_ttl=data_ttl, max_data_size=max_data_size)
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, path, secret_token=None, health_check=None):
+    """
+    aiohttp-приложение для режима webhook: обработчик обновлений на `path`
+    и /health для балансировщика / проверки реплики.
+    """
+    app = web.Application()
+
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=secret_token or None,
+    ).register(app, path=path)
+
+    async def health(request: web.Request):
+        status = health_check() if health_check else {'status': 'ok'}
+        return web.json_response(status, status=200 if status.get('status') == 'ok' else 503)
+
+    app.router.add_get('/health', health)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, base_url, path, host, port, secret_token=None, health_check=None):
+    async def set_webhook():
+        await bot.set_webhook(f"{base_url.rstrip('/')}{path}", secret_token=secret_token or None,
+                              allowed_updates=dp.resolve_used_update_types())
+        logging.info(f"Webhook set to {base_url.rstrip('/')}{path}")
+
+    async def delete_webhook():
+        await bot.delete_webhook()
+
+    dp.startup.register(set_webhook)
+    dp.shutdown.register(delete_webhook)
+
+    app = build_webhook_app(dp, bot, path, secret_token=secret_token, health_check=health_check)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logging.info(f"Webhook server listening on {host}:{port}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -6,22 +6,64 @@ from logging.handlers import RotatingFileHandler
 
 import aiomysql
 from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.exceptions import TelegramBadRequest
 from aiogram_dialog import setup_dialogs
 
-from config import TOKEN, db_config, ADMINS
+from app.activity import ActivityTracker
+from app.album import AlbumRenderer
+from app.alerts import send_property_alerts
+from app.broadcast import Broadcaster
+from app.callbacks import table as callback_table
+from app.cards import card_cache
+from app.catalog import PropertyCatalog
+from app.favorites import FavoritesService
+from app.metrics import Metrics, HandlerMetricsMiddleware, HandlerLabelMiddleware, RequestMetricsMiddleware, \
+    run_metrics_server
+from app.middlewares import DependencyMiddleware, AdmissionControlMiddleware, PrefetchCancelMiddleware
+from app.photo_cache import PhotoCache
+from app.prefetch import PagePrefetcher
+from app.scheduler import Scheduler, JobContext
+from app.stats import StatsService
+from app.storage import build_storage
+from app.webhook import run_webhook
+from config import TOKEN, db_config, ADMINS, CATALOG_ENABLED, CATALOG_MAX_STALENESS, ACTIVITY_FLUSH_INTERVAL, \
+    UPDATES_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, HANDLER_CONCURRENCY, \
+    HANDLER_MAX_QUEUE, TELEGRAM_API_URL, PREFETCH_BUDGET, PREFETCH_MAX_USERS, FSM_STORAGE, REDIS_URL, FSM_STATE_TTL, \
+    FSM_DATA_TTL, FSM_MAX_DATA_SIZE, FAVORITES_PAGE_SIZE, FAVORITES_MAX_USERS, FAVORITES_TTL, \
+    NOTIFY_SCHEDULE, NOTIFY_LOOKBACK_DAYS, RATINGS_REBUILD_SCHEDULE, SCHEDULER_POLL_INTERVAL, SCHEDULER_LEASE, \
+    METRICS_ENABLED, METRICS_HOST, METRICS_PORT, STATS_CACHE_TTL
 from database.database import Database
-from handlers import handlers_start, handlers_favorites, handlers_search, handlers_profile, \
+from database.migrations import apply_migrations
+from handlers import handlers_start, handlers_favorites, handlers_search, handlers_profile, handlers_admin, \
     handlers_top_properties
+from handlers.handlers_search import PropertyFilter
 from handlers.handlers_start import start_router
 
-# Создание экземпляра базы данных
+# Единый экземпляр базы данных (и пул соединений) на всё приложение
 db = Database(db_config)
+photo_cache = PhotoCache(db)
+album_renderer = AlbumRenderer(photo_cache)
+catalog = PropertyCatalog(db, enabled=CATALOG_ENABLED, max_staleness=CATALOG_MAX_STALENESS)
+activity = ActivityTracker(db, flush_interval=ACTIVITY_FLUSH_INTERVAL)
+statistics = StatsService(db, ttl=STATS_CACHE_TTL)
+prefetcher = PagePrefetcher(catalog, photo_cache, budget=PREFETCH_BUDGET, max_users=PREFETCH_MAX_USERS)
+favorites = FavoritesService(db, catalog, page_size=FAVORITES_PAGE_SIZE, max_users=FAVORITES_MAX_USERS,
+                             ttl=FAVORITES_TTL)
+admission = AdmissionControlMiddleware(HANDLER_CONCURRENCY, max_queue=HANDLER_MAX_QUEUE)
 
 # Создание бота и диспетчера
-bot = Bot(token=TOKEN)
-dp = Dispatcher()
+if TELEGRAM_API_URL:
+    bot = Bot(token=TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+else:
+    bot = Bot(token=TOKEN)
+storage = build_storage(FSM_STORAGE, redis_url=REDIS_URL, state_ttl=FSM_STATE_TTL, data_ttl=FSM_DATA_TTL,
+                        max_data_size=FSM_MAX_DATA_SIZE)
+dp = Dispatcher(storage=storage)
+broadcaster = Broadcaster(bot, db)
+scheduler = Scheduler(db, poll_interval=SCHEDULER_POLL_INTERVAL, lease=SCHEDULER_LEASE)
+metrics = Metrics()
 
 
 # Настройка логирования
@@ -52,66 +94,75 @@ async def notify_admins(message: str):
             logging.exception(f"Failed to send message to admin {admin_id}: {e}")
 
 
-async def check_new_properties(bot: Bot, db: Database):
-    while True:
-        try:
-            now = datetime.now()
-            one_day_ago = now - timedelta(days=1)
-
-            query = "SELECT * FROM properties WHERE created_at >= %s AND notified = FALSE"
-            async with db.pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cursor:
-                    await cursor.execute(query, (one_day_ago,))
-                    new_properties = await cursor.fetchall()
-
-            if new_properties:
-                users_query = "SELECT user_id, last_notified FROM users WHERE notifications_enabled = TRUE"
-                async with db.pool.acquire() as conn:
-                    async with conn.cursor(aiomysql.DictCursor) as cursor:
-                        await cursor.execute(users_query)
-                        users = await cursor.fetchall()
-
-                for user in users:
-                    last_notified = user['last_notified']
-                    if last_notified is None or (now - last_notified).days >= 1:
-                        message_text = "Новые объекты недвижимости:\n\n"
-                        for property in new_properties:
-                            message_text += (
-                                f"🏠 <b>{property['name']}</b>\n"
-                                f"📍 <b>Расположение:</b> {property['location']}\n"
-                                f"🌊 <b>Удаленность от моря:</b> {property['distance_to_sea']} метров\n"
-                                f"💰 <b>Стоимость в месяц:</b> {property['monthly_price']}฿\n"
-                                "-----------------------\n"
-                            )
-
-                        try:
-                            await bot.send_message(user['user_id'], message_text, parse_mode=ParseMode.HTML)
-                        except Exception as e:
-                            logging.error(f"Error sending message to user {user['user_id']}: {e}")
-
-                        # Обновить поля notified для всех новых свойств и last_notified для текущего пользователя в одном блоке
-                        update_query = """
-                        UPDATE properties SET notified = TRUE WHERE property_id = %s;
-                        UPDATE users SET last_notified = %s WHERE user_id = %s
-                        """
-                        async with db.pool.acquire() as conn:
-                            async with conn.cursor() as cursor:
-                                await cursor.executemany(update_query,
-                                                         [(property['property_id'], now, user['user_id']) for property
-                                                          in new_properties])
-                                await conn.commit()
-
-            await asyncio.sleep(86400)  # Проверять раз в день
-
-        except Exception as e:
-            logging.error(f"Error in check_new_properties: {e}")
-            await asyncio.sleep(60)  # Подождать минуту перед повторной попыткой
+async def check_new_properties(job: JobContext):
+    """
+    Задача планировщика: рассылка новых объектов подписчикам.
+    Список объектов и время рассылки фиксируются в контрольной точке до отправки, поэтому прерванный прогон
+    продолжается с тем же набором: кому уже отправили, тех отсекает last_notified (= notified_at).
+    """
+    checkpoint = job.checkpoint
+    if not checkpoint:
+        # Без долей секунды: last_notified - DATETIME, и округлённая отметка не должна разойтись с notified_at
+        now = datetime.now().replace(microsecond=0)
+        rows = await db.fetch_all(
+            "SELECT property_id FROM properties WHERE notified = FALSE AND created_at >= %s ORDER BY property_id",
+            (now - timedelta(days=NOTIFY_LOOKBACK_DAYS),)
+        )
+        if not rows:
+            return
+        checkpoint = {'property_ids': [row[0] for row in rows], 'notified_at': now.isoformat()}
+        await job.save(checkpoint)
+
+    property_ids = checkpoint['property_ids']
+    placeholders = ", ".join(["%s"] * len(property_ids))
+
+    if 'stats' not in checkpoint:
+        notified_at = datetime.fromisoformat(checkpoint['notified_at']).replace(microsecond=0)
+        async with db.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await db.execute(cursor, f"SELECT * FROM properties WHERE property_id IN ({placeholders})",
+                                 property_ids)
+                new_properties = await cursor.fetchall()
+
+        # Каждому подписчику - только объекты, подошедшие к его сохранённым поискам
+        stats = await send_property_alerts(broadcaster, db, new_properties, notified_at=notified_at)
+        checkpoint = {**checkpoint, 'stats': stats}
+        await job.save(checkpoint, items=stats['sent'])
+
+    await db.execute_query(f"UPDATE properties SET notified = TRUE WHERE property_id IN ({placeholders})",
+                           property_ids)
+
+    stats = checkpoint['stats']
+    await notify_admins(f"Рассылка новых объектов: {len(property_ids)} объектов, "
+                        f"подписок {stats['subscriptions']}, отправлено {stats['sent']} из {stats['total']}, "
+                        f"ошибок {stats['failed']}")
+
+
+async def rebuild_ratings(job: JobContext):
+    """Задача планировщика: пересчёт property_rating, чтобы рейтинги не расходились с reviews незаметно."""
+    job.add_items(await db.rebuild_property_ratings())
+
+
+scheduler.add('new_property_alerts', NOTIFY_SCHEDULE, check_new_properties)
+scheduler.add('rebuild_ratings', RATINGS_REBUILD_SCHEDULE, rebuild_ratings)
+
+
+async def prepare_services():
+    """БД, миграции и данные в памяти - всё, что нужно обработчикам, без фоновых задач."""
+    await db.connect()
+    await db.warm_up()
+    await apply_migrations(db)
+    await photo_cache.load()
+    await catalog.load()
 
 
 async def on_startup(dispatcher: Dispatcher):
     try:
-        await db.connect()
-        asyncio.create_task(check_new_properties(bot, db))  # Запуск задачи проверки новых объектов недвижимости
+        await prepare_services()
+        if catalog.enabled:
+            asyncio.create_task(catalog.run_refresh_loop())
+        asyncio.create_task(activity.run())
+        scheduler.start()
     except Exception as e:
         await notify_admins(f"Error connecting to the database: {e}")
         raise
@@ -119,30 +170,94 @@ async def on_startup(dispatcher: Dispatcher):
 
 async def on_shutdown(dispatcher: Dispatcher):
     try:
+        logging.info(f"Database pool stats: {db.pool_stats()}")
+        logging.info(f"Top queries: {db.profiler.top(5)}")
+        logging.info(f"Photo cache stats: {photo_cache.stats()}")
+        logging.info(f"Album renderer stats: {album_renderer.stats()}")
+        logging.info(f"Property card cache stats: {card_cache.stats()}")
+        logging.info(f"Page prefetch stats: {prefetcher.stats()}")
+        logging.info(f"Favorites cache stats: {favorites.stats()}")
+        if hasattr(storage, 'stats'):
+            logging.info(f"FSM storage stats: {storage.stats()}")
+        await scheduler.stop()
+        logging.info(f"Scheduler stats: {scheduler.stats()}")
+        await activity.flush()
+        logging.info(f"Activity tracker stats: {activity.stats()}")
+        logging.info(f"Statistics cache stats: {statistics.stats()}")
+        logging.info(f"Admission control stats: {admission.stats()}")
         await db.disconnect()
     except Exception as e:
         await notify_admins(f"Error disconnecting from the database: {e}")
         raise
 
 
-async def main():
-    dp.include_routers(handlers_top_properties.router,
+def health_check():
+    pool_stats = db.pool_stats()
+    return {
+        'status': 'ok' if db.pool is not None else 'db_unavailable',
+        'mode': UPDATES_MODE,
+        'db': pool_stats,
+        'admission': admission.stats(),
+    }
+
+
+def setup_metrics():
+    db.instrument(metrics)
+    bot.session.middleware(RequestMetricsMiddleware(metrics))
+    # Метки router/handler для сообщений: какой обработчик выбран, узнаём во внутреннем middleware
+    dp.message.middleware(HandlerLabelMiddleware())
+    dp.callback_query.middleware(HandlerLabelMiddleware())
+    for name, stats in (('db_pool', db.pool_stats), ('admission', admission.stats), ('photo_cache', photo_cache.stats),
+                        ('album', album_renderer.stats), ('cards', card_cache.stats), ('prefetch', prefetcher.stats),
+                        ('favorites', favorites.stats), ('scheduler', scheduler.stats),
+                        ('db_queries', db.profiler.stats), ('activity', activity.stats),
+                        ('statistics', statistics.stats)):
+        metrics.add_collector(name, stats)
+
+
+def setup_dispatcher():
+    """Middleware и роутеры диспетчера; отдельно от main, чтобы tools/load_test.py собирал тот же конвейер."""
+    dp.update.outer_middleware(admission)
+    if METRICS_ENABLED:
+        # После admission: гистограммы меряют сам обработчик, без ожидания в очереди
+        dp.update.outer_middleware(HandlerMetricsMiddleware(metrics))
+        setup_metrics()
+    dp.update.outer_middleware(DependencyMiddleware(db=db, photo_cache=photo_cache, catalog=catalog,
+                                                   activity=activity, album_renderer=album_renderer,
+                                                   prefetcher=prefetcher, favorites=favorites,
+                                                   statistics=statistics))
+    dp.update.outer_middleware(PrefetchCancelMiddleware(prefetcher, PropertyFilter.showing_results.state))
+    # Первым: callback_data разбирается один раз, обработчик берётся из таблицы app.callbacks по тегу
+    dp.include_routers(callback_table.router,
+                       handlers_top_properties.router,
                        handlers_favorites.router,
                        handlers_search.router,
-                       handlers_profile.router
+                       handlers_profile.router,
+                       handlers_admin.router
                        )
     dp.include_router(start_router)
     setup_dialogs(dp)
 
+
+async def main():
+    setup_dispatcher()
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
 
+    metrics_runner = await run_metrics_server(metrics, METRICS_HOST, METRICS_PORT) if METRICS_ENABLED else None
+
     try:
-        await dp.start_polling(bot)
+        if UPDATES_MODE == 'webhook':
+            await run_webhook(dp, bot, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT,
+                              secret_token=WEBHOOK_SECRET, health_check=health_check)
+        else:
+            await dp.start_polling(bot)
     except Exception as e:
         await notify_admins(f"Bot stopped unexpectedly: {e}")
         raise
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
         await db.disconnect()
 
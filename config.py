@@ -5,7 +5,11 @@ db_config = {
     'user': 'root',
     'password': 'f1s22731S',
     'db': 'tgdb',
-    'port': 3306
+    'port': 3306,
+    'pool_minsize': 2,
+    'pool_maxsize': 10,
+    'slow_query_ms': 200,  # запросы дольше пишутся в лог вместе с EXPLAIN
+    'stream_batch_size': 1000,  # строк в пачке серверного курсора (stream) и в порции bulk_write
 }
 
 # db_config = {
@@ -16,4 +20,63 @@ db_config = {
 #     'port': 3306,
 # }
 
+# Каталог объектов в памяти: CATALOG_ENABLED = False - все запросы идут напрямую в БД
+CATALOG_ENABLED = True
+CATALOG_MAX_STALENESS = 60  # секунд
+
+# Хранилище состояний FSM: 'memory' - MemoryStorage aiogram без TTL и ограничений размера (по умолчанию),
+# 'local' - в памяти процесса с TTL и лимитом FSM_MAX_DATA_SIZE, 'redis' - общее для нескольких реплик (пакет redis).
+# При 'local' и 'redis' запись данных больше лимита поднимает app.storage.StateTooLarge в обработчике
+FSM_STORAGE = 'memory'
+REDIS_URL = 'redis://localhost:6379/0'
+FSM_STATE_TTL = 7 * 24 * 3600  # секунд; брошенная воронка поиска удаляется сама
+FSM_DATA_TTL = 7 * 24 * 3600
+FSM_MAX_DATA_SIZE = 4096  # байт на ключ
+
+# Получение обновлений: 'polling' (по умолчанию) или 'webhook'
+UPDATES_MODE = 'polling'
+WEBHOOK_BASE_URL = 'https://example.com'  # публичный адрес, на который Telegram шлёт обновления
+WEBHOOK_PATH = '/webhook'
+WEBHOOK_SECRET = ''  # секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = '0.0.0.0'
+WEBHOOK_PORT = 8080
+
+# Максимум одновременно выполняемых обработчиков обновлений и длина очереди ожидающих,
+# сверх которой новые обновления отбрасываются. Обработчик держит не больше одного соединения за раз,
+# поэтому при лимите по размеру пула обработчики не ждут друг друга в pool.acquire()
+HANDLER_CONCURRENCY = db_config['pool_maxsize']
+HANDLER_MAX_QUEUE = 500
+
+# Адрес Bot API; None - api.telegram.org. Для локальной проверки: 'http://127.0.0.1:8081' (tools/stub_telegram.py)
+TELEGRAM_API_URL = None
+
+ACTIVITY_FLUSH_INTERVAL = 10  # секунд между записями last_activity в БД
+STATS_CACHE_TTL = 60  # секунд, сколько /stats отвечает из кэша
+STATS_TREND_DAYS = 14  # дней в тренде /stats по умолчанию
+
+# Предвыборка соседних страниц выдачи: сколько готовых страниц держим на пользователя (0 - выключено)
+PREFETCH_BUDGET = 2
+PREFETCH_MAX_USERS = 1000
+
+# Избранное: кнопок на странице меню, сколько пользователей держим в памяти и как часто перечитываем из БД
+FAVORITES_PAGE_SIZE = 8
+FAVORITES_MAX_USERS = 10000
+FAVORITES_TTL = 300  # секунд
+
+# Сохранённых поисков (подписок на новые объекты) на пользователя
+SAVED_SEARCHES_PER_USER = 10
+
+# Планировщик задач (app/scheduler.py): расписания в формате cron, опрос таблицы jobs и срок аренды задачи
+NOTIFY_SCHEDULE = '0 10 * * *'  # рассылка новых объектов подписчикам - каждый день в 10:00
+NOTIFY_LOOKBACK_DAYS = 7  # неразосланные объекты старше этого не рассылаются
+# Пересчёт сводки рейтингов property_rating - на случай правок reviews в обход /approve_review и /reject_review
+RATINGS_REBUILD_SCHEDULE = '30 4 * * *'
+SCHEDULER_POLL_INTERVAL = 30  # секунд
+SCHEDULER_LEASE = 300  # секунд; продлевается, пока задача идёт
+
+# Метрики обработчиков, БД и Bot API в формате Prometheus: http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_ENABLED = True
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9101
+
 ADMINS = [575225733, 666173048, 2094468143, 7039035890]  # 666173048, 2094468143, 7039035890
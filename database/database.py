@@ -1,14 +1,65 @@
 # database.py
+import asyncio
+import itertools
+import json
 import logging
-from datetime import datetime
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
 
 import aiomysql
 
+from database.profiler import QueryProfiler
+
+# Пересчёт сводки рейтингов property_rating с нуля по одобренным отзывам
+REBUILD_PROPERTY_RATINGS = """
+INSERT INTO property_rating (property_id, rating_sum, rating_count)
+SELECT property_id, SUM(rating), COUNT(*) FROM reviews WHERE approved = 1 GROUP BY property_id
+"""
+
+# Приращение дневной сводки daily_stats (строки: day, new_users, active_users, searches, favorites)
+ADD_DAILY_STATS = """
+INSERT INTO daily_stats (day, new_users, active_users, searches, favorites) VALUES (%s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE new_users = new_users + VALUES(new_users), active_users = active_users + VALUES(active_users),
+    searches = searches + VALUES(searches), favorites = favorites + VALUES(favorites)
+"""
+
+# Гистограмма last_seen_days: сколько пользователей последний раз были активны в этот день
+ADD_LAST_SEEN_DAYS = """
+INSERT INTO last_seen_days (day, users) VALUES (%s, %s) ON DUPLICATE KEY UPDATE users = users + VALUES(users)
+"""
+
 
 class Database:
     def __init__(self, db_config):
         self.db_config = db_config
         self.pool = None
+        self.minsize = db_config.get('pool_minsize', 1)
+        self.maxsize = db_config.get('pool_maxsize', 10)
+        # Размер пачки для stream_batches и порции для bulk_write по умолчанию
+        self.stream_batch_size = db_config.get('stream_batch_size', 1000)
+
+        # Метрики пула
+        self.waiters = 0
+        self.acquire_count = 0
+        self.acquire_time_total = 0.0
+        self.acquire_time_max = 0.0
+        self.metrics = None
+
+        # Профилировщик запросов и журнал медленных запросов (execute)
+        self.profiler = QueryProfiler(slow_ms=db_config.get('slow_query_ms', 200))
+        self._explain_tasks = set()
+
+    def instrument(self, metrics):
+        """Подключает app.metrics.Metrics: ожидание и удержание соединений, время запросов по методу."""
+        metrics.histogram('db_acquire_wait_seconds', "Time waiting for a pool connection")
+        metrics.histogram('db_connection_hold_seconds', "Time a pool connection is held")
+        metrics.histogram('db_query_duration_seconds', "Database helper call time", ('method',))
+        self.metrics = metrics
+
+    def _observe(self, name, labels, started):
+        if self.metrics is not None:
+            self.metrics.observe(name, labels, time.perf_counter() - started)
 
     async def connect(self):
         try:
@@ -18,11 +69,11 @@ class Database:
                 user=self.db_config['user'],
                 password=self.db_config['password'],
                 db=self.db_config['db'],
-                minsize=1,
-                maxsize=10,
+                minsize=self.minsize,
+                maxsize=self.maxsize,
                 autocommit=True
             )
-            logging.info("Database connection pool created.")
+            logging.info(f"Database connection pool created (minsize={self.minsize}, maxsize={self.maxsize}).")
         except Exception as e:
             logging.error(f"Error creating database connection pool: {e}")
             self.pool = None
@@ -42,31 +93,229 @@ class Database:
         if self.pool is None:
             raise Exception("Failed to connect to the database")
 
-    async def execute_query(self, query, params):
+    async def warm_up(self):
+        """Открывает minsize соединений заранее, чтобы первые запросы не ждали подключения."""
         await self.ensure_connection()
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                await cursor.execute(query, params)
-                await conn.commit()
-                return cursor
 
-    async def fetch_one(self, query, params):
+        async def ping():
+            async with self.acquire() as conn:
+                await conn.ping()
+
+        await asyncio.gather(*(ping() for _ in range(self.minsize)))
+        logging.info(f"Database pool warmed up: {self.pool_stats()}")
+
+    @asynccontextmanager
+    async def acquire(self):
         await self.ensure_connection()
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                await cursor.execute(query, params)
-                return await cursor.fetchone()
+        self.waiters += 1
+        started = time.perf_counter()
+        try:
+            conn = await self.pool.acquire()
+        finally:
+            self.waiters -= 1
+        elapsed = time.perf_counter() - started
+        self.acquire_count += 1
+        self.acquire_time_total += elapsed
+        self.acquire_time_max = max(self.acquire_time_max, elapsed)
+        if self.metrics is not None:
+            self.metrics.observe('db_acquire_wait_seconds', (), elapsed)
+        held = time.perf_counter()
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+            self._observe('db_connection_hold_seconds', (), held)
+
+    def pool_stats(self):
+        if self.pool is None:
+            return {'size': 0, 'free': 0, 'in_use': 0, 'waiters': self.waiters}
+        avg_acquire = self.acquire_time_total / self.acquire_count if self.acquire_count else 0.0
+        return {
+            'size': self.pool.size,
+            'free': self.pool.freesize,
+            'in_use': self.pool.size - self.pool.freesize,
+            'waiters': self.waiters,
+            'acquires': self.acquire_count,
+            'acquire_avg_ms': round(avg_acquire * 1000, 2),
+            'acquire_max_ms': round(self.acquire_time_max * 1000, 2),
+        }
+
+    async def execute(self, cursor, query, params=None):
+        """
+        Единый путь выполнения SQL: все запросы приложения идут через него (или через stream_batches),
+        чтобы попасть в профилировщик. Медленные запросы пишутся в лог вместе с планом EXPLAIN.
+        """
+        started = time.perf_counter()
+        try:
+            result = await cursor.execute(query, params)
+        except Exception:
+            self.profiler.record(query, time.perf_counter() - started, failed=True)
+            raise
+        elapsed = time.perf_counter() - started
+        # У серверного курсора rowcount до конца чтения не определён (2**64 - 1) - такие строки не считаем
+        rows = 0 if isinstance(cursor, aiomysql.SSCursor) else cursor.rowcount
+        stats = self.profiler.record(query, elapsed, rows)
+        if self.profiler.is_slow(elapsed):
+            self._log_slow(query, params, elapsed, rows, stats)
+        return result
+
+    async def executemany(self, cursor, query, rows):
+        started = time.perf_counter()
+        try:
+            result = await cursor.executemany(query, rows)
+        except Exception:
+            self.profiler.record(query, time.perf_counter() - started, failed=True)
+            raise
+        elapsed = time.perf_counter() - started
+        stats = self.profiler.record(query, elapsed, cursor.rowcount)
+        if self.profiler.is_slow(elapsed):
+            self._log_slow(query, None, elapsed, cursor.rowcount, stats, explain=False)
+        return result
+
+    def _log_slow(self, query, params, elapsed, rows, stats, explain=True):
+        self.profiler.slow += 1
+        logging.warning(f"Slow query {elapsed * 1000:.1f} ms, {rows} rows: {stats.fingerprint}")
+        # Для executemany плана не снимаем: параметров одного EXPLAIN там нет
+        if explain and self.profiler.should_explain(query, stats):
+            task = asyncio.create_task(self._explain(query, params, stats.fingerprint))
+            self._explain_tasks.add(task)
+            task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(self, query, params, fingerprint):
+        # Отдельное соединение и мимо execute: план не должен попадать в статистику сам
+        try:
+            async with self.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(f"EXPLAIN {query}", params)
+                    plan = await cursor.fetchall()
+        except Exception as e:
+            logging.warning(f"EXPLAIN failed for slow query {fingerprint}: {e}")
+            return
+        steps = "; ".join(
+            f"{row.get('table')}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')} "
+            f"extra={row.get('Extra')}"
+            for row in plan
+        )
+        logging.warning(f"Slow query plan: {fingerprint} -> {steps}")
+
+    async def execute_query(self, query, params):
+        started = time.perf_counter()
+        try:
+            async with self.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await self.execute(cursor, query, params)
+                    await conn.commit()
+                    return cursor
+        finally:
+            self._observe('db_query_duration_seconds', ('execute_query',), started)
+
+    async def fetch_one(self, query, params):
+        started = time.perf_counter()
+        try:
+            async with self.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await self.execute(cursor, query, params)
+                    return await cursor.fetchone()
+        finally:
+            self._observe('db_query_duration_seconds', ('fetch_one',), started)
 
     async def fetch_all(self, query, params):
-        await self.ensure_connection()
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                await cursor.execute(query, params)
-                return await cursor.fetchall()
+        started = time.perf_counter()
+        try:
+            async with self.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await self.execute(cursor, query, params)
+                    return await cursor.fetchall()
+        finally:
+            self._observe('db_query_duration_seconds', ('fetch_all',), started)
+
+    async def stream_batches(self, query, params=None, batch_size=None):
+        """
+        Асинхронный итератор по результату запроса пачками по batch_size строк (словари) через серверный
+        курсор SSDictCursor: в памяти только текущая пачка, а не весь результат.
+        Соединение занято, пока итерация не закончена, - между пачками не стоит делать долгих операций
+        (отправку сообщений и т.п.), иначе MySQL оборвёт запрос по net_write_timeout.
+        Для досрочного выхода из цикла оборачивайте итератор в contextlib.aclosing.
+        """
+        batch_size = batch_size or self.stream_batch_size
+        started = time.perf_counter()
+        # Мимо execute: в профилировщик идёт время execute и чтения пачек без обработки строк вызывающим кодом,
+        # а строки считаем сами - rowcount у серверного курсора до конца чтения не известен
+        elapsed = 0.0
+        rows = 0
+        failed = True
+        try:
+            async with self.acquire() as conn:
+                async with conn.cursor(aiomysql.SSDictCursor) as cursor:
+                    try:
+                        step = time.perf_counter()
+                        await cursor.execute(query, params)
+                        elapsed += time.perf_counter() - step
+                        while True:
+                            step = time.perf_counter()
+                            batch = await cursor.fetchmany(batch_size)
+                            elapsed += time.perf_counter() - step
+                            if not batch:
+                                break
+                            rows += len(batch)
+                            yield batch
+                        failed = False
+                    finally:
+                        stats = self.profiler.record(query, elapsed, rows, failed=failed)
+                        if not failed and self.profiler.is_slow(elapsed):
+                            self._log_slow(query, params, elapsed, rows, stats)
+        finally:
+            self._observe('db_query_duration_seconds', ('stream',), started)
+
+    async def stream(self, query, params=None, batch_size=None):
+        """Построчная версия stream_batches: async for row in db.stream(...)."""
+        async for batch in self.stream_batches(query, params, batch_size):
+            for row in batch:
+                yield row
+
+    async def bulk_write(self, query, rows, chunk_size=None):
+        """
+        Многострочная запись (INSERT ... VALUES / UPDATE ... WHERE с параметрами на строку) через executemany
+        порциями по chunk_size строк, каждая порция - отдельная транзакция. rows - любой итерируемый объект,
+        например генератор, поэтому в памяти держится только текущая порция. Возвращает число затронутых строк.
+        """
+        chunk_size = chunk_size or self.stream_batch_size
+        started = time.perf_counter()
+        affected = 0
+        rows = iter(rows)
+        try:
+            async with self.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    while True:
+                        chunk = list(itertools.islice(rows, chunk_size))
+                        if not chunk:
+                            break
+                        await conn.begin()
+                        try:
+                            await self.executemany(cursor, query, chunk)
+                            await conn.commit()
+                        except Exception:
+                            await conn.rollback()
+                            raise
+                        affected += max(cursor.rowcount, 0)
+        finally:
+            self._observe('db_query_duration_seconds', ('bulk_write',), started)
+        return affected
 
     async def add_user(self, user_id, tg_name=None):
         query = "INSERT INTO users (user_id, username) VALUES (%s, %s) ON DUPLICATE KEY UPDATE username = %s"
-        await self.execute_query(query, (user_id, tg_name, tg_name))
+        async with self.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await self.execute(cursor, query, (user_id, tg_name, tg_name))
+                    # rowcount 1 - вставлена новая строка (2 и 0 - пользователь уже был): считаем в new_users дня
+                    if cursor.rowcount == 1:
+                        await self.execute(cursor, ADD_DAILY_STATS, (date.today(), 1, 0, 0, 0))
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
 
     async def get_user_info(self, user_id):
         query = "SELECT * FROM users WHERE user_id = %s"
@@ -92,6 +341,73 @@ class Database:
     async def update_user_email(self, user_id, email):
         await self.update_user_field(user_id, 'email', email)
 
+    async def _lock_review(self, cursor, review_id):
+        await self.execute(
+            cursor, "SELECT property_id, rating, approved FROM reviews WHERE review_id = %s FOR UPDATE", (review_id,)
+        )
+        return await cursor.fetchone()
+
+    async def approve_review(self, review_id):
+        """Одобряет отзыв и в той же транзакции добавляет его оценку в сводку property_rating."""
+        async with self.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    review = await self._lock_review(cursor, review_id)
+                    if not review or review[2]:
+                        await conn.rollback()
+                        return False
+                    property_id, rating, _ = review
+                    await self.execute(cursor, "UPDATE reviews SET approved = 1 WHERE review_id = %s", (review_id,))
+                    await self.execute(cursor, """
+                    INSERT INTO property_rating (property_id, rating_sum, rating_count) VALUES (%s, %s, 1)
+                    ON DUPLICATE KEY UPDATE rating_sum = rating_sum + VALUES(rating_sum), rating_count = rating_count + 1
+                    """, (property_id, rating))
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        return True
+
+    async def reject_review(self, review_id):
+        """Удаляет отзыв; если он уже был одобрен, вычитает его оценку из сводки property_rating."""
+        async with self.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    review = await self._lock_review(cursor, review_id)
+                    if not review:
+                        await conn.rollback()
+                        return False
+                    property_id, rating, approved = review
+                    await self.execute(cursor, "DELETE FROM reviews WHERE review_id = %s", (review_id,))
+                    if approved:
+                        await self.execute(cursor, """
+                        UPDATE property_rating SET rating_sum = rating_sum - %s, rating_count = rating_count - 1
+                        WHERE property_id = %s
+                        """, (rating, property_id))
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        return True
+
+    async def rebuild_property_ratings(self):
+        """Полный пересчёт property_rating: бэкфилл и исправление после ручных правок reviews."""
+        async with self.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await self.execute(cursor, "DELETE FROM property_rating")
+                    await self.execute(cursor, REBUILD_PROPERTY_RATINGS)
+                    rows = cursor.rowcount
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        logging.info(f"Property ratings rebuilt: {rows} properties")
+        return rows
+
     async def get_properties(self, property_type=None, number_of_beds=None, location=None):
         query = """
         SELECT property_id, title, location, distance_to_sea, category, monthly_price, daily_price,
@@ -105,18 +421,25 @@ class Database:
         return await self.fetch_all(query, params)
 
     async def add_property_to_favorites(self, user_id, property_id):
-        query = "INSERT INTO favorites (user_id, property_id) VALUES (%s, %s)"
-        await self.execute_query(query, (user_id, property_id))
+        """True, если строка добавлена; повтор отсекается в самом запросе, а не только по кэшу вызывающего."""
+        query = """
+        INSERT INTO favorites (user_id, property_id)
+        SELECT %s, %s FROM DUAL
+        WHERE NOT EXISTS (
+            SELECT 1 FROM favorites WHERE user_id = %s AND property_id = %s
+        )
+        """
+        cursor = await self.execute_query(query, (user_id, property_id, user_id, property_id))
+        return cursor.rowcount > 0
 
     async def save_notification(self, photo, message):
         query = """
         INSERT INTO newsletters (photo, message, sent_at)
         VALUES (%s, %s, NOW())
         """
+        # Курсор уже закрыт вместе с соединением - id берём из lastrowid, а не повторным SELECT LAST_INSERT_ID()
         cursor = await self.execute_query(query, (photo, message))
-        await cursor.execute("SELECT LAST_INSERT_ID()")
-        result = await cursor.fetchone()
-        return result[0]
+        return cursor.lastrowid
 
     async def get_notification(self, notification_id):
         query = "SELECT photo, caption FROM notifications WHERE id = %s"
@@ -130,26 +453,141 @@ class Database:
         query = "UPDATE users SET notifications_enabled = FALSE WHERE user_id = %s"
         await self.execute_query(query, (user_id,))
 
-    async def get_detailed_user_statistics(self):
-        query_total_users = "SELECT COUNT(*) FROM users"
-        query_active_users = """
-           SELECT COUNT(*)
-           FROM users
-           WHERE last_activity >= NOW() - INTERVAL 1 WEEK
-           """
-        query_new_users = """
-           SELECT COUNT(*)
-           FROM users
-           WHERE created_at >= NOW() - INTERVAL 1 WEEK
-           """
-
-        total_users = await self.fetch_one(query_total_users, ())
-        active_users = await self.fetch_one(query_active_users, ())
-        new_users = await self.fetch_one(query_new_users, ())
+    async def save_search(self, user_id, search_filter):
+        query = "INSERT INTO saved_searches (user_id, search_filter) VALUES (%s, %s)"
+        await self.execute_query(query, (user_id, json.dumps(search_filter, sort_keys=True, ensure_ascii=False)))
 
-        return {
-            'total_users': total_users[0],
-            'active_users': active_users[0],
-            'new_users': new_users[0]
-        }
+    async def get_saved_searches(self, user_id):
+        query = "SELECT search_id, search_filter FROM saved_searches WHERE user_id = %s ORDER BY search_id"
+        rows = await self.fetch_all(query, (user_id,))
+        return [(search_id, json.loads(search_filter)) for search_id, search_filter in rows]
 
+    async def delete_saved_search(self, user_id, search_id):
+        query = "DELETE FROM saved_searches WHERE search_id = %s AND user_id = %s"
+        await self.execute_query(query, (search_id, user_id))
+
+    async def iter_alert_subscriptions(self, notified_at, batch_size=None):
+        """
+        Сохранённые поиски пользователей с включёнными уведомлениями, которым текущий прогон рассылки
+        (отметка notified_at) ещё не писал, - пачками через серверный курсор, чтобы не держать в памяти все подписки.
+        """
+        query = """
+        SELECT s.search_id, s.user_id, s.search_filter
+        FROM saved_searches s
+        JOIN users u ON u.user_id = s.user_id
+        WHERE u.notifications_enabled = TRUE AND (u.last_notified IS NULL OR u.last_notified < %s)
+        """
+        async for batch in self.stream_batches(query, (notified_at,), batch_size):
+            for row in batch:
+                row['search_filter'] = json.loads(row['search_filter'])
+            yield batch
+
+    async def iter_users(self, batch_size=None):
+        """Все пользователи пачками через серверный курсор - для выгрузок, не зависящих по памяти от размера users."""
+        query = """
+        SELECT user_id, username, email, phone_number, notifications_enabled, created_at, last_login, last_activity
+        FROM users
+        """
+        async for batch in self.stream_batches(query, None, batch_size):
+            yield batch
+
+    async def record_activity(self, last_seen):
+        """
+        Записывает last_activity ({user_id: datetime}) и в той же транзакции ведёт сводки: гистограмму
+        last_seen_days и active_users в daily_stats. Прежние last_activity читаются SELECT ... FOR UPDATE,
+        поэтому при записи с нескольких реплик счётчики точные: пользователь попадает в active_users дня один раз -
+        когда его last_activity впервые переходит на этот день. Более старые отметки, чем уже записанные, пропускаются.
+        Как и прежний UPDATE, пользователей не создаёт: отметки незарегистрированных (до /start) отбрасываются,
+        регистрация и new_users - только в add_user.
+        """
+        user_ids = sorted(last_seen)
+        for start in range(0, len(user_ids), self.stream_batch_size):
+            chunk = user_ids[start:start + self.stream_batch_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            async with self.acquire() as conn:
+                await conn.begin()
+                try:
+                    async with conn.cursor() as cursor:
+                        await self.execute(cursor, f"""
+                        SELECT user_id, last_activity FROM users WHERE user_id IN ({placeholders}) FOR UPDATE
+                        """, chunk)
+                        previous = dict(await cursor.fetchall())
+
+                        rows, seen, daily = [], {}, {}
+                        for user_id in chunk:
+                            if user_id not in previous:
+                                continue
+                            moment = last_seen[user_id]
+                            day = moment.date()
+                            before = previous[user_id]
+                            if before is not None and before >= moment:
+                                continue
+                            rows.append((user_id, moment))
+                            before_day = before.date() if before is not None else None
+                            if before_day != day:
+                                seen[day] = seen.get(day, 0) + 1
+                                if before_day is not None:
+                                    seen[before_day] = seen.get(before_day, 0) - 1
+                                daily[day] = daily.get(day, 0) + 1
+
+                        if rows:
+                            # Все строки существуют и заблокированы FOR UPDATE - многострочный INSERT здесь
+                            # только обновляет last_activity (один запрос вместо UPDATE на пользователя)
+                            await self.executemany(cursor, """
+                            INSERT INTO users (user_id, last_activity) VALUES (%s, %s)
+                            ON DUPLICATE KEY UPDATE last_activity = VALUES(last_activity)
+                            """, rows)
+                        if seen:
+                            await self.executemany(cursor, ADD_LAST_SEEN_DAYS, sorted(seen.items()))
+                        if daily:
+                            await self.executemany(cursor, ADD_DAILY_STATS, [
+                                (day, 0, active_users, 0, 0) for day, active_users in sorted(daily.items())
+                            ])
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+    async def add_daily_counts(self, counts):
+        """counts - {(day, 'searches' | 'favorites'): n}; прибавляет к daily_stats одним многострочным INSERT."""
+        rows = {}
+        for (day, event), count in counts.items():
+            row = rows.setdefault(day, {'searches': 0, 'favorites': 0})
+            row[event] += count
+        await self.bulk_write(ADD_DAILY_STATS, [
+            (day, 0, 0, row['searches'], row['favorites']) for day, row in sorted(rows.items())
+        ])
+
+    async def get_detailed_user_statistics(self, today=None):
+        """
+        Сводка за неделю и месяц (последние 7 и 30 дней, включая сегодня) одним запросом по дневным сводкам:
+        стоимость зависит от числа дней, а не пользователей. Активные за период точные - из last_seen_days
+        (каждый пользователь учтён один раз, в день последней активности).
+        """
+        today = today or date.today()
+        week, month = today - timedelta(days=6), today - timedelta(days=29)
+        query = """
+        SELECT
+            COALESCE(SUM(new_users), 0),
+            COALESCE(SUM(IF(day >= %s, new_users, 0)), 0),
+            COALESCE(SUM(IF(day >= %s, new_users, 0)), 0),
+            COALESCE(SUM(IF(day = %s, active_users, 0)), 0),
+            (SELECT COALESCE(SUM(users), 0) FROM last_seen_days WHERE day >= %s),
+            (SELECT COALESCE(SUM(users), 0) FROM last_seen_days WHERE day >= %s),
+            COALESCE(SUM(IF(day >= %s, searches, 0)), 0),
+            COALESCE(SUM(IF(day >= %s, searches, 0)), 0),
+            COALESCE(SUM(IF(day >= %s, favorites, 0)), 0),
+            COALESCE(SUM(IF(day >= %s, favorites, 0)), 0)
+        FROM daily_stats
+        """
+        row = await self.fetch_one(query, (week, month, today, week, month, week, month, week, month))
+        keys = ('total_users', 'new_users', 'new_users_month', 'active_today', 'active_users', 'active_users_month',
+                'searches', 'searches_month', 'favorites', 'favorites_month')
+        return dict(zip(keys, (int(value) for value in row)))
+
+    async def get_daily_stats(self, since):
+        """Дневные значения с даты since по сегодня - для графиков трендов."""
+        query = """
+        SELECT day, new_users, active_users, searches, favorites FROM daily_stats WHERE day >= %s ORDER BY day
+        """
+        return await self.fetch_all(query, (since,))
@@ -0,0 +1,109 @@
+"""
+Проверка планов поисковых запросов: ни одна комбинация фильтров из FACET_ITEMS
+не должна приводить к полному сканированию таблицы properties - ни строк (type ALL), ни всего индекса (type index).
+Исключение - пустой фильтр: это весь каталог, его нельзя посчитать, не прочитав всё.
+
+Автоматически выполняется в tests/test_search_plans.py (пропускается без БД).
+Запуск вручную (нужна БД из config.py с применёнными миграциями):
+    python -m database.explain_check
+"""
+import asyncio
+import itertools
+import sys
+
+import aiomysql
+
+from config import db_config
+from database.database import Database
+from database.properties import build_count_query, build_page_query
+from handlers.handlers_search import FACET_ITEMS
+
+FACETS = [
+    ('rent_type', 'rent_types', False),
+    ('property_types', 'types', True),
+    ('locations', 'districts', True),
+    ('bedrooms', 'beds', True),
+    ('bathrooms', 'baths', True),
+    ('price_range', 'price_ranges', False),
+]
+
+# Типы доступа EXPLAIN, означающие чтение всей таблицы или всего индекса
+FULL_SCAN_TYPES = ('ALL', 'index')
+
+
+def facet_options(data, data_key, multiple):
+    """Каждое значение фасета по отдельности, а для множественного выбора ещё и все значения сразу."""
+    values = [item_id for _, item_id in data[data_key]]
+    if not multiple:
+        return values
+    return [[value] for value in values] + [values]
+
+
+def filter_combinations(data):
+    """
+    Для каждого подмножества фасетов - столько фильтров, сколько вариантов у самого длинного из выбранных фасетов:
+    i-й фильтр берёт i-й вариант каждого фасета (по кругу). Так каждое значение каждого фасета проверяется
+    в сочетании с любым набором остальных фасетов, без полного декартова произведения.
+    """
+    options = [facet_options(data, data_key, multiple) for _, data_key, multiple in FACETS]
+    for mask in itertools.product((False, True), repeat=len(FACETS)):
+        enabled = [facet_values for on, facet_values in zip(mask, options) if on]
+        for number in range(max((len(facet_values) for facet_values in enabled), default=1)):
+            search_filter = {}
+            for on, (key, _, multiple), facet_values in zip(mask, FACETS, options):
+                if on:
+                    search_filter[key] = facet_values[number % len(facet_values)]
+                else:
+                    search_filter[key] = [] if multiple else None
+            yield search_filter
+
+
+def search_queries(search_filter):
+    return [
+        build_count_query(search_filter),
+        build_page_query(search_filter),
+        build_page_query(search_filter, keyset=[50000, 100], direction='next'),
+        build_page_query(search_filter, keyset=[50000, 100], direction='prev'),
+    ]
+
+
+def is_full_scan(row):
+    return row['table'] == 'properties' and row['type'] in FULL_SCAN_TYPES
+
+
+async def explain(db: Database, query, params):
+    async with db.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await db.execute(cursor, f"EXPLAIN {query}", params)
+            return await cursor.fetchall()
+
+
+async def find_full_scans(db: Database):
+    """[(фильтр, тип доступа, запрос)] для всех планов с полным сканированием."""
+    failures = []
+    for search_filter in filter_combinations(FACET_ITEMS):
+        if not any(search_filter.values()):
+            continue
+        for query, params in search_queries(search_filter):
+            for row in await explain(db, query, params):
+                if is_full_scan(row):
+                    failures.append((search_filter, row['type'], " ".join(query.split())))
+    return failures
+
+
+async def main():
+    db = Database(db_config)
+    await db.connect()
+    try:
+        failures = await find_full_scans(db)
+    finally:
+        await db.disconnect()
+
+    for search_filter, scan_type, query in failures:
+        print(f"FULL SCAN ({scan_type}): {search_filter}\n    {query}")
+    print(f"{len(failures)} full scans found")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,155 @@
+import logging
+
+from database.database import Database, REBUILD_PROPERTY_RATINGS
+
+# Миграции применяются по порядку и только один раз, список применённых хранится в schema_migrations
+MIGRATIONS = [
+    ("0001_photo_file_ids", [
+        """
+        CREATE TABLE IF NOT EXISTS photo_file_ids (
+            url VARCHAR(512) NOT NULL PRIMARY KEY,
+            property_id INT NOT NULL,
+            file_id VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_photo_file_ids_property (property_id)
+        )
+        """,
+    ]),
+    # Нормализованные колонки и индексы для поиска (build_search_conditions в database/properties.py)
+    ("0002_properties_search_indexes", [
+        """
+        ALTER TABLE properties
+            ADD COLUMN property_type_norm VARCHAR(128) AS (LOWER(TRIM(property_type))) STORED,
+            ADD COLUMN location_norm VARCHAR(128) AS (LOWER(TRIM(location))) STORED,
+            ADD COLUMN price_sort DECIMAL(12, 2) AS (COALESCE(monthly_price, 0)) STORED
+        """,
+        """
+        CREATE INDEX idx_properties_search
+            ON properties (rent_type, location_norm, property_type_norm, bedrooms, bathrooms, price_sort)
+        """,
+        "CREATE INDEX idx_properties_location ON properties (location_norm, price_sort, property_id)",
+        "CREATE INDEX idx_properties_type ON properties (property_type_norm, price_sort, property_id)",
+        "CREATE INDEX idx_properties_price ON properties (price_sort, property_id)",
+    ]),
+    # Водяной знак для инкрементального обновления каталога в памяти (app/catalog.py)
+    ("0003_properties_updated_at", [
+        """
+        ALTER TABLE properties
+            ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            ADD INDEX idx_properties_updated_at (updated_at)
+        """,
+    ]),
+    # Сводка рейтингов вместо GROUP BY по reviews на каждый запрос; ведётся в Database.approve_review / reject_review
+    ("0004_property_rating", [
+        """
+        CREATE TABLE IF NOT EXISTS property_rating (
+            property_id INT NOT NULL PRIMARY KEY,
+            rating_sum INT NOT NULL DEFAULT 0,
+            rating_count INT NOT NULL DEFAULT 0,
+            avg_rating DECIMAL(4, 2) AS (rating_sum / NULLIF(rating_count, 0)) STORED,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """,
+        REBUILD_PROPERTY_RATINGS,
+    ]),
+    # Сохранённые поиски - подписки на новые объекты (app/alerts.py)
+    ("0005_saved_searches", [
+        """
+        CREATE TABLE IF NOT EXISTS saved_searches (
+            search_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            search_filter TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            KEY idx_saved_searches_user (user_id)
+        )
+        """,
+    ]),
+    # Планировщик периодических задач с арендой и контрольными точками (app/scheduler.py)
+    ("0006_jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            name VARCHAR(64) NOT NULL PRIMARY KEY,
+            schedule VARCHAR(64) NOT NULL,
+            next_run_at DATETIME NOT NULL,
+            lease_owner VARCHAR(128) DEFAULT NULL,
+            lease_until DATETIME DEFAULT NULL,
+            checkpoint TEXT DEFAULT NULL,
+            last_run_at DATETIME DEFAULT NULL,
+            last_status VARCHAR(16) DEFAULT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS job_runs (
+            run_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            job_name VARCHAR(64) NOT NULL,
+            owner VARCHAR(128) NOT NULL,
+            started_at DATETIME NOT NULL,
+            finished_at DATETIME DEFAULT NULL,
+            status VARCHAR(16) NOT NULL,
+            items INT NOT NULL DEFAULT 0,
+            duration_ms INT DEFAULT NULL,
+            error TEXT DEFAULT NULL,
+            KEY idx_job_runs_job (job_name, started_at)
+        )
+        """,
+    ]),
+    # Дневные сводки для статистики админов (app/stats.py); ведутся в Database.add_user / record_activity
+    ("0007_daily_stats", [
+        """
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day DATE NOT NULL PRIMARY KEY,
+            new_users INT NOT NULL DEFAULT 0,
+            active_users INT NOT NULL DEFAULT 0,
+            searches INT NOT NULL DEFAULT 0,
+            favorites INT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS last_seen_days (
+            day DATE NOT NULL PRIMARY KEY,
+            users INT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        INSERT INTO daily_stats (day, new_users)
+        SELECT DATE(COALESCE(created_at, last_activity, NOW())) AS day, COUNT(*) FROM users GROUP BY day
+        """,
+        """
+        INSERT INTO last_seen_days (day, users)
+        SELECT DATE(last_activity), COUNT(*) FROM users WHERE last_activity IS NOT NULL GROUP BY DATE(last_activity)
+        """,
+        # Прошлые дневные активные по users не восстановить - берём нижнюю оценку: у кого этот день последний
+        """
+        INSERT INTO daily_stats (day, active_users)
+        SELECT day, users FROM last_seen_days
+        ON DUPLICATE KEY UPDATE active_users = VALUES(active_users)
+        """,
+    ]),
+    # Фильтры только по спальням и/или ванным не попадали ни в один индекс из 0002 (database/explain_check.py)
+    ("0008_properties_rooms_indexes", [
+        "CREATE INDEX idx_properties_bedrooms ON properties (bedrooms, bathrooms, price_sort, property_id)",
+        "CREATE INDEX idx_properties_bathrooms ON properties (bathrooms, price_sort, property_id)",
+    ]),
+]
+
+
+async def apply_migrations(db: Database):
+    async with db.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await db.execute(cursor, """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name VARCHAR(128) NOT NULL PRIMARY KEY,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            await db.execute(cursor, "SELECT name FROM schema_migrations")
+            applied = {row[0] for row in await cursor.fetchall()}
+
+            for name, statements in MIGRATIONS:
+                if name in applied:
+                    continue
+                for statement in statements:
+                    await db.execute(cursor, statement)
+                await db.execute(cursor, "INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+                await conn.commit()
+                logging.info(f"Applied migration {name}")
@@ -0,0 +1,151 @@
+import contextvars
+import re
+import time
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_SPACES = re.compile(r"\s+")
+
+# Счётчик запросов, сделанных в текущем контексте (обработка одного шага нагрузочного прогона, см. tools/load_test.py).
+# Задачи, запущенные из контекста, наследуют тот же словарь - их запросы засчитываются вызвавшему шагу
+query_counter = contextvars.ContextVar('query_counter', default=None)
+
+# Для каких запросов при медленном выполнении показываем EXPLAIN
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+
+def normalize(query):
+    """Отпечаток запроса: литералы и плейсхолдеры -> ?, списки IN (...) и VALUES (...), (...) схлопнуты."""
+    fingerprint = _STRING.sub('?', query)
+    fingerprint = _PLACEHOLDER.sub('?', fingerprint)
+    fingerprint = _NUMBER.sub('?', fingerprint)
+    fingerprint = _SPACES.sub(' ', fingerprint).strip()
+    fingerprint = _IN_LIST.sub('IN (...)', fingerprint)
+    fingerprint = _VALUES_LIST.sub(r'\1, ...', fingerprint)
+    return fingerprint
+
+
+class StatementStats:
+    def __init__(self, fingerprint, samples):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self._samples = [0.0] * samples
+        self._next = 0
+        self.explained_at = 0.0
+
+    def add(self, elapsed, rows):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        if rows and rows > 0:
+            self.rows += rows
+        # Кольцевой буфер последних длительностей - для p99 без хранения всей истории
+        self._samples[self._next % len(self._samples)] = elapsed
+        self._next += 1
+
+    def p99(self):
+        samples = sorted(self._samples[:min(self._next, len(self._samples))])
+        return samples[int(0.99 * (len(samples) - 1))] if samples else 0.0
+
+    def as_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total * 1000, 1),
+            'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            'p99_ms': round(self.p99() * 1000, 2),
+            'max_ms': round(self.max * 1000, 2),
+            'rows': self.rows,
+        }
+
+
+class QueryProfiler:
+    """
+    Статистика по отпечаткам SQL-запросов: число вызовов, суммарное время, p99 (по последним samples вызовам),
+    строки. Заполняется из Database.execute (и stream_batches для серверных курсоров).
+    Запросы дольше slow_ms считаются медленными; EXPLAIN для одного отпечатка снимается не чаще раза
+    в explain_interval секунд.
+    """
+
+    ORDERS = ('total', 'p99', 'count', 'rows')
+
+    def __init__(self, slow_ms=200, samples=512, explain_interval=300, max_fingerprints=2000):
+        self.slow_ms = slow_ms
+        self.samples = samples
+        self.explain_interval = explain_interval
+        self.max_fingerprints = max_fingerprints
+        self._fingerprints = {}
+        self._stats = {}
+        self.slow = 0
+        self.started_at = time.time()
+
+    def fingerprint(self, query):
+        fingerprint = self._fingerprints.get(query)
+        if fingerprint is None:
+            fingerprint = normalize(query)
+            # Запросы с IN (...) дают разные строки; кэш текстов ограничиваем
+            if len(self._fingerprints) < self.max_fingerprints * 4:
+                self._fingerprints[query] = fingerprint
+        return fingerprint
+
+    def _entry(self, query):
+        fingerprint = self.fingerprint(query)
+        stats = self._stats.get(fingerprint)
+        if stats is None:
+            if len(self._stats) >= self.max_fingerprints:
+                fingerprint = '<other>'
+                stats = self._stats.get(fingerprint)
+            if stats is None:
+                stats = self._stats[fingerprint] = StatementStats(fingerprint, self.samples)
+        return stats
+
+    def record(self, query, elapsed, rows=0, failed=False):
+        counter = query_counter.get()
+        if counter is not None:
+            counter['queries'] = counter.get('queries', 0) + 1
+        stats = self._entry(query)
+        stats.add(elapsed, rows)
+        if failed:
+            stats.errors += 1
+        return stats
+
+    def is_slow(self, elapsed):
+        return self.slow_ms is not None and elapsed * 1000 >= self.slow_ms
+
+    def should_explain(self, query, stats):
+        if not query.lstrip().upper().startswith(EXPLAINABLE):
+            return False
+        now = time.monotonic()
+        if stats.explained_at and now - stats.explained_at < self.explain_interval:
+            return False
+        stats.explained_at = now
+        return True
+
+    def top(self, n=10, order='total'):
+        key = {
+            'total': lambda stats: stats.total,
+            'p99': lambda stats: stats.p99(),
+            'count': lambda stats: stats.count,
+            'rows': lambda stats: stats.rows,
+        }[order]
+        return [stats.as_dict() for stats in sorted(self._stats.values(), key=key, reverse=True)[:n]]
+
+    def reset(self):
+        self._stats.clear()
+        self.slow = 0
+        self.started_at = time.time()
+
+    def stats(self):
+        return {
+            'statements': len(self._stats),
+            'calls': sum(stats.count for stats in self._stats.values()),
+            'slow': self.slow,
+        }
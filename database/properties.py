@@ -0,0 +1,234 @@
+import logging
+
+import aiomysql
+
+from database.database import Database
+
+PROPERTY_COLUMNS = """
+    property_id, name, location, distance_to_sea, property_type, monthly_price, daily_price,
+    booking_deposit_fixed, security_deposit, bedrooms, bathrooms, pool, kitchen, cleaning, description, utility_bill,
+    photo1, photo2, photo3, photo4, photo5, photo6, photo7, photo8, photo9, air_conditioners
+"""
+
+# Ключ сортировки результатов поиска: (price_sort, property_id) по убыванию.
+# price_sort - хранимая генерируемая колонка COALESCE(monthly_price, 0), см. миграцию 0002
+SORT_PRICE = "price_sort"
+
+RENT_TYPE_VALUES = {
+    'monthly': ('monthly', 'both'),
+    'daily': ('daily', 'both'),
+    'both': ('monthly', 'daily', 'both'),
+}
+
+
+def in_clause(column, values):
+    placeholders = ", ".join(["%s"] * len(values))
+    return f"{column} IN ({placeholders})"
+
+
+def make_search_filter(user_data):
+    """Собирает фильтр поиска из выбранных пользователем значений в FSM."""
+    return {
+        'rent_type': user_data.get("selected_rent_type"),
+        'property_types': list(user_data.get("selected_types") or []),
+        'locations': list(user_data.get("selected_districts") or []),
+        'bedrooms': list(user_data.get("selected_beds") or []),
+        'bathrooms': list(user_data.get("selected_baths") or []),
+        'price_range': user_data.get("selected_price"),
+    }
+
+
+def build_search_conditions(search_filter):
+    """
+    Условия поиска по нормализованным колонкам (property_type_norm, location_norm),
+    чтобы MySQL мог использовать индексы вместо LOWER(...) LIKE '%...%'.
+    """
+    conditions = []
+    params = []
+
+    rent_type = search_filter.get('rent_type')
+    if rent_type in RENT_TYPE_VALUES:
+        conditions.append(in_clause("rent_type", RENT_TYPE_VALUES[rent_type]))
+        params.extend(RENT_TYPE_VALUES[rent_type])
+
+    property_types = search_filter.get('property_types')
+    if property_types:
+        conditions.append(in_clause("property_type_norm", property_types))
+        params.extend([ptype.strip().lower() for ptype in property_types])
+
+    locations = search_filter.get('locations')
+    if locations:
+        conditions.append(in_clause("location_norm", locations))
+        params.extend([location.strip().lower() for location in locations])
+
+    bedrooms = search_filter.get('bedrooms')
+    if bedrooms:
+        conditions.append("bedrooms >= %s")
+        params.append(min(map(int, bedrooms)))
+
+    bathrooms = search_filter.get('bathrooms')
+    if bathrooms:
+        conditions.append("bathrooms >= %s")
+        params.append(min(map(int, bathrooms)))
+
+    price_range = search_filter.get('price_range')
+    if price_range:
+        min_price, max_price = parse_price_range(price_range)
+        conditions.append(f"{SORT_PRICE} BETWEEN %s AND %s")
+        params.extend([min_price, max_price])
+
+    return conditions, params
+
+
+def parse_price_range(price_range):
+    if '-' in price_range:
+        min_price, max_price = map(int, price_range.split('-'))
+        return min_price, max_price
+    return int(price_range.rstrip('+')), 2000000
+
+
+def property_keyset(property):
+    """Позиция объекта в выдаче, которую храним в FSM вместо самих строк."""
+    return [property['monthly_price'] or 0, property['property_id']]
+
+
+async def _fetch_one(db: Database, query, params):
+    async with db.acquire() as conn:
+        try:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await db.execute(cursor, query, params)
+                return await cursor.fetchone()
+        except aiomysql.MySQLError as e:
+            logging.error(f"Database error: {e}")
+        except Exception as e:
+            logging.error(f"Unexpected error: {e}")
+    return None
+
+
+def build_count_query(search_filter):
+    conditions, params = build_search_conditions(search_filter)
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    return f"SELECT COUNT(*) AS total FROM properties WHERE {where_clause}", params
+
+
+def build_page_query(search_filter, keyset=None, direction='next'):
+    conditions, params = build_search_conditions(search_filter)
+
+    if keyset is not None:
+        price, property_id = keyset
+        if direction == 'next':
+            conditions.append(f"({SORT_PRICE} < %s OR ({SORT_PRICE} = %s AND property_id < %s))")
+        else:
+            conditions.append(f"({SORT_PRICE} > %s OR ({SORT_PRICE} = %s AND property_id > %s))")
+        params.extend([price, price, property_id])
+
+    order = "DESC" if direction == 'next' else "ASC"
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+    query = f"""
+    SELECT {PROPERTY_COLUMNS}
+    FROM properties
+    WHERE {where_clause}
+    ORDER BY {SORT_PRICE} {order}, property_id {order}
+    LIMIT 1
+    """
+    return query, params
+
+
+async def count_properties(db: Database, search_filter):
+    query, params = build_count_query(search_filter)
+    row = await _fetch_one(db, query, params)
+    return row['total'] if row else 0
+
+
+async def fetch_property_page(db: Database, search_filter, keyset=None, direction='next'):
+    """
+    Возвращает один объект выдачи относительно keyset (monthly_price, property_id).
+    Без keyset - первый объект, direction='next' - следующий, 'prev' - предыдущий.
+    """
+    query, params = build_page_query(search_filter, keyset, direction)
+    return await _fetch_one(db, query, params)
+
+
+async def fetch_property_at(db: Database, search_filter, offset):
+    """Переход на произвольную страницу выдачи (используется только для page_ кнопок)."""
+    conditions, params = build_search_conditions(search_filter)
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+    query = f"""
+    SELECT {PROPERTY_COLUMNS}
+    FROM properties
+    WHERE {where_clause}
+    ORDER BY {SORT_PRICE} DESC, property_id DESC
+    LIMIT 1 OFFSET %s
+    """
+    return await _fetch_one(db, query, params + [offset])
+
+
+async def _fetch_all(db: Database, query, params):
+    async with db.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await db.execute(cursor, query, params)
+            return await cursor.fetchall()
+
+
+async def fetch_property(db: Database, property_id):
+    query = """
+    SELECT p.*, r.avg_rating
+    FROM properties p
+    LEFT JOIN property_rating r
+    ON p.property_id = r.property_id
+    WHERE p.property_id = %s
+    """
+    return await _fetch_one(db, query, (property_id,))
+
+
+async def fetch_favorite_ids(db: Database, user_id):
+    rows = await _fetch_all(db, "SELECT property_id FROM favorites WHERE user_id = %s ORDER BY property_id",
+                            (user_id,))
+    return [row['property_id'] for row in rows]
+
+
+async def fetch_property_names(db: Database, property_ids):
+    """Только названия - для кнопок меню избранного."""
+    if not property_ids:
+        return {}
+    query = f"SELECT property_id, name FROM properties WHERE {in_clause('property_id', property_ids)}"
+    rows = await _fetch_all(db, query, list(property_ids))
+    return {row['property_id']: row['name'] for row in rows}
+
+
+async def fetch_properties(db: Database, updated_since=None):
+    """Строки для каталога в памяти: все объекты или только изменённые после updated_since."""
+    query = """
+    SELECT p.*, r.avg_rating
+    FROM properties p
+    LEFT JOIN property_rating r
+    ON p.property_id = r.property_id
+    """
+    if updated_since is None:
+        return await _fetch_all(db, query, ())
+    return await _fetch_all(db, query + " WHERE p.updated_at >= %s", (updated_since,))
+
+
+async def fetch_property_ids(db: Database):
+    rows = await _fetch_all(db, "SELECT property_id FROM properties", ())
+    return {row['property_id'] for row in rows}
+
+
+async def fetch_catalog_state(db: Database):
+    """
+    Дешёвая сверка для обновления каталога: число объектов (удаления водяной знак updated_at не покажет)
+    и отметка сводки рейтингов - одна строка вместо выборки всех id и всех рейтингов.
+    """
+    query = """
+    SELECT (SELECT COUNT(*) FROM properties) AS properties,
+           (SELECT COUNT(*) FROM property_rating) AS ratings,
+           (SELECT MAX(updated_at) FROM property_rating) AS ratings_updated_at
+    """
+    return await _fetch_one(db, query, ())
+
+
+async def fetch_ratings(db: Database):
+    rows = await _fetch_all(db, "SELECT property_id, avg_rating FROM property_rating WHERE rating_count > 0", ())
+    return {row['property_id']: row['avg_rating'] for row in rows}
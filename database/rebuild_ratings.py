@@ -0,0 +1,25 @@
+"""
+Пересчёт сводки рейтингов property_rating по одобренным отзывам.
+Нужен для бэкфилла и после правок таблицы reviews в обход бота.
+
+Запуск (нужна БД из config.py с применёнными миграциями):
+    python -m database.rebuild_ratings
+"""
+import asyncio
+
+from config import db_config
+from database.database import Database
+
+
+async def main():
+    db = Database(db_config)
+    await db.connect()
+    try:
+        rows = await db.rebuild_property_ratings()
+    finally:
+        await db.disconnect()
+    print(f"property_rating rebuilt: {rows} properties")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
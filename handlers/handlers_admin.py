@@ -0,0 +1,134 @@
+import csv
+import os
+import tempfile
+from datetime import datetime
+from html import escape
+
+from aiogram import Router, F
+from aiogram.enums import ParseMode
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+
+from app.stats import StatsService
+from config import ADMINS, STATS_TREND_DAYS
+from database.database import Database
+from database.profiler import QueryProfiler
+
+router = Router()
+router.message.filter(F.from_user.id.in_(ADMINS))
+
+MAX_MESSAGE_LENGTH = 4096
+FINGERPRINT_LENGTH = 160
+EXPORT_USER_COLUMNS = ('user_id', 'username', 'email', 'phone_number', 'notifications_enabled', 'created_at',
+                       'last_login', 'last_activity')
+MAX_TREND_DAYS = 90
+
+
+def format_top_queries(top, order, since):
+    lines = [f"<b>Топ запросов по {order}</b> (с {since})\n"]
+    for number, stats in enumerate(top, 1):
+        fingerprint = stats['fingerprint']
+        if len(fingerprint) > FINGERPRINT_LENGTH:
+            fingerprint = fingerprint[:FINGERPRINT_LENGTH] + '…'
+        lines.append(
+            f"{number}. {stats['count']} выз., всего {stats['total_ms']} мс, ср. {stats['avg_ms']} мс, "
+            f"p99 {stats['p99_ms']} мс, строк {stats['rows']}, ошибок {stats['errors']}\n"
+            f"<code>{escape(fingerprint)}</code>\n"
+        )
+    return lines
+
+
+@router.message(Command('top_queries'))
+async def top_queries(message: Message, command: CommandObject, db: Database):
+    """/top_queries [N] [total|p99|count|rows] - самые тяжёлые запросы; /top_queries reset - обнулить статистику."""
+    args = (command.args or '').split()
+    if args[:1] == ['reset']:
+        db.profiler.reset()
+        await message.answer("Статистика запросов обнулена.")
+        return
+
+    limit = int(args[0]) if args and args[0].isdigit() else 10
+    order = next((arg for arg in args if arg in QueryProfiler.ORDERS), 'total')
+    top = db.profiler.top(limit, order)
+    if not top:
+        await message.answer("Запросов пока не было.")
+        return
+
+    since = datetime.fromtimestamp(db.profiler.started_at).strftime('%d.%m %H:%M')
+    text = ''
+    for line in format_top_queries(top, order, since):
+        if len(text) + len(line) > MAX_MESSAGE_LENGTH:
+            break
+        text += line
+    await message.answer(text, parse_mode=ParseMode.HTML)
+
+
+def format_stats(summary, trend):
+    lines = [
+        "<b>Статистика</b>\n",
+        f"Пользователей всего: {summary['total_users']}",
+        f"Новых: {summary['new_users']} за 7 дней, {summary['new_users_month']} за 30 дней",
+        f"Активных: {summary['active_today']} сегодня, {summary['active_users']} за 7 дней, "
+        f"{summary['active_users_month']} за 30 дней",
+        f"Поисков: {summary['searches']} за 7 дней, {summary['searches_month']} за 30 дней",
+        f"В избранное: {summary['favorites']} за 7 дней, {summary['favorites_month']} за 30 дней\n",
+        "<pre>день   новые актив поиск избр",
+    ]
+    for day, new_users, active_users, searches, favorites in trend:
+        lines.append(f"{day.strftime('%d.%m')} {new_users:>6}{active_users:>6}{searches:>6}{favorites:>5}")
+    lines.append("</pre>")
+    return lines
+
+
+@router.message(Command('stats'))
+async def show_stats(message: Message, command: CommandObject, statistics: StatsService):
+    """/stats [дней] - сводка за неделю и месяц и тренд по дням (по умолчанию STATS_TREND_DAYS)."""
+    args = (command.args or '').split()
+    days = min(int(args[0]), MAX_TREND_DAYS) if args and args[0].isdigit() and int(args[0]) > 0 else STATS_TREND_DAYS
+    summary = await statistics.summary()
+    trend = await statistics.trend(days)
+    await message.answer("\n".join(format_stats(summary, trend)), parse_mode=ParseMode.HTML)
+
+
+@router.message(Command('export_users'))
+async def export_users(message: Message, db: Database):
+    """/export_users - выгрузка пользователей в CSV. Строки читаются пачками и сразу пишутся во временный файл."""
+    users = 0
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8-sig', delete=False) as file:
+        path = file.name
+        try:
+            writer = csv.DictWriter(file, fieldnames=EXPORT_USER_COLUMNS)
+            writer.writeheader()
+            async for batch in db.iter_users():
+                writer.writerows(batch)
+                users += len(batch)
+        except Exception:
+            file.close()
+            os.remove(path)
+            raise
+
+    try:
+        filename = f"users_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+        await message.answer_document(FSInputFile(path, filename=filename), caption=f"Пользователей: {users}")
+    finally:
+        os.remove(path)
+
+
+@router.message(Command('approve_review', 'reject_review'))
+async def moderate_review(message: Message, command: CommandObject, db: Database):
+    """
+    /approve_review <id>, /reject_review <id> - модерация отзыва. Идёт через Database.approve_review / reject_review,
+    которые в той же транзакции правят сводку property_rating.
+    """
+    args = (command.args or '').split()
+    if not args or not args[0].isdigit():
+        await message.answer(f"Укажите номер отзыва: /{command.command} 123")
+        return
+
+    review_id = int(args[0])
+    if command.command == 'approve_review':
+        done = await db.approve_review(review_id)
+        await message.answer("Отзыв одобрен." if done else "Отзыв не найден или уже одобрен.")
+    else:
+        done = await db.reject_review(review_id)
+        await message.answer("Отзыв отклонен." if done else "Отзыв не найден.")
@@ -5,69 +5,35 @@ from aiogram import Router, F
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
+import app.callbacks as cb
 import app.keyboards as kb
-from config import db_config, ADMINS
+from app.cards import render_card, FAVORITE
+from app.catalog import PropertyCatalog
+from app.favorites import FavoritesService
+from app.photo_cache import PhotoCache, property_photos
+from app.prefetch import PagePrefetcher
+from config import ADMINS
 from database.database import Database
 
 router = Router()
-db = Database(db_config)
 
 
-async def ensure_db_connection():
-    if db.pool is None:
-        await db.connect()
-        if db.pool is None:
-            raise Exception("Failed to connect to the database")
-        print("Successfully connected to the database.")
-
-
-async def get_favorite_properties(user_id):
-    query = """
-    SELECT p.property_id, p.name, p.location, p.distance_to_sea, p.property_type, p.monthly_price, p.daily_price,
-           p.booking_deposit_fixed, p.security_deposit, p.bedrooms, p.bathrooms, p.pool, p.kitchen, p.cleaning,
-           p.utility_bill, p.description, r.avg_rating, p.photo1, p.photo2, p.photo3, p.photo4, p.photo5, 
-           p.photo6, p.photo7, p.photo8, p.photo9
-    FROM favorites f
-    JOIN properties p ON f.property_id = p.property_id
-    LEFT JOIN (SELECT property_id, AVG(rating) as avg_rating FROM reviews WHERE approved = 1 GROUP BY property_id) r
-    ON p.property_id = r.property_id
-    WHERE f.user_id = %s
-    """
-    async with db.pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
-            await cursor.execute(query, (user_id,))
-            return await cursor.fetchall()
-
-async def add_website_link_column():
+async def add_website_link_column(db: Database):
     query = """
     ALTER TABLE properties ADD COLUMN website_link VARCHAR(255) DEFAULT NULL;
     """
-    async with db.pool.acquire() as conn:
+    async with db.acquire() as conn:
         async with conn.cursor() as cursor:
-            await cursor.execute(query)
+            await db.execute(cursor, query)
             await conn.commit()
 
 
-async def get_property_by_id(property_id):
-    query = """
-    SELECT p.*, r.avg_rating
-    FROM properties p
-    LEFT JOIN (SELECT property_id, AVG(rating) as avg_rating FROM reviews WHERE approved = 1 GROUP BY property_id) r
-    ON p.property_id = r.property_id
-    WHERE p.property_id = %s
-    """
-    async with db.pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
-            await cursor.execute(query, (property_id,))
-            return await cursor.fetchone()
-
-
 def generate_property_buttons(property):
     buttons = [
         [InlineKeyboardButton(text="📞 Связь с менеджером", url="https://t.me/tropicalsamui")],
-        [InlineKeyboardButton(text="🗑 Удалить", callback_data=f"del_{property['property_id']}")]
+        [InlineKeyboardButton(text="🗑 Удалить", callback_data=cb.REMOVE_FAVORITE.pack(property_id=property['property_id']))]
     ]
 
     # Добавляем кнопку со ссылкой на сайт, если ссылка указана
@@ -79,59 +45,67 @@ def generate_property_buttons(property):
     #     InlineKeyboardButton(text="📖 Читать отзывы и рейтинги", callback_data=f"read_reviews_{property['property_id']}")
     # ])
 
-    buttons.append([InlineKeyboardButton(text="🔙 Возврат к избранным", callback_data="back_to_favorites")])
+    buttons.append([InlineKeyboardButton(text="🔙 Возврат к избранным", callback_data=cb.BACK_TO_FAVORITES.pack())])
 
     return buttons
 
 
 def generate_property_text(property):
+    return render_card(property, FAVORITE)
+
+
+def favorites_keyboard(items, page, pages):
+    buttons = [
+        [InlineKeyboardButton(text=name, callback_data=cb.SHOW_FAVORITE.pack(property_id=property_id))]
+        for property_id, name in items
+    ]
+
+    if pages > 1:
+        buttons.append([
+            InlineKeyboardButton(text="⬅️", callback_data=cb.FAVORITES_PAGE.pack(page=page - 1) if page > 0
+                                 else cb.NOOP.pack()),
+            InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=cb.NOOP.pack()),
+            InlineKeyboardButton(text="➡️", callback_data=cb.FAVORITES_PAGE.pack(page=page + 1) if page < pages - 1
+                                 else cb.NOOP.pack()),
+        ])
+
+    buttons.append([InlineKeyboardButton(text="🔙 Возврат в меню", callback_data=cb.BACK_TO_MAIN.pack())])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
 
+@cb.handler(cb.FAVORITES)
+async def open_favorites(callback: CallbackQuery, favorites: FavoritesService, prefetcher: PagePrefetcher):
+    # Из выдачи в избранное: состояние FSM не меняется, поэтому предвыборку страниц отменяем явно
+    prefetcher.cancel(callback.from_user.id)
+    await show_favorites(callback, favorites)
 
-    return (
-        f"🏠 <b>{property['name']}</b>\n\n"
-        f"📍 <b>Расположение:</b> {property['location']}\n"
-        f"🌊 <b>Удаленность от моря:</б> {property['distance_to_sea']}\n"
-        f"🏷️ <b>Категория:</б> {property['property_type']}\n\n"
-        f"💰 <b>Стоимость в месяц:</б> {property['monthly_price']}฿\n"
-        f"💰 <b>Стоимость постуточно:</б> {property['daily_price']}฿\n"
-        f"💵 <b>Залог:</б> {property['booking_deposit_fixed']}฿\n"
-        f"🔒 <b>Сохраненный депозит:</б> {property['security_deposit']}฿\n\n"
-        f"🛏️ <b>Количество спален:</б> {property['bedrooms']}\n"
-        f"🛁 <b>Количество ванных:</б> {property['bathrooms']}\n"
-        f"🏊 <b>Бассейн:</б> {'Да' if property['pool'] else 'Нет'}\n"
-        f"🍴 <b>Кухня:</б> {'Да' if property['kitchen'] else 'Нет'}\n"
-        f"🧹 <b>Уборка:</б> {'Да' if property['cleaning'] else 'Нет'}\n"
-        f"💡 <b>Утилиты:</б> {property['utility_bill']}\n\n"
-        f"📜 <b>Описание:</б> {property['description']}\n\n"
-    ).replace("</б>", "</b>")
-
-
-@router.callback_query(F.data == "favorites")
-async def show_favorites(callback: CallbackQuery):
-    await ensure_db_connection()
+
+async def show_favorites(callback: CallbackQuery, favorites: FavoritesService, page: int = 0):
     user_id = callback.from_user.id
 
-    favorite_properties = await get_favorite_properties(user_id)
-    if not favorite_properties:
+    items, page, pages = await favorites.page(user_id, page)
+    if not items:
         await callback.message.answer("У вас нет избранных объектов/или объект удален")
         return
 
-    buttons = [
-        [InlineKeyboardButton(text=f"{property['name']}", callback_data=f"show_{property['property_id']}")]
-        for property in favorite_properties
-    ]
+    await callback.message.answer("Ваши избранные объекты:", reply_markup=favorites_keyboard(items, page, pages))
 
-    buttons.append([InlineKeyboardButton(text="🔙 Возврат в меню", callback_data="back_to_main")])
 
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+@cb.handler(cb.FAVORITES_PAGE)
+async def favorites_page(callback_query: CallbackQuery, favorites: FavoritesService, page: int):
+    items, page, pages = await favorites.page(callback_query.from_user.id, page)
+    if not items:
+        await callback_query.answer("У вас нет избранных объектов/или объект удален")
+        return
 
-    await callback.message.answer("Ваши избранные объекты:", reply_markup=keyboard)
+    await callback_query.message.edit_reply_markup(reply_markup=favorites_keyboard(items, page, pages))
+    await callback_query.answer()
 
 
-@router.callback_query(F.data.startswith('show_'))
-async def show_property_info(callback_query: CallbackQuery, state: FSMContext):
-    property_id = int(callback_query.data.split('_')[1])
-    property = await get_property_by_id(property_id)
+@cb.handler(cb.SHOW_FAVORITE)
+async def show_property_info(callback_query: CallbackQuery, state: FSMContext, catalog: PropertyCatalog,
+                             photo_cache: PhotoCache, property_id: int):
+    property = await catalog.get(property_id)
 
     if not property:
         await callback_query.answer("Объект не найден.")
@@ -140,19 +114,19 @@ async def show_property_info(callback_query: CallbackQuery, state: FSMContext):
     text = generate_property_text(property)
     keyboard = InlineKeyboardMarkup(inline_keyboard=generate_property_buttons(property))
 
-    photos = [property[f'photo{i}'] for i in range(1, 10) if property.get(f'photo{i}')]
+    photos = property_photos(property, only_http=True)
 
     if photos:
-        media = [InputMediaPhoto(media=photos[0], caption=text, parse_mode=ParseMode.HTML)]
-        media.extend([InputMediaPhoto(media=photo) for photo in photos[1:]])
+        media = await photo_cache.media_group(property_id, photos, caption=text)
 
         try:
             await callback_query.message.delete()
             media_group_message = await callback_query.message.answer_media_group(media=media)
+            await photo_cache.remember(property_id, photos, media_group_message)
             action_message = await callback_query.message.answer("Выберите действие:", reply_markup=keyboard)
             message_ids = [msg.message_id for msg in media_group_message]
             message_ids.append(action_message.message_id)
-            await state.update_data(message_ids=message_ids)
+            await state.update_data(message_ids=message_ids, album_size=len(media_group_message))
         except Exception as e:
             logging.error(f"Ошибка при отправке группы медиа: {e}")
             await callback_query.message.answer(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
@@ -160,29 +134,18 @@ async def show_property_info(callback_query: CallbackQuery, state: FSMContext):
         await callback_query.message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
 
 
-@router.callback_query(F.data.startswith('del_'))
-async def remove_from_favorites_handler(callback_query: CallbackQuery):
-    property_id = int(callback_query.data.split('_')[1])
-    user_id = callback_query.from_user.id
-    query = "DELETE FROM favorites WHERE user_id = %s AND property_id = %s"
-    async with db.pool.acquire() as conn:
-        async with conn.cursor() as cursor:
-            await cursor.execute(query, (user_id, property_id))
-            await conn.commit()
+@cb.handler(cb.REMOVE_FAVORITE)
+async def remove_from_favorites_handler(callback_query: CallbackQuery, favorites: FavoritesService,
+                                        property_id: int):
+    await favorites.remove(callback_query.from_user.id, property_id)
     await callback_query.answer("Удалено из избранного!")
-    await show_favorites(callback_query)
+    await show_favorites(callback_query, favorites)
 
 
-@router.callback_query(F.data == "back_to_favorites")
-async def back_to_favorites(callback_query: CallbackQuery):
+@cb.handler(cb.BACK_TO_FAVORITES)
+async def back_to_favorites(callback_query: CallbackQuery, favorites: FavoritesService):
     await callback_query.message.delete()
-    await show_favorites(callback_query)
-
-
-@router.callback_query(F.data == "back_to_main")
-async def back_to_main(callback_query: CallbackQuery):
-    await callback_query.message.answer("Вы вернулись в главное меню.", reply_markup=kb.main)
-    await callback_query.answer()
+    await show_favorites(callback_query, favorites)
 
 
 # # Добавление нового отзыва пользователем
@@ -350,24 +313,17 @@ async def back_to_main(callback_query: CallbackQuery):
 #         await callback_query.message.answer(text, reply_markup=keyboard)
 #
 #
+# # Одобрение и отклонение идут через Database, чтобы сводка property_rating оставалась актуальной
 # @router.callback_query(F.data.startswith('approve_'))
-# async def approve_review(callback_query: CallbackQuery):
+# async def approve_review(callback_query: CallbackQuery, db: Database):
 #     review_id = int(callback_query.data.split('_')[1])
-#     query = "UPDATE reviews SET approved = 1 WHERE review_id = %s"
-#     async with db.pool.acquire() as conn:
-#         async with conn.cursor() as cursor:
-#             await cursor.execute(query, (review_id,))
-#             await conn.commit()
+#     await db.approve_review(review_id)
 #     await callback_query.answer("Отзыв одобрен.", show_alert=True)
 #
 #
 # @router.callback_query(F.data.startswith('reject_'))
-# async def reject_review(callback_query: CallbackQuery):
+# async def reject_review(callback_query: CallbackQuery, db: Database):
 #     review_id = int(callback_query.data.split('_')[1])
-#     query = "DELETE FROM reviews WHERE review_id = %s"
-#     async with db.pool.acquire() as conn:
-#         async with conn.cursor() as cursor:
-#             await cursor.execute(query, (review_id,))
-#             await conn.commit()
+#     await db.reject_review(review_id)
 #     await callback_query.answer("Отзыв отклонен.", show_alert=True)
 #
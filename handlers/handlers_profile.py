@@ -6,20 +6,14 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
+import app.callbacks as cb
 import app.keyboards as kb
-from config import db_config
+from app.activity import ActivityTracker
+from app.alerts import describe_filter
+from app.prefetch import PagePrefetcher
 from database.database import Database
 
 router = Router()
-db = Database(db_config)
-
-
-async def ensure_db_connection():
-    if db.pool is None:
-        await db.connect()
-        if db.pool is None:
-            raise Exception("Failed to connect to the database")
-        print("Database connected successfully.")
 
 
 class ProfileUpdate(StatesGroup):
@@ -37,13 +31,13 @@ async def edit_or_send_message(callback: CallbackQuery, text, reply_markup=None,
             await callback.message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
 
 
-@router.callback_query(F.data == "update_email")
+@cb.handler(cb.UPDATE_EMAIL)
 async def prompt_for_email(callback: CallbackQuery, state: FSMContext):
     await edit_or_send_message(callback, "Пожалуйста, введите ваш новый email:")
     await state.set_state(ProfileUpdate.waiting_for_email)
 
 
-@router.callback_query(F.data == "update_phone_number")
+@cb.handler(cb.UPDATE_PHONE)
 async def prompt_for_phone_number(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer("Пожалуйста, нажмите на кнопку ниже, чтобы отправить ваш новый номер телефона.",
                                   reply_markup=kb.numbers)
@@ -63,7 +57,7 @@ async def update_email(message: Message, state: FSMContext):
 
 
 @router.message(ProfileUpdate.confirming_email)
-async def confirm_email_update(message: Message, state: FSMContext):
+async def confirm_email_update(message: Message, state: FSMContext, db: Database):
     if message.text.lower() == "да":
         data = await state.get_data()
         new_email = data['new_email']
@@ -84,7 +78,7 @@ async def update_phone_number(message: Message, state: FSMContext):
 
 
 @router.message(ProfileUpdate.confirming_phone_number)
-async def confirm_phone_update(message: Message, state: FSMContext):
+async def confirm_phone_update(message: Message, state: FSMContext, db: Database):
     if message.text.lower() == "да":
         data = await state.get_data()
         new_phone_number = data['new_phone_number']
@@ -96,20 +90,20 @@ async def confirm_phone_update(message: Message, state: FSMContext):
         await state.clear()
 
 
-async def get_user_info(user_id):
+async def get_user_info(db: Database, user_id):
     query = "SELECT user_id, username, email, phone_number FROM users WHERE user_id = %s"
-    async with db.pool.acquire() as conn:
+    async with db.acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
-            await cursor.execute(query, (user_id,))
+            await db.execute(cursor, query, (user_id,))
             result = await cursor.fetchone()
             return result
 
 
-@router.callback_query(F.data == "profile")
-async def show_profile(callback: CallbackQuery):
-    await ensure_db_connection()
-    await db.update_last_activity(callback.from_user.id)
-    user_info = await get_user_info(callback.from_user.id)
+@cb.handler(cb.PROFILE)
+async def show_profile(callback: CallbackQuery, db: Database, activity: ActivityTracker, prefetcher: PagePrefetcher):
+    activity.touch(callback.from_user.id)
+    prefetcher.cancel(callback.from_user.id)
+    user_info = await get_user_info(db, callback.from_user.id)
     if user_info:
         profile_info = (
             f"👤 <b>Ваш Профиль</b>\n\n"
@@ -119,11 +113,39 @@ async def show_profile(callback: CallbackQuery):
         )
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Обновить Email", callback_data="update_email")],
-            [InlineKeyboardButton(text="Обновить номер телефона", callback_data="update_phone_number")],
-            [InlineKeyboardButton(text="🔚 Вернуться в главное меню", callback_data="back_to_main")]
+            [InlineKeyboardButton(text="Обновить Email", callback_data=cb.UPDATE_EMAIL.pack())],
+            [InlineKeyboardButton(text="Обновить номер телефона", callback_data=cb.UPDATE_PHONE.pack())],
+            [InlineKeyboardButton(text="🔔 Мои подписки", callback_data=cb.SAVED_SEARCHES.pack())],
+            [InlineKeyboardButton(text="🔚 Вернуться в главное меню", callback_data=cb.BACK_TO_MAIN.pack())]
         ])
 
         await edit_or_send_message(callback, profile_info, reply_markup=keyboard, parse_mode=ParseMode.HTML)
     else:
         await edit_or_send_message(callback, "Профиль не найден. Пожалуйста, зарегистрируйтесь.", reply_markup=kb.main)
+
+
+@cb.handler(cb.SAVED_SEARCHES)
+async def show_saved_searches(callback: CallbackQuery, db: Database):
+    saved = await db.get_saved_searches(callback.from_user.id)
+    if not saved:
+        text = ("У вас нет подписок. Сохраните поиск кнопкой «🔔 Подписаться на поиск» в выдаче - "
+                "и мы пришлём новые объекты, которые ему подходят.")
+    else:
+        text = "🔔 <b>Ваши подписки на новые объекты</b>\n\n" + "\n".join(
+            f"{number}. {describe_filter(search_filter)}" for number, (_, search_filter) in enumerate(saved, 1)
+        )
+
+    buttons = [
+        [InlineKeyboardButton(text=f"🗑 Удалить {number}", callback_data=cb.DELETE_SAVED_SEARCH.pack(search_id=search_id))]
+        for number, (search_id, _) in enumerate(saved, 1)
+    ]
+    buttons.append([InlineKeyboardButton(text="🔙 Профиль", callback_data=cb.PROFILE.pack())])
+    await edit_or_send_message(callback, text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
+                               parse_mode=ParseMode.HTML)
+
+
+@cb.handler(cb.DELETE_SAVED_SEARCH)
+async def delete_saved_search(callback: CallbackQuery, db: Database, search_id: int):
+    await db.delete_saved_search(callback.from_user.id, search_id)
+    await callback.answer("Подписка удалена.")
+    await show_saved_searches(callback, db)
@@ -6,25 +6,14 @@ from aiogram.filters import CommandStart
 from aiogram.types import Message
 
 import app.keyboards as kb
-from config import db_config
+from app.activity import ActivityTracker
 from database.database import Database
 
 start_router = Router()
-db = Database(db_config)
-
-
-async def ensure_db_connection():
-    if db.pool is None:
-        await db.connect()
-        if db.pool is None:
-            raise Exception("Failed to connect to the database")
-        print("Database connected successfully.")
 
 
 @start_router.message(CommandStart())
-async def send_welcome(message: Message):
-    await ensure_db_connection()
-    await db.update_last_activity(message.from_user.id)
+async def send_welcome(message: Message, db: Database, activity: ActivityTracker):
     user_id = message.from_user.id
     user_info = await db.get_user_info(user_id)
 
@@ -47,9 +36,12 @@ async def send_welcome(message: Message):
                              reply_markup=kb.numbers)
         await message.answer('Вы успешно зарегистрированы. Добро пожаловать!', reply_markup=kb.main)
 
+    # Отмечаем после регистрации: отметки пользователей, которых ещё нет в users, при записи отбрасываются
+    activity.touch(user_id)
+
 
 @start_router.message(F.contact)
-async def handle_contact(message: Message):
+async def handle_contact(message: Message, db: Database):
     telegram_id = message.from_user.id
     phone_number = message.contact.phone_number
 
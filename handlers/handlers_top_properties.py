@@ -1,39 +1,30 @@
-import aiomysql
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
+import app.callbacks as cb
 import app.keyboards as kb
-from config import db_config
-from database.database import Database
+from app.activity import ActivityTracker
+from app.prefetch import PagePrefetcher
 
 router = Router()
-db = Database(db_config)
 
 
-async def ensure_db_connection():
-    if db.pool is None:
-        await db.connect()
-        if db.pool is None:
-            raise Exception("Failed to connect to the database")
-        print("Database connected successfully.")
-
-
-
-
-@router.callback_query(F.data == "best_properties")
-async def show_top_properties(callback: CallbackQuery):
-    await ensure_db_connection()
+@cb.handler(cb.BEST_PROPERTIES)
+async def show_top_properties(callback: CallbackQuery, prefetcher: PagePrefetcher):
+    prefetcher.cancel(callback.from_user.id)
     buttons = [[InlineKeyboardButton(text="Реальный Самуи🏝️",url="https://t.me/realsamuiru")],
                [InlineKeyboardButton(text="Аренда на Самуи", url="https://t.me/villanasamui")],
-               [InlineKeyboardButton(text="🔚 Возврат в меню", callback_data="back_to_main")]]
+               [InlineKeyboardButton(text="🔚 Возврат в меню", callback_data=cb.BACK_TO_MAIN.pack())]]
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     await callback.answer('🌟 Наши Социальные сети')
     await callback.message.answer("🌟 Наши Социальные сети", reply_markup=keyboard)
 
 
-@router.callback_query(F.data == 'back_to_main')
-async def back_to_main(callback_query: CallbackQuery):
-    await db.update_last_activity(callback_query.from_user.id)
+@cb.handler(cb.BACK_TO_MAIN)
+async def back_to_main(callback_query: CallbackQuery, activity: ActivityTracker, prefetcher: PagePrefetcher):
+    activity.touch(callback_query.from_user.id)
+    # Состояние showing_results остаётся (его не сбрасываем), поэтому middleware предвыборку не отменит - отменяем здесь
+    prefetcher.cancel(callback_query.from_user.id)
     await callback_query.message.answer("Вы вернулись в главное меню.", reply_markup=kb.main)
     await callback_query.answer()
@@ -0,0 +1,139 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+
+from app.activity import ActivityTracker
+from database.database import ADD_DAILY_STATS, ADD_LAST_SEEN_DAYS, Database
+
+
+class FakeDatabase:
+    def __init__(self, fail_activity=0, fail_counts=0):
+        self.fail_activity = fail_activity
+        self.fail_counts = fail_counts
+        self.activity = []
+        self.counts = []
+
+    async def record_activity(self, last_seen):
+        if self.fail_activity:
+            self.fail_activity -= 1
+            raise ConnectionError("pool is gone")
+        self.activity.append(dict(last_seen))
+
+    async def add_daily_counts(self, counts):
+        if self.fail_counts:
+            self.fail_counts -= 1
+            raise ConnectionError("pool is gone")
+        self.counts.append(dict(counts))
+
+
+def test_flush_writes_one_batch():
+    db = FakeDatabase()
+    tracker = ActivityTracker(db)
+    tracker.touch(1)
+    tracker.touch(2)
+    tracker.touch(1)
+    tracker.count('searches', 3)
+    tracker.count('searches', 3)
+
+    asyncio.run(tracker.flush())
+    asyncio.run(tracker.flush())
+
+    assert [sorted(batch) for batch in db.activity] == [[1, 2, 3]]
+    assert db.counts == [{(date.today(), 'searches'): 2}]
+    assert tracker.stats()['buffered'] == 0 and tracker.flushes == 1
+
+
+def test_failed_flush_requeues_without_overwriting_newer_marks():
+    db = FakeDatabase(fail_activity=1, fail_counts=1)
+    tracker = ActivityTracker(db)
+    tracker.touch(1)
+    tracker.count('favorites', 2)
+
+    async def run():
+        flush = asyncio.create_task(tracker.flush())
+        await asyncio.sleep(0)
+        # Отметка, сделанная во время неудачной записи, должна победить вернувшуюся старую
+        tracker.touch(1)
+        newer = tracker._pending[1]
+        tracker.count('favorites', 2)
+        await flush
+        return newer
+
+    newer = asyncio.run(run())
+    assert tracker._pending[1] == newer
+    assert tracker.stats()['buffered_events'] == 2
+
+    asyncio.run(tracker.flush())
+    assert len(db.activity) == 1 and sorted(db.activity[0]) == [1, 2] and db.activity[0][1] == newer
+    assert db.counts == [{(date.today(), 'favorites'): 2}]
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    async def fetchall(self):
+        return self.result
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+
+class RecordingDatabase(Database):
+    """record_activity без MySQL: users.last_activity в словаре, записи в сводки копятся списками."""
+
+    def __init__(self, users):
+        super().__init__({})
+        self.users = users
+        self.last_seen_days = []
+        self.daily_stats = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self)
+
+    async def execute(self, cursor, query, params=None):
+        cursor.result = [(user_id, self.users[user_id]) for user_id in params if user_id in self.users]
+
+    async def executemany(self, cursor, query, rows):
+        if query == ADD_LAST_SEEN_DAYS:
+            self.last_seen_days.extend(rows)
+        elif query == ADD_DAILY_STATS:
+            self.daily_stats.extend(rows)
+        else:
+            for user_id, last_activity in rows:
+                assert user_id in self.users, "record_activity must not create users"
+                self.users[user_id] = last_activity
+
+
+def test_record_activity_moves_users_between_days_and_skips_unknown_ids():
+    yesterday, today = datetime(2024, 5, 1, 23, 0), datetime(2024, 5, 2, 9, 0)
+    db = RecordingDatabase({1: yesterday, 2: None, 3: datetime(2024, 5, 2, 8, 0), 4: datetime(2024, 5, 2, 10, 0)})
+
+    asyncio.run(db.record_activity({1: today, 2: today, 3: today, 4: today, 99: today}))
+
+    assert db.users == {1: today, 2: today, 3: today, 4: datetime(2024, 5, 2, 10, 0)}
+    # Пользователь 1 переехал со вчера на сегодня, 2 - первая активность, 3 уже был сегодня, 4 - отметка старее
+    assert sorted(db.last_seen_days) == [(yesterday.date(), -1), (today.date(), 2)]
+    assert db.daily_stats == [(today.date(), 0, 2, 0, 0)]
@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.middlewares import AdmissionControlMiddleware
+
+
+class FakeCallbackQuery:
+    def __init__(self):
+        self.answers = []
+
+    async def answer(self, text):
+        self.answers.append(text)
+
+
+def update(chat_id=None):
+    chat = SimpleNamespace(id=chat_id) if chat_id else None
+    return SimpleNamespace(callback_query=FakeCallbackQuery()), {'event_chat': chat}
+
+
+def test_limit_and_shedding():
+    admission = AdmissionControlMiddleware(limit=2, max_queue=3)
+    release = asyncio.Event()
+    peak = []
+
+    async def handler(event, data):
+        peak.append(admission.in_flight)
+        await release.wait()
+        return 'done'
+
+    async def run():
+        tasks = [asyncio.create_task(admission(handler, *update())) for _ in range(5)]
+        await asyncio.sleep(0)
+        # 2 выполняются, 3 ждут - очередь полна, шестое обновление отбрасывается с ответом
+        event, data = update()
+        shed = await admission(handler, event, data)
+        release.set()
+        return await asyncio.gather(*tasks), shed, event.callback_query.answers
+
+    results, shed, answers = asyncio.run(run())
+    assert results == ['done'] * 5
+    assert shed is None and answers == [admission.overload_text]
+    assert max(peak) == 2
+    assert admission.stats()['shed'] == 1 and admission.stats()['admitted'] == 5
+    assert admission.stats()['queue_depth'] == 0 and admission.stats()['in_flight'] == 0
+
+
+def test_updates_of_one_chat_run_in_order():
+    admission = AdmissionControlMiddleware(limit=10)
+    log = []
+
+    def handler_for(number, delay):
+        async def handler(event, data):
+            log.append(('start', number))
+            await asyncio.sleep(delay)
+            log.append(('end', number))
+        return handler
+
+    async def run():
+        await asyncio.gather(
+            admission(handler_for(1, 0.02), *update(chat_id=7)),
+            admission(handler_for(2, 0), *update(chat_id=7)),
+            admission(handler_for(3, 0), *update(chat_id=8)),
+        )
+
+    asyncio.run(run())
+    assert log.index(('end', 1)) < log.index(('start', 2))
+    # Другой чат не ждёт первого
+    assert log.index(('end', 3)) < log.index(('end', 1))
+    assert admission._chat_locks == {}
+
+
+def test_failed_handler_releases_slots():
+    admission = AdmissionControlMiddleware(limit=1)
+
+    async def failing(event, data):
+        raise RuntimeError("boom")
+
+    async def ok(event, data):
+        return 'ok'
+
+    async def run():
+        try:
+            await admission(failing, *update(chat_id=7))
+        except RuntimeError:
+            pass
+        return await asyncio.wait_for(admission(ok, *update(chat_id=7)), 1)
+
+    assert asyncio.run(run()) == 'ok'
+    assert admission._chat_locks == {} and admission.in_flight == 0
@@ -0,0 +1,77 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+from aiogram.types import InputMediaPhoto
+
+from app.album import AlbumRenderer
+
+
+class FakePhotoCache:
+    async def remember(self, property_id, urls, messages):
+        pass
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+        self._ids = itertools.count(100)
+
+    def _message(self):
+        return SimpleNamespace(message_id=next(self._ids), photo=None)
+
+    async def send_media_group(self, chat_id, media):
+        assert 2 <= len(media) <= 10, "Telegram accepts 2-10 items in a media group"
+        self.calls.append(('send_media_group', len(media)))
+        return [self._message() for _ in media]
+
+    async def send_photo(self, chat_id, photo, caption=None, parse_mode=None):
+        self.calls.append(('send_photo', photo))
+        return self._message()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(('send_message', text))
+        return self._message()
+
+    async def edit_message_media(self, media, chat_id, message_id):
+        self.calls.append(('edit_message_media', message_id))
+        return self._message()
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup):
+        self.calls.append(('edit_message_reply_markup', message_id))
+
+    async def delete_message(self, chat_id, message_id):
+        self.calls.append(('delete_message', message_id))
+
+
+def render(bot, old_ids, album_size, photos):
+    media = [InputMediaPhoto(media=url) for url in photos]
+    return asyncio.run(AlbumRenderer(FakePhotoCache()).render(
+        bot, 1, old_ids, album_size, 7, photos, "caption", None, media=media,
+    ))
+
+
+def test_album_growing_by_one_photo_uses_send_photo():
+    bot = FakeBot()
+    message_ids, album_size = render(bot, [1, 2, 3], 2, ['a', 'b', 'c'])
+
+    assert ('send_photo', 'c') in bot.calls
+    assert not any(name == 'send_media_group' for name, _ in bot.calls)
+    assert album_size == 3 and len(message_ids) == 4
+
+
+def test_single_photo_property_is_sent_as_photo():
+    bot = FakeBot()
+    message_ids, album_size = render(bot, None, None, ['a'])
+
+    assert [name for name, _ in bot.calls] == ['send_photo', 'send_message']
+    assert album_size == 1 and len(message_ids) == 2
+
+
+def test_same_size_album_is_edited_in_place():
+    bot = FakeBot()
+    message_ids, album_size = render(bot, [1, 2, 3], 2, ['a', 'b'])
+
+    assert sorted(name for name, _ in bot.calls) == ['edit_message_media', 'edit_message_media',
+                                                     'edit_message_reply_markup']
+    assert message_ids == [1, 2, 3] and album_size == 2
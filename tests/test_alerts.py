@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.alerts import SubscriptionIndex, match_new_properties, send_property_alerts
+from app.search_index import SearchIndex
+
+
+def make_property(property_id, location='Chaweng'):
+    return {
+        'property_id': property_id, 'name': f"Villa {property_id}", 'location': location, 'distance_to_sea': 100,
+        'property_type': 'villa', 'rent_type': 'long', 'bedrooms': 2, 'bathrooms': 1, 'monthly_price': 50000,
+    }
+
+
+class FakeDatabase:
+    """users.last_notified и saved_searches в памяти; условие отбора - как в Database.iter_alert_subscriptions."""
+
+    def __init__(self, subscriptions, batch_size=1000):
+        self.subscriptions = subscriptions
+        self.batch_size = batch_size
+        self.last_notified = {subscription['user_id']: None for subscription in subscriptions}
+
+    async def iter_alert_subscriptions(self, notified_at, batch_size=None):
+        pending = [
+            subscription for subscription in self.subscriptions
+            if self.last_notified[subscription['user_id']] is None
+            or self.last_notified[subscription['user_id']] < notified_at
+        ]
+        for start in range(0, len(pending), self.batch_size):
+            yield pending[start:start + self.batch_size]
+
+
+class FakeBroadcaster:
+    def __init__(self, db):
+        self.db = db
+        self.sent = []
+
+    async def broadcast(self, user_ids, text, notified_at=None):
+        for user_id in user_ids:
+            self.sent.append((user_id, text))
+            self.db.last_notified[user_id] = notified_at
+        return {'total': len(user_ids), 'sent': len(user_ids), 'failed': 0}
+
+
+def run_alerts(broadcaster, db, properties, notified_at):
+    return asyncio.run(send_property_alerts(broadcaster, db, properties, notified_at=notified_at))
+
+
+def test_runs_less_than_a_day_apart_both_deliver():
+    db = FakeDatabase([{'search_id': 1, 'user_id': 7, 'search_filter': {'locations': ['chaweng']}}])
+    broadcaster = FakeBroadcaster(db)
+    first_run = datetime(2026, 10, 17, 10, 0, 29)
+    # Следующий прогон по cron начался раньше в окне опроса - меньше чем через сутки
+    second_run = first_run + timedelta(hours=23, minutes=59)
+
+    assert run_alerts(broadcaster, db, [make_property(1)], first_run)['sent'] == 1
+    assert run_alerts(broadcaster, db, [make_property(2)], second_run)['sent'] == 1
+    assert [text.count("Villa 2") for user_id, text in broadcaster.sent] == [0, 1]
+
+
+def test_resumed_run_skips_users_it_already_notified():
+    db = FakeDatabase([
+        {'search_id': 1, 'user_id': 7, 'search_filter': {'locations': ['chaweng']}},
+        {'search_id': 2, 'user_id': 8, 'search_filter': {}},
+    ])
+    broadcaster = FakeBroadcaster(db)
+    notified_at = datetime(2026, 10, 17, 10, 0, 5)
+    db.last_notified[7] = notified_at
+
+    stats = run_alerts(broadcaster, db, [make_property(1)], notified_at)
+
+    assert stats['subscriptions'] == 1
+    assert [user_id for user_id, _ in broadcaster.sent] == [8]
+
+
+def test_users_grouped_by_identical_matches():
+    db = FakeDatabase([
+        {'search_id': 1, 'user_id': 7, 'search_filter': {'locations': ['chaweng']}},
+        {'search_id': 2, 'user_id': 8, 'search_filter': {'locations': ['chaweng']}},
+        {'search_id': 3, 'user_id': 9, 'search_filter': {'locations': ['bangrak']}},
+    ])
+    broadcaster = FakeBroadcaster(db)
+
+    stats = run_alerts(broadcaster, db, [make_property(1), make_property(2, 'Bangrak')], datetime(2026, 10, 17, 10))
+
+    assert stats == {'subscriptions': 3, 'users': 3, 'total': 3, 'sent': 3, 'failed': 0}
+    texts = dict(broadcaster.sent)
+    assert texts[7] == texts[8] and "Villa 1" in texts[7] and "Villa 2" not in texts[7]
+    assert "Villa 2" in texts[9] and "Villa 1" not in texts[9]
+
+
+def test_matches_of_one_user_are_merged_across_batches():
+    db = FakeDatabase([
+        {'search_id': 1, 'user_id': 7, 'search_filter': {'locations': ['chaweng']}},
+        {'search_id': 2, 'user_id': 8, 'search_filter': {}},
+        {'search_id': 3, 'user_id': 7, 'search_filter': {'locations': ['bangrak']}},
+    ], batch_size=2)
+    broadcaster = FakeBroadcaster(db)
+
+    stats = run_alerts(broadcaster, db, [make_property(1), make_property(2, 'Bangrak')], datetime(2026, 10, 17, 10))
+
+    assert stats['subscriptions'] == 3 and stats['sent'] == 2
+    texts = dict(broadcaster.sent)
+    # Оба поиска пользователя 7 дают одно сообщение - такое же, как у подписчика на всё
+    assert texts[7] == texts[8] and "Villa 1" in texts[7] and "Villa 2" in texts[7]
+
+
+FILTERS = [
+    {},
+    {'rent_type': 'daily'},
+    {'property_types': ['Villa'], 'locations': ['chaweng ', 'Lamai']},
+    {'bedrooms': ['3', '2'], 'bathrooms': ['2']},
+    {'price_range': '30000-50000'},
+    {'rent_type': 'monthly', 'locations': ['lamai'], 'price_range': '100000+'},
+]
+
+
+def catalog():
+    properties = []
+    for property_id in range(60):
+        properties.append({
+            'property_id': property_id, 'property_type': ('villa', 'House')[property_id % 2],
+            'location': ('Chaweng', 'lamai', 'Bangrak')[property_id % 3],
+            'rent_type': ('monthly', 'daily', 'both')[property_id // 3 % 3], 'bedrooms': property_id % 4,
+            'bathrooms': property_id % 3, 'monthly_price': 10000 * (property_id % 13),
+        })
+    for property in properties:
+        property['_type'] = property['property_type'].strip().lower()
+        property['_location'] = property['location'].strip().lower()
+    return properties
+
+
+def test_subscription_index_finds_what_search_would_find():
+    properties = catalog()
+    subscriptions = [{'search_id': number, 'user_id': number, 'search_filter': search_filter}
+                     for number, search_filter in enumerate(FILTERS)]
+    index = SubscriptionIndex(subscriptions)
+    found = {number: {property['property_id'] for property in SearchIndex(properties).search(search_filter)}
+             for number, search_filter in enumerate(FILTERS)}
+
+    for property in properties:
+        matched = {subscription['search_id'] for subscription in index.matches(property)}
+        assert matched == {number for number in found if property['property_id'] in found[number]}, property
+
+
+def test_match_new_properties_lists_each_property_once_per_user():
+    properties = catalog()[:10]
+    subscriptions = [
+        {'search_id': 1, 'user_id': 7, 'search_filter': {}},
+        {'search_id': 2, 'user_id': 7, 'search_filter': {'rent_type': 'monthly'}},
+        {'search_id': 3, 'user_id': 8, 'search_filter': {'property_types': ['castle']}},
+    ]
+    assert match_new_properties(subscriptions, properties) == {7: properties}
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.broadcast import Broadcaster, RateLimiter
+
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        error = self.errors.get(chat_id)
+        if error:
+            self.errors[chat_id] = error[1:]
+            raise error[0]
+        self.sent.append((chat_id, time.monotonic()))
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.updates = []
+
+    async def execute_query(self, query, params):
+        self.updates.append(params[1:])
+
+
+def method():
+    return SendMessage(chat_id=1, text="text")
+
+
+def test_rate_limiter_spaces_calls():
+    async def run():
+        limiter = RateLimiter(200)
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.wait() for _ in range(21)))
+        return time.monotonic() - started
+
+    # 21 слот через 5 мс: последний не раньше чем через 100 мс
+    assert asyncio.run(run()) >= 0.095
+
+
+def test_retry_after_is_retried_and_forbidden_is_skipped():
+    bot = FakeBot(errors={
+        1: [TelegramRetryAfter(method(), "Flood control", retry_after=0)],
+        2: [TelegramForbiddenError(method(), "bot was blocked by the user")],
+    })
+    db = FakeDatabase()
+    broadcaster = Broadcaster(bot, db, global_rate=1000, per_chat_interval=0)
+
+    stats = asyncio.run(broadcaster.broadcast([1, 2, 3], "text", notified_at='2024-05-01 10:00:00'))
+
+    assert (stats['total'], stats['sent'], stats['failed']) == (3, 2, 1)
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 3]
+    assert sorted(user_id for batch in db.updates for user_id in batch) == [1, 3]
+
+
+def test_last_notified_written_in_batches():
+    db = FakeDatabase()
+    broadcaster = Broadcaster(FakeBot(), db, workers=1, global_rate=1000, per_chat_interval=0, batch_size=2)
+
+    asyncio.run(broadcaster.broadcast([1, 2, 3, 4, 5], "text", notified_at='2024-05-01 10:00:00'))
+
+    assert db.updates == [(1, 2), (3, 4), (5,)]
+
+
+def test_per_chat_interval_between_broadcasts():
+    bot = FakeBot()
+    broadcaster = Broadcaster(bot, FakeDatabase(), global_rate=1000, per_chat_interval=0.1)
+
+    async def run():
+        await broadcaster.broadcast([1], "first")
+        await broadcaster.broadcast([1, 2], "second")
+
+    asyncio.run(run())
+    first, second = [sent_at for chat_id, sent_at in bot.sent if chat_id == 1]
+    assert second - first >= 0.095
+
+
+def test_expired_send_marks_are_pruned():
+    broadcaster = Broadcaster(FakeBot(), FakeDatabase(), global_rate=1000, per_chat_interval=0.05)
+
+    async def run():
+        await broadcaster.broadcast(list(range(10)), "text")
+        await asyncio.sleep(0.06)
+        await broadcaster.broadcast([100], "text")
+
+    asyncio.run(run())
+    assert list(broadcaster._last_sent) == [100]
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import CallbackQuery
+
+import app.callbacks as cb
+from app.metrics import HandlerLabelMiddleware
+from tools import bench_callbacks
+
+
+def feed(dp, datas, **kwargs):
+    async def run():
+        bot = Bot(token='42:stub')
+        try:
+            return [await dp.feed_update(bot, update, **kwargs)
+                    for update in bench_callbacks.make_updates(datas, len(datas))]
+        finally:
+            await bot.session.close()
+    return asyncio.run(run())
+
+
+def test_bench_dispatchers_route_every_sample():
+    packed = [callback_spec.pack(**values) for callback_spec, values in map(cb.decode, bench_callbacks.SAMPLE)]
+
+    async def run():
+        bot = Bot(token='42:stub')
+        try:
+            legacy = await bench_callbacks.check_routing(
+                bench_callbacks.legacy_dispatcher(), bot,
+                bench_callbacks.make_updates(bench_callbacks.SAMPLE, len(bench_callbacks.SAMPLE)))
+            table = await bench_callbacks.check_routing(
+                bench_callbacks.table_dispatcher(), bot, bench_callbacks.make_updates(packed, len(packed)))
+            return legacy, table
+        finally:
+            await bot.session.close()
+
+    assert asyncio.run(run()) == ([], [])
+
+
+def test_table_handlers_pass_through_inner_middlewares():
+    table = cb.CallbackTable()
+    calls = []
+
+    @table.handler(cb.ADD_FAVORITE)
+    async def add_favorite(callback_query: CallbackQuery, property_id: int):
+        calls.append(property_id)
+        return True
+
+    dp = Dispatcher()
+    dp.callback_query.middleware(HandlerLabelMiddleware())
+    dp.include_router(table.router)
+    route = {}
+
+    assert feed(dp, [cb.ADD_FAVORITE.pack(property_id=9988)], metrics_route=route) == [True]
+    assert calls == [9988]
+    assert route == {'router': 'test_callbacks', 'handler': 'fav'}
+
+
+def test_unknown_and_unhandled_callbacks_fall_through_to_routers():
+    table = cb.CallbackTable()
+    fallback = Router()
+
+    @fallback.callback_query()
+    async def other(callback_query: CallbackQuery):
+        return callback_query.data
+
+    dp = Dispatcher()
+    dp.include_routers(table.router, fallback)
+
+    assert feed(dp, ['dialog_button', cb.NOOP.pack()]) == ['dialog_button', cb.NOOP.pack()]
+
+
+@pytest.mark.parametrize('value', [0, 1, 35, 36, 9988, 2 ** 40, -17])
+def test_pack_int_round_trip(value):
+    assert cb.unpack_int(cb.pack_int(value)) == value
+
+
+def test_pack_and_decode():
+    assert cb.ADD_FAVORITE.pack(property_id=9988) == 'fa:7pg'
+    assert cb.TOGGLE_TYPE.pack(value='villa', add=True) == 'tt:villa:1'
+    assert cb.decode('fa:7pg') == (cb.ADD_FAVORITE, {'property_id': 9988})
+    assert cb.decode('tt:villa:0') == (cb.TOGGLE_TYPE, {'value': 'villa', 'add': False})
+    assert cb.decode('bm') == (cb.BACK_TO_MAIN, {})
+
+
+@pytest.mark.parametrize('data, expected', [
+    ('back_to_main', (cb.BACK_TO_MAIN, {})),
+    ('fav_123', (cb.ADD_FAVORITE, {'property_id': 123})),
+    ('page_4', (cb.GO_TO_PAGE, {'page': 4})),
+    ('toggle_district|lamai|add', (cb.TOGGLE_DISTRICT, {'value': 'lamai', 'add': True})),
+    ('select_price|30000-50000|remove', (cb.SELECT_PRICE, {'value': '30000-50000', 'add': False})),
+])
+def test_decode_legacy(data, expected):
+    assert cb.decode(data) == expected
+
+
+@pytest.mark.parametrize('data', [None, '', 'fa', 'fa:zz:1', 'fa:not-base36', 'fav_x', 'toggle_type|villa',
+                                  'unknown_1', 'fv:extra'])
+def test_decode_rejects_foreign_data(data):
+    assert cb.decode(data) is None
+
+
+def test_pack_rejects_separator_and_long_data():
+    with pytest.raises(ValueError):
+        cb.TOGGLE_TYPE.pack(value='a:b', add=True)
+    with pytest.raises(ValueError):
+        cb.TOGGLE_TYPE.pack(value='x' * 64, add=True)
+
+
+def test_every_spec_round_trips():
+    samples = {int: 123456, str: 'villa', bool: True}
+    for callback_spec in cb.SPECS.values():
+        values = {name: samples[kind] for name, kind in callback_spec.fields}
+        assert cb.decode(callback_spec.pack(**values)) == (callback_spec, values)
+        assert cb.LEGACY[callback_spec.legacy] is callback_spec
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.catalog import PropertyCatalog
+from database import properties as queries
+
+T0 = datetime(2024, 5, 1, 10, 0)
+
+
+def make_row(property_id, price, updated_at=T0, **columns):
+    return {'property_id': property_id, 'name': f"Villa {property_id}", 'property_type': 'villa',
+            'location': 'Lamai', 'rent_type': 'monthly', 'bedrooms': 2, 'bathrooms': 1, 'monthly_price': price,
+            'updated_at': updated_at, 'avg_rating': None, **columns}
+
+
+class FakeTables:
+    """properties и property_rating в памяти; функции database.properties подменяются методами этого класса."""
+
+    def __init__(self, rows):
+        self.properties = {row['property_id']: dict(row) for row in rows}
+        self.ratings = {}
+        self.ratings_updated_at = None
+        self.calls = []
+
+    def rate(self, property_id, avg_rating, updated_at):
+        self.ratings[property_id] = avg_rating
+        self.ratings_updated_at = updated_at
+
+    async def fetch_properties(self, db, updated_since=None):
+        self.calls.append('fetch_properties')
+        return [dict(row, avg_rating=self.ratings.get(row['property_id'])) for row in self.properties.values()
+                if updated_since is None or row['updated_at'] >= updated_since]
+
+    async def fetch_catalog_state(self, db):
+        self.calls.append('fetch_catalog_state')
+        return {'properties': len(self.properties), 'ratings': len(self.ratings),
+                'ratings_updated_at': self.ratings_updated_at}
+
+    async def fetch_property_ids(self, db):
+        self.calls.append('fetch_property_ids')
+        return set(self.properties)
+
+    async def fetch_ratings(self, db):
+        self.calls.append('fetch_ratings')
+        return dict(self.ratings)
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    tables = FakeTables([make_row(1, 30000), make_row(2, 50000), make_row(3, 40000)])
+    for name in ('fetch_properties', 'fetch_catalog_state', 'fetch_property_ids', 'fetch_ratings'):
+        monkeypatch.setattr(queries, name, getattr(tables, name))
+    return tables
+
+
+def load(tables):
+    catalog = PropertyCatalog(db=None)
+    asyncio.run(catalog.load())
+    asyncio.run(catalog.refresh())
+    tables.calls.clear()
+    return catalog
+
+
+def ids(catalog):
+    return [property['property_id'] for property in asyncio.run(catalog.search({}))]
+
+
+def test_refresh_without_changes_keeps_version(tables):
+    catalog = load(tables)
+    version = catalog.version
+
+    asyncio.run(catalog.refresh())
+
+    assert catalog.version == version
+    assert tables.calls == ['fetch_properties', 'fetch_catalog_state']
+
+
+def test_changed_row_rebuilds_index(tables):
+    catalog = load(tables)
+    version = catalog.version
+    tables.properties[1].update(monthly_price=90000, updated_at=T0 + timedelta(minutes=1))
+
+    asyncio.run(catalog.refresh())
+
+    assert catalog.version == version + 1
+    assert ids(catalog) == [1, 2, 3]
+    assert 'fetch_property_ids' not in tables.calls
+
+
+def test_deleted_row_is_dropped(tables):
+    catalog = load(tables)
+    del tables.properties[2]
+
+    asyncio.run(catalog.refresh())
+
+    assert ids(catalog) == [3, 1]
+    assert 'fetch_property_ids' in tables.calls
+
+
+def test_insert_and_delete_in_one_tick(tables):
+    catalog = load(tables)
+    del tables.properties[3]
+    tables.properties[4] = make_row(4, 45000, updated_at=T0 + timedelta(minutes=1))
+
+    asyncio.run(catalog.refresh())
+
+    assert ids(catalog) == [2, 4, 1]
+
+
+def test_rating_change_is_picked_up(tables):
+    catalog = load(tables)
+    version = catalog.version
+    tables.rate(3, 4.5, T0 + timedelta(minutes=1))
+
+    asyncio.run(catalog.refresh())
+
+    assert catalog.version == version + 1
+    assert asyncio.run(catalog.get(3))['avg_rating'] == 4.5
+
+    # Сводка не двигалась - рейтинги повторно не читаются
+    tables.calls.clear()
+    asyncio.run(catalog.refresh())
+    assert 'fetch_ratings' not in tables.calls and catalog.version == version + 1
+
+
+def test_page_by_keyset(tables):
+    catalog = load(tables)
+
+    first = asyncio.run(catalog.page({}))
+    second = asyncio.run(catalog.page({}, (first['monthly_price'], first['property_id'])))
+    back = asyncio.run(catalog.page({}, (second['monthly_price'], second['property_id']), direction='prev'))
+    last = asyncio.run(catalog.page({}, (30000, 1)))
+
+    assert (first['property_id'], second['property_id'], back['property_id'], last) == (2, 3, 2, None)
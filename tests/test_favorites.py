@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.favorites import FavoritesService
+from database import properties as queries
+
+
+class FakeCatalog:
+    def __init__(self, names):
+        self._names = names
+
+    async def names(self, property_ids):
+        return {property_id: self._names[property_id] for property_id in property_ids if property_id in self._names}
+
+
+class FakeDatabase:
+    def __init__(self, favorites):
+        self.favorites = favorites
+        self.loads = 0
+
+    async def add_property_to_favorites(self, user_id, property_id):
+        if property_id in self.favorites.setdefault(user_id, []):
+            return False
+        self.favorites[user_id].append(property_id)
+        return True
+
+    async def execute_query(self, query, params):
+        user_id, property_id = params
+        self.favorites[user_id].remove(property_id)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDatabase({7: [1, 2, 3, 4, 5]})
+
+    async def fetch_favorite_ids(fake_db, user_id):
+        fake_db.loads += 1
+        return list(fake_db.favorites.get(user_id, []))
+
+    monkeypatch.setattr(queries, 'fetch_favorite_ids', fetch_favorite_ids)
+    return db
+
+
+def test_set_is_cached_and_updated_write_through(db):
+    favorites = FavoritesService(db, FakeCatalog({}))
+
+    async def run():
+        return (await favorites.add(7, 6), await favorites.add(7, 6), await favorites.contains(7, 6),
+                await favorites.remove(7, 6), await favorites.contains(7, 6))
+
+    assert asyncio.run(run()) == (True, False, True, None, False)
+    assert db.loads == 1 and db.favorites[7] == [1, 2, 3, 4, 5]
+    assert favorites.stats()['duplicates'] == 1
+
+
+def test_stale_set_still_rejects_duplicate_in_database(db):
+    favorites = FavoritesService(db, FakeCatalog({}))
+    asyncio.run(favorites.contains(7, 9))
+    # Другая реплика уже добавила объект - множество в памяти об этом не знает
+    db.favorites[7].append(9)
+
+    assert asyncio.run(favorites.add(7, 9)) is False
+    assert db.favorites[7].count(9) == 1 and asyncio.run(favorites.contains(7, 9))
+
+
+def test_ttl_reloads_set(db):
+    favorites = FavoritesService(db, FakeCatalog({}), ttl=0)
+    asyncio.run(favorites.contains(7, 1))
+    asyncio.run(favorites.contains(7, 1))
+    assert db.loads == 2
+
+
+def test_least_recent_users_are_evicted(db):
+    favorites = FavoritesService(db, FakeCatalog({}), max_users=2)
+    for user_id in (1, 2, 1, 3):
+        asyncio.run(favorites.contains(user_id, 1))
+    assert list(favorites._sets) == [1, 3]
+
+
+def test_pages_skip_deleted_properties(db):
+    # 1 и 2 удалены из каталога: при странице в 2 объекта первая страница не должна оказаться пустой
+    favorites = FavoritesService(db, FakeCatalog({3: "Villa 3", 4: "Villa 4", 5: "Villa 5"}), page_size=2)
+
+    assert asyncio.run(favorites.page(7, 0)) == ([(3, "Villa 3"), (4, "Villa 4")], 0, 2)
+    assert asyncio.run(favorites.page(7, 1)) == ([(5, "Villa 5")], 1, 2)
+    assert asyncio.run(favorites.page(7, 5)) == ([(5, "Villa 5")], 1, 2)
+
+
+def test_only_deleted_properties_mean_no_favorites(db):
+    favorites = FavoritesService(db, FakeCatalog({}))
+    assert asyncio.run(favorites.page(7, 0)) == ([], 0, 1)
+    assert asyncio.run(favorites.page(8, 0)) == ([], 0, 1)
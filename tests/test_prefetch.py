@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.middlewares import PrefetchCancelMiddleware
+from app.prefetch import PagePrefetcher
+
+SEARCH_FILTER = {'locations': ['Lamai']}
+
+
+class FakeCatalog:
+    def __init__(self, prices, delay=0):
+        self.properties = [{'property_id': number, 'monthly_price': price} for number, price in enumerate(prices)]
+        self.version = 1
+        self.delay = delay
+
+    async def page(self, search_filter, keyset, direction='next'):
+        await asyncio.sleep(self.delay)
+        position = next(number for number, property in enumerate(self.properties)
+                        if (property['monthly_price'], property['property_id']) == tuple(keyset))
+        position += 1 if direction == 'next' else -1
+        return self.properties[position] if 0 <= position < len(self.properties) else None
+
+
+class FakePhotoCache:
+    async def media_group(self, property_id, urls, caption=None):
+        return [(url, caption) for url in urls]
+
+
+def render(property, page, total):
+    return f"page {page + 1}/{total}", None, [f"http://photo/{property['property_id']}"]
+
+
+def prefetched(catalog, page=1, **kwargs):
+    prefetcher = PagePrefetcher(catalog, FakePhotoCache(), **kwargs)
+
+    async def run():
+        property = catalog.properties[page]
+        prefetcher.schedule(7, SEARCH_FILTER, (property['monthly_price'], property['property_id']), page, 3, render)
+        await asyncio.gather(*prefetcher._tasks.values())
+
+    asyncio.run(run())
+    return prefetcher
+
+
+def test_neighbours_are_prepared_and_taken_once():
+    prefetcher = prefetched(FakeCatalog([300, 200, 100]))
+
+    next_slot = prefetcher.take(7, SEARCH_FILTER, 2, 3)
+    prev_slot = prefetcher.take(7, SEARCH_FILTER, 0, 3)
+
+    assert next_slot['property']['property_id'] == 2 and next_slot['text'] == "page 3/3"
+    assert next_slot['media'] == [("http://photo/2", "page 3/3")]
+    assert prev_slot['property']['property_id'] == 0
+    assert prefetcher.take(7, SEARCH_FILTER, 2, 3) is None
+    assert (prefetcher.hits, prefetcher.misses) == (2, 1)
+
+
+def test_budget_one_prepares_only_next_page():
+    prefetcher = prefetched(FakeCatalog([300, 200, 100]), budget=1)
+    assert prefetcher.take(7, SEARCH_FILTER, 0, 3) is None
+    assert prefetcher.take(7, SEARCH_FILTER, 2, 3) is not None
+
+
+def test_catalog_update_invalidates_slots():
+    catalog = FakeCatalog([300, 200, 100])
+    prefetcher = prefetched(catalog)
+    catalog.version += 1
+    assert prefetcher.take(7, SEARCH_FILTER, 2, 3) is None
+
+
+def test_other_filter_or_total_misses():
+    prefetcher = prefetched(FakeCatalog([300, 200, 100]))
+    assert prefetcher.take(7, {'locations': ['Chaweng']}, 2, 3) is None
+    assert prefetcher.take(7, SEARCH_FILTER, 2, 4) is None
+    assert prefetcher.take(8, SEARCH_FILTER, 2, 3) is None
+
+
+def test_cancel_stops_running_prefetch():
+    prefetcher = PagePrefetcher(FakeCatalog([300, 200, 100], delay=1), FakePhotoCache())
+
+    async def run():
+        prefetcher.schedule(7, SEARCH_FILTER, (200, 1), 1, 3, render)
+        task = prefetcher._tasks[7]
+        await asyncio.sleep(0)
+        prefetcher.cancel(7)
+        await asyncio.gather(task, return_exceptions=True)
+        return task.cancelled()
+
+    assert asyncio.run(run())
+    assert not prefetcher.active(7) and prefetcher.cancelled == 1
+
+
+def test_oldest_users_are_evicted():
+    prefetcher = PagePrefetcher(FakeCatalog([300, 200, 100], delay=1), FakePhotoCache(), max_users=2)
+
+    async def run():
+        for user_id in (1, 2, 3):
+            prefetcher.schedule(user_id, SEARCH_FILTER, (200, 1), 1, 3, render)
+        users = sorted(prefetcher._slots)
+        for user_id in (2, 3):
+            prefetcher.cancel(user_id)
+        return users
+
+    assert asyncio.run(run()) == [2, 3]
+
+
+class FakeState:
+    def __init__(self, state):
+        self.state = state
+
+    async def get_state(self):
+        return self.state
+
+
+def test_cancel_middleware_keeps_prefetch_only_in_results_state():
+    prefetcher = prefetched(FakeCatalog([300, 200, 100]))
+    middleware = PrefetchCancelMiddleware(prefetcher, 'PropertyFilter:showing_results')
+
+    async def handler(event, data):
+        return None
+
+    async def feed(state):
+        await middleware(handler, None, {'event_chat': SimpleNamespace(id=7), 'state': FakeState(state)})
+
+    asyncio.run(feed('PropertyFilter:showing_results'))
+    assert prefetcher.active(7)
+    asyncio.run(feed(None))
+    assert not prefetcher.active(7)
@@ -0,0 +1,24 @@
+import pytest
+
+from database.profiler import normalize
+
+
+@pytest.mark.parametrize('query, fingerprint', [
+    ("SELECT * FROM users WHERE user_id = %s", "SELECT * FROM users WHERE user_id = ?"),
+    ("SELECT * FROM users WHERE user_id = 42", "SELECT * FROM users WHERE user_id = ?"),
+    ("SELECT *\n  FROM properties\n WHERE name = 'Villa ''Sun''' AND price > 1.5",
+     "SELECT * FROM properties WHERE name = ? AND price > ?"),
+    ('SELECT 1 FROM t WHERE a = "x\\"y"', "SELECT ? FROM t WHERE a = ?"),
+    ("SELECT * FROM t WHERE id IN (%s, %s, %s)", "SELECT * FROM t WHERE id IN (...)"),
+    ("SELECT * FROM t WHERE id in (1,2)", "SELECT * FROM t WHERE id IN (...)"),
+    ("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)", "INSERT INTO t (a, b) VALUES (?, ?), ..."),
+    ("UPDATE t SET a = %(a)s WHERE b = %(b)s", "UPDATE t SET a = ? WHERE b = ?"),
+    ("SELECT col1 FROM table2", "SELECT col1 FROM table2"),
+])
+def test_normalize(query, fingerprint):
+    assert normalize(query) == fingerprint
+
+
+def test_same_statement_same_fingerprint():
+    assert normalize("SELECT * FROM t WHERE id IN (%s)") == normalize("SELECT * FROM t WHERE id IN (%s, %s, %s)")
+    assert normalize("INSERT INTO t VALUES (1, 'a')") == normalize("INSERT INTO t VALUES (%s, %s)")
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.scheduler import CronSchedule, LeaseLost, Scheduler
+
+
+def test_daily_schedule():
+    schedule = CronSchedule("0 10 * * *")
+    assert schedule.next_after(datetime(2024, 5, 1, 9, 59, 30)) == datetime(2024, 5, 1, 10, 0)
+    # Строго после: ровно в момент срабатывания - следующий день
+    assert schedule.next_after(datetime(2024, 5, 1, 10, 0)) == datetime(2024, 5, 2, 10, 0)
+
+
+def test_steps_ranges_and_weekdays():
+    schedule = CronSchedule("*/15 8-22 * * 1-5")
+    assert schedule.next_after(datetime(2024, 5, 3, 8, 7)) == datetime(2024, 5, 3, 8, 15)
+    # Пятница 22:45 -> понедельник 8:00
+    assert schedule.next_after(datetime(2024, 5, 3, 22, 45)) == datetime(2024, 5, 6, 8, 0)
+
+
+def test_sunday_is_zero_and_seven():
+    for expression in ("30 6 * * 0", "30 6 * * 7"):
+        assert CronSchedule(expression).next_after(datetime(2024, 5, 1)) == datetime(2024, 5, 5, 6, 30)
+
+
+def test_day_of_month_or_weekday():
+    # Заданы оба поля - как в cron, достаточно любого: 1-е число или понедельник
+    schedule = CronSchedule("0 0 1 * 1")
+    assert schedule.next_after(datetime(2024, 5, 1, 12, 0)) == datetime(2024, 5, 6, 0, 0)
+    assert schedule.next_after(datetime(2024, 5, 27, 12, 0)) == datetime(2024, 6, 1, 0, 0)
+
+
+def test_month_and_year_rollover():
+    schedule = CronSchedule("0 0 29 2 *")
+    assert schedule.next_after(datetime(2024, 3, 1)) == datetime(2028, 2, 29, 0, 0)
+    assert CronSchedule("5 0 1 1 *").next_after(datetime(2024, 12, 31, 23, 59)) == datetime(2025, 1, 1, 0, 5)
+
+
+@pytest.mark.parametrize('expression', ["0 10 * *", "60 * * * *", "* 24 * * *", "*/0 * * * *", "5-1 * * * *"])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_never_fires():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(datetime(2024, 1, 1))
+
+
+class FakeCursor:
+    def __init__(self, rowcount=0, lastrowid=None):
+        self.rowcount = rowcount
+        self.lastrowid = lastrowid
+
+
+class FakeDatabase:
+    """
+    Таблицы jobs и job_runs в памяти для запросов Scheduler.
+    rowcount, как у aiomysql без CLIENT.FOUND_ROWS, - число изменённых, а не найденных строк.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.runs = {}
+
+    def add_job(self, name, next_run_at):
+        self.jobs[name] = {'next_run_at': next_run_at, 'lease_owner': None, 'lease_until': None,
+                           'checkpoint': None, 'last_run_at': None, 'last_status': None}
+
+    def _update(self, row, values):
+        changed = any(row[column] != value for column, value in values.items())
+        row.update(values)
+        return FakeCursor(rowcount=int(changed))
+
+    async def execute_query(self, query, params):
+        if query.startswith("INSERT INTO job_runs"):
+            run_id = len(self.runs) + 1
+            self.runs[run_id] = {'status': 'running'}
+            return FakeCursor(rowcount=1, lastrowid=run_id)
+        if "UPDATE job_runs" in query:
+            finished_at, status, items, duration_ms, error, run_id = params
+            self.runs[run_id] = {'status': status, 'items': items, 'error': error}
+            return FakeCursor(rowcount=1)
+        if "next_run_at <= %s" in query:
+            owner, lease_until, name, now, _ = params
+            row = self.jobs.get(name)
+            if row is None or row['next_run_at'] > now or (row['lease_until'] and row['lease_until'] >= now):
+                return FakeCursor()
+            return self._update(row, {'lease_owner': owner, 'lease_until': lease_until})
+
+        assignments = re.search(r"SET (.*) WHERE", query, re.S).group(1)
+        *values, name, owner = params
+        values = iter(values)
+        update = {}
+        for assignment in assignments.split(','):
+            column, value = (part.strip() for part in assignment.split('='))
+            update[column] = None if value == 'NULL' else next(values)
+        row = self.jobs.get(name)
+        if row is None or row['lease_owner'] != owner:
+            return FakeCursor()
+        return self._update(row, update)
+
+    async def fetch_one(self, query, params):
+        column = re.search(r"SELECT (\w+) FROM jobs", query).group(1)
+        row = self.jobs.get(params[0])
+        return (row[column],) if row else None
+
+
+def make_scheduler(db, func=None, lease=300):
+    scheduler = Scheduler(db, lease=lease)
+    scheduler.add('sync', "0 10 * * *", func, retry_delay=60)
+    return scheduler, scheduler.jobs['sync']
+
+
+def test_acquire_only_due_and_unleased():
+    db = FakeDatabase()
+    db.add_job('sync', datetime.now() + timedelta(hours=1))
+    first, job = make_scheduler(db)
+    second, _ = make_scheduler(db)
+
+    assert asyncio.run(first._acquire(job)) is None
+    db.jobs['sync']['next_run_at'] = datetime.now() - timedelta(minutes=1)
+    assert asyncio.run(first._acquire(job)) == {}
+    assert db.jobs['sync']['lease_owner'] == first.owner
+    # Аренда жива - вторая реплика задачу не берёт
+    assert asyncio.run(second._acquire(job)) is None
+
+    db.jobs['sync']['lease_until'] = datetime.now() - timedelta(seconds=1)
+    assert asyncio.run(second._acquire(job)) == {}
+    assert db.jobs['sync']['lease_owner'] == second.owner
+
+
+def test_saving_unchanged_checkpoint_keeps_the_lease():
+    db = FakeDatabase()
+    db.add_job('sync', datetime.now() - timedelta(minutes=1))
+    scheduler, job = make_scheduler(db)
+
+    async def scenario():
+        await scheduler._acquire(job)
+        await scheduler.save_checkpoint('sync', {'offset': 10})
+        # Те же значения - UPDATE ничего не меняет (rowcount 0), но аренда по-прежнему наша
+        await scheduler.save_checkpoint('sync', {'offset': 10})
+
+    asyncio.run(scenario())
+    assert json.loads(db.jobs['sync']['checkpoint']) == {'offset': 10}
+
+
+def test_writes_after_lease_taken_over_are_fenced():
+    db = FakeDatabase()
+    db.add_job('sync', datetime.now() - timedelta(minutes=1))
+    first, job = make_scheduler(db)
+    second, _ = make_scheduler(db)
+
+    async def scenario():
+        await first._acquire(job)
+        db.jobs['sync']['lease_until'] = datetime.now() - timedelta(seconds=1)
+        await second._acquire(job)
+        await second.save_checkpoint('sync', {'offset': 5})
+        with pytest.raises(LeaseLost):
+            await first.save_checkpoint('sync', {'offset': 10})
+
+    asyncio.run(scenario())
+    assert json.loads(db.jobs['sync']['checkpoint']) == {'offset': 5}
+    assert db.jobs['sync']['lease_owner'] == second.owner
+
+
+def test_heartbeat_extends_the_lease():
+    db = FakeDatabase()
+    db.add_job('sync', datetime.now() - timedelta(minutes=1))
+    leases = []
+
+    async def func(context):
+        leases.append(db.jobs['sync']['lease_until'])
+        await asyncio.sleep(0.25)
+        leases.append(db.jobs['sync']['lease_until'])
+
+    scheduler, job = make_scheduler(db, func, lease=0.3)
+
+    async def scenario():
+        await scheduler._execute(job, await scheduler._acquire(job))
+
+    asyncio.run(scenario())
+    assert leases[1] > leases[0]
+    assert db.runs[1]['status'] == 'ok'
+    assert db.jobs['sync']['lease_owner'] is None
+
+
+def test_heartbeat_cancels_run_when_lease_is_lost():
+    db = FakeDatabase()
+    db.add_job('sync', datetime.now() - timedelta(minutes=1))
+
+    async def func(context):
+        db.jobs['sync']['lease_owner'] = 'other-replica'
+        await asyncio.sleep(5)
+
+    scheduler, job = make_scheduler(db, func, lease=0.3)
+
+    async def scenario():
+        task = asyncio.create_task(scheduler._execute(job, await scheduler._acquire(job)))
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, 2)
+
+    asyncio.run(scenario())
+    assert db.runs[1]['status'] == 'cancelled'
+    # Отпустить чужую аренду прогон не смог
+    assert db.jobs['sync']['lease_owner'] == 'other-replica'
+
+
+def test_failed_run_resumes_from_checkpoint():
+    db = FakeDatabase()
+    db.add_job('sync', datetime.now() - timedelta(minutes=1))
+    seen = []
+
+    async def func(context):
+        seen.append((context.resumed, dict(context.checkpoint)))
+        offset = context.checkpoint.get('offset', 0)
+        if not context.resumed:
+            await context.save({'offset': offset + 2}, items=2)
+            raise RuntimeError("API timeout")
+        context.add_items(3)
+
+    scheduler, job = make_scheduler(db, func)
+
+    async def run_once():
+        checkpoint = await scheduler._acquire(job)
+        assert checkpoint is not None
+        await scheduler._execute(job, checkpoint)
+
+    asyncio.run(run_once())
+    row = db.jobs['sync']
+    assert db.runs[1] == {'status': 'failed', 'items': 2, 'error': "API timeout"}
+    assert row['lease_owner'] is None and json.loads(row['checkpoint']) == {'offset': 2}
+    assert row['next_run_at'] > datetime.now() + timedelta(seconds=50)
+
+    row['next_run_at'] = datetime.now() - timedelta(seconds=1)
+    asyncio.run(run_once())
+    assert seen == [(False, {}), (True, {'offset': 2})]
+    assert db.runs[2]['status'] == 'ok'
+    assert row['checkpoint'] is None and row['last_status'] == 'ok'
+    assert row['next_run_at'] == job.schedule.next_after(datetime.now())
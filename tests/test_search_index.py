@@ -0,0 +1,85 @@
+import itertools
+
+from app.catalog import sort_key
+from app.search_index import SearchIndex, iter_bits
+from database.properties import RENT_TYPE_VALUES, parse_price_range
+
+TYPES = ('Villa', 'apartment ', 'House')
+LOCATIONS = ('Chaweng', 'Lamai', 'Bophut')
+PRICES = (9000, 30000, 45000, 70000, 150000)
+
+FILTERS = [
+    {},
+    {'rent_type': 'monthly'},
+    {'rent_type': 'daily', 'locations': ['lamai']},
+    {'property_types': ['villa', 'House'], 'bedrooms': ['3', '2']},
+    {'locations': ['Chaweng', 'bophut'], 'bathrooms': ['2'], 'price_range': '30000-50000'},
+    {'rent_type': 'both', 'price_range': '100000+'},
+    {'property_types': ['apartment'], 'locations': ['Lamai'], 'bedrooms': ['1'], 'price_range': '50000-70000'},
+    {'property_types': ['castle']},
+]
+
+
+def make_catalog():
+    properties = []
+    for property_id, (property_type, location, rent_type, bedrooms, price) in enumerate(itertools.product(
+            TYPES, LOCATIONS, ('monthly', 'daily', 'both'), (1, 2, 3), PRICES)):
+        properties.append({
+            'property_id': property_id, 'property_type': property_type, 'location': location,
+            'rent_type': rent_type, 'bedrooms': bedrooms, 'bathrooms': bedrooms - 1 + property_id % 2,
+            'monthly_price': price,
+            '_type': property_type.strip().lower(), '_location': location.strip().lower(),
+        })
+    return sorted(properties, key=sort_key)
+
+
+def reference_match(property, search_filter):
+    """Те же условия, что у build_search_conditions, проверенные по одному объекту."""
+    rent_type = search_filter.get('rent_type')
+    if rent_type and property['rent_type'] not in RENT_TYPE_VALUES[rent_type]:
+        return False
+    for facet, column in (('property_types', 'property_type'), ('locations', 'location')):
+        selected = search_filter.get(facet)
+        if selected and property[column].strip().lower() not in {value.strip().lower() for value in selected}:
+            return False
+    for facet in ('bedrooms', 'bathrooms'):
+        selected = search_filter.get(facet)
+        if selected and property[facet] < min(map(int, selected)):
+            return False
+    price_range = search_filter.get('price_range')
+    if price_range:
+        min_price, max_price = parse_price_range(price_range)
+        if not min_price <= property['monthly_price'] <= max_price:
+            return False
+    return True
+
+
+def test_iter_bits():
+    assert list(iter_bits(0)) == []
+    assert list(iter_bits(0b101001)) == [0, 3, 5]
+
+
+def test_search_matches_reference_and_keeps_order():
+    properties = make_catalog()
+    index = SearchIndex(properties)
+    for search_filter in FILTERS:
+        expected = [property for property in properties if reference_match(property, search_filter)]
+        assert index.search(search_filter) == expected, search_filter
+        assert index.count(search_filter) == len(expected)
+
+
+def test_facet_counts_ignore_own_facet():
+    properties = make_catalog()
+    index = SearchIndex(properties)
+    search_filter = {'locations': ['Lamai'], 'bedrooms': ['2']}
+    counts = index.facet_counts(search_filter, 'locations', LOCATIONS)
+    for location in LOCATIONS:
+        expected = sum(reference_match(property, {**search_filter, 'locations': [location]})
+                       for property in properties)
+        assert counts[location] == expected
+
+
+def test_empty_index():
+    index = SearchIndex([])
+    assert index.search({'locations': ['Lamai']}) == []
+    assert index.count({}) == 0
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from config import db_config
+from database.database import Database
+from database.explain_check import FACETS, filter_combinations, find_full_scans
+from handlers.handlers_search import FACET_ITEMS
+
+
+def test_combinations_cover_every_facet_value():
+    seen = {key: set() for key, _, _ in FACETS}
+    for search_filter in filter_combinations(FACET_ITEMS):
+        for key, _, multiple in FACETS:
+            value = search_filter[key]
+            if value:
+                seen[key].update(value if multiple else [value])
+
+    for key, data_key, _ in FACETS:
+        assert seen[key] == {item_id for _, item_id in FACET_ITEMS[data_key]}
+
+
+async def _full_scans():
+    db = Database(db_config)
+    try:
+        await db.connect()
+    except Exception as e:
+        pytest.skip(f"MySQL is not available: {e}")
+    try:
+        return await find_full_scans(db)
+    finally:
+        await db.disconnect()
+
+
+def test_no_search_filter_scans_whole_table():
+    failures = asyncio.run(_full_scans())
+    assert not failures, "\n".join(f"{scan_type}: {search_filter}" for search_filter, scan_type, _ in failures[:20])
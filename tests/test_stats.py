@@ -0,0 +1,60 @@
+import asyncio
+from datetime import date, timedelta
+
+from app.stats import StatsService
+
+
+class FakeDatabase:
+    def __init__(self, daily_rows):
+        self.daily_rows = daily_rows
+        self.calls = []
+
+    async def get_detailed_user_statistics(self):
+        self.calls.append('summary')
+        return {'total_users': 10}
+
+    async def get_daily_stats(self, since):
+        self.calls.append(('daily', since))
+        return [row for row in self.daily_rows if row[0] >= since]
+
+
+def test_trend_fills_missing_days_with_zeros():
+    today = date.today()
+    db = FakeDatabase([(today - timedelta(days=5), 1, 1, 1, 1), (today - timedelta(days=1), 2, 5, 3, 0)])
+
+    trend = asyncio.run(StatsService(db).trend(days=3))
+
+    assert trend == [
+        (today - timedelta(days=2), 0, 0, 0, 0),
+        (today - timedelta(days=1), 2, 5, 3, 0),
+        (today, 0, 0, 0, 0),
+    ]
+    assert db.calls == [('daily', today - timedelta(days=2))]
+
+
+def test_answers_are_cached_per_key_until_ttl():
+    db = FakeDatabase([])
+    service = StatsService(db, ttl=60)
+
+    async def scenario():
+        for _ in range(3):
+            await service.summary()
+        await service.trend(days=7)
+        await service.trend(days=7)
+        await service.trend(days=30)
+
+    asyncio.run(scenario())
+    assert [call if call == 'summary' else call[0] for call in db.calls] == ['summary', 'daily', 'daily']
+    assert service.stats() == {'cached': 3, 'hits': 3, 'loads': 3}
+
+
+def test_expired_answer_is_reloaded():
+    db = FakeDatabase([])
+    service = StatsService(db, ttl=0)
+
+    async def scenario():
+        await service.summary()
+        await service.summary()
+
+    asyncio.run(scenario())
+    assert db.calls == ['summary', 'summary']
@@ -0,0 +1,61 @@
+import asyncio
+import json
+from decimal import Decimal
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from app.storage import CompactStorage, LocalKeyValue, StateTooLarge, decode_data, encode_data
+
+SEARCH_DATA = {
+    'page': 3, 'total': 250, 'album_size': 4, 'message_ids': [1051, 1052, 1053, 1054, 1050],
+    'selected_types': ['villa', 'дом'], 'selected_districts': [],
+    'selected_rent_type': 'monthly', 'search_filter': {'price_range': '30000-50000', 'after': [45000, 12]},
+}
+
+
+def test_round_trip():
+    assert decode_data(encode_data(SEARCH_DATA)) == SEARCH_DATA
+
+
+def test_compact_fields_are_smaller_than_json():
+    compact = {name: SEARCH_DATA[name] for name in ('page', 'total', 'album_size', 'message_ids', 'selected_types')}
+    assert len(encode_data(compact)) < len(json.dumps(compact).encode()) / 2
+
+
+@pytest.mark.parametrize('data', [
+    {},
+    {'page': 0, 'message_ids': []},
+    {'page': -1, 'total': True, 'message_ids': [5, -2], 'selected_types': ['a', 1]},
+    {'total': 2 ** 40, 'message_ids': [2 ** 31, 1]},
+])
+def test_edge_values_round_trip(data):
+    assert decode_data(encode_data(data)) == data
+
+
+def test_decimal_goes_to_json_tail():
+    assert decode_data(encode_data({'keyset': [Decimal('45000'), Decimal('0.5')]})) == {'keyset': [45000, 0.5]}
+
+
+def test_unknown_version_and_tag():
+    with pytest.raises(ValueError):
+        decode_data(bytes([99]))
+    with pytest.raises(ValueError):
+        decode_data(bytes([1, 14, 0]))
+
+
+def test_storage_round_trip_and_size_limit():
+    storage = CompactStorage(LocalKeyValue(), max_data_size=64)
+    key = StorageKey(bot_id=1, chat_id=2, user_id=3)
+
+    async def run():
+        await storage.set_state(key, 'PropertyFilter:showing_results')
+        await storage.set_data(key, {'page': 1, 'message_ids': [10, 11]})
+        with pytest.raises(StateTooLarge):
+            await storage.set_data(key, {'note': 'x' * 100})
+        result = await storage.get_state(key), await storage.get_data(key)
+        await storage.set_data(key, {})
+        return result + (await storage.get_data(key),)
+
+    assert asyncio.run(run()) == ('PropertyFilter:showing_results', {'page': 1, 'message_ids': [10, 11]}, {})
+    assert storage.rejected == 1
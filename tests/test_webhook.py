@@ -0,0 +1,68 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+import bot as bot_module
+from app.webhook import build_webhook_app
+from tools.stub_telegram import StubTelegram, push_update
+
+SECRET = 'webhook-secret'
+UPDATE = {
+    'update_id': 1,
+    'message': {'message_id': 10, 'date': 0, 'chat': {'id': 7, 'type': 'private'},
+                'from': {'id': 7, 'is_bot': False, 'first_name': 'Test'}, 'text': 'ping'},
+}
+
+
+async def run_webhook_app(scenario, health_check=None):
+    stub = StubTelegram()
+    async with TestServer(stub.build_app()) as stub_server:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(str(stub_server.make_url('')).rstrip('/')))
+        bot = Bot(token='42:stub', session=session)
+        router = Router()
+
+        @router.message()
+        async def pong(message: Message):
+            await message.answer('pong')
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        app = build_webhook_app(dp, bot, '/webhook', secret_token=SECRET, health_check=health_check)
+        try:
+            async with TestClient(TestServer(app)) as client:
+                return await scenario(client, stub)
+        finally:
+            await bot.session.close()
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    return predicate()
+
+
+def test_updates_need_the_secret_token():
+    async def scenario(client, stub):
+        url = str(client.make_url('/webhook'))
+        rejected = await push_update(url, UPDATE, secret_token='wrong')
+        missing = await push_update(url, UPDATE)
+        accepted = await push_update(url, UPDATE, secret_token=SECRET)
+        answered = await wait_for(lambda: stub.calls['sendMessage'] == 1)
+        return rejected, missing, accepted, answered, stub.calls['sendMessage']
+
+    assert asyncio.run(run_webhook_app(scenario)) == (401, 401, 200, True, 1)
+
+
+def test_health_reports_missing_db_pool():
+    async def scenario(client, stub):
+        response = await client.get('/health')
+        return response.status, (await response.json())['status']
+
+    assert bot_module.db.pool is None
+    assert asyncio.run(run_webhook_app(scenario, health_check=bot_module.health_check)) == (503, 'db_unavailable')
+    assert asyncio.run(run_webhook_app(scenario)) == (200, 'ok')
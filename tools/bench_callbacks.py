@@ -0,0 +1,128 @@
+"""
+Микробенчмарк маршрутизации callback_query: стоимость dp.feed_update на одно обновление.
+
+legacy - прежняя схема: F.data == / F.data.startswith фильтры в пяти роутерах в порядке include_routers из bot.py;
+table  - app.callbacks: все роутеры бота подключены, callback_data разбирается один раз фильтром
+         роутера таблицы, обработчик берётся из неё по тегу.
+Обработчики в обоих случаях пустые, Bot API не вызывается. Перед замером проверяется, что каждое обновление
+дошло до обработчика: бенчмарк, в котором обновления молча уходят мимо, ничего не меряет.
+
+Запуск:
+    python -m tools.bench_callbacks --updates 20000
+"""
+import argparse
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import CallbackQuery, Update, User
+
+import app.callbacks as cb
+from handlers import handlers_start, handlers_favorites, handlers_search, handlers_profile, handlers_top_properties
+
+# Фильтры роутеров до перехода на app.callbacks, в порядке проверки
+LEGACY_ROUTES = [
+    [('==', 'best_properties'), ('==', 'back_to_main')],
+    [('==', 'favorites'), ('startswith', 'show_'), ('startswith', 'del_'), ('==', 'back_to_favorites'),
+     ('==', 'back_to_main')],
+    [('==', 'start_search'), ('startswith', 'select_rent_type|'), ('==', 'continue_rent_type_selection'),
+     ('==', 'skip_rent_type_selection'), ('startswith', 'toggle_type|'), ('==', 'continue_type_selection'),
+     ('==', 'skip_type_selection'), ('startswith', 'toggle_district|'), ('==', 'continue_district_selection'),
+     ('==', 'skip_district_selection'), ('startswith', 'select_beds|'), ('==', 'continue_beds_selection'),
+     ('==', 'skip_beds_selection'), ('startswith', 'select_baths|'), ('==', 'continue_baths_selection'),
+     ('==', 'skip_baths_selection'), ('startswith', 'select_price|'), ('==', 'continue_price_selection'),
+     ('==', 'skip_price_selection'), ('==', 'go_back'), ('==', 'prev_page'), ('==', 'next_page'),
+     ('==', 'current_page'), ('startswith', 'fav_'), ('startswith', 'details_'), ('startswith', 'page_')],
+    [('==', 'update_email'), ('==', 'update_phone_number'), ('==', 'profile')],
+    [],
+]
+
+# Типичная смесь нажатий: листание выдачи, избранное, фильтры, меню
+SAMPLE = ['next_page', 'next_page', 'prev_page', 'fav_1234', 'details_1234', 'page_7',
+          'toggle_district|lamai|add', 'select_price|30000-50000|add', 'show_1234', 'back_to_main', 'profile']
+
+
+async def noop(callback_query: CallbackQuery):
+    return True
+
+
+def legacy_dispatcher():
+    dp = Dispatcher()
+    for routes in LEGACY_ROUTES:
+        router = Router()
+        for kind, value in routes:
+            flt = F.data == value if kind == '==' else F.data.startswith(value)
+            router.callback_query(flt)(noop)
+        dp.include_router(router)
+    return dp
+
+
+def table_dispatcher():
+    dp = Dispatcher()
+    table = cb.CallbackTable()
+    for callback_spec in cb.SPECS.values():
+        table.handler(callback_spec)(noop)
+    dp.include_routers(table.router, handlers_top_properties.router, handlers_favorites.router, handlers_search.router,
+                       handlers_profile.router, handlers_start.start_router)
+    return dp
+
+
+def make_updates(datas, count):
+    user = User(id=1, is_bot=False, first_name='bench')
+    return [
+        Update(update_id=i, callback_query=CallbackQuery(id=str(i), from_user=user, chat_instance='1',
+                                                         data=datas[i % len(datas)]))
+        for i in range(count)
+    ]
+
+
+async def check_routing(dp, bot, updates):
+    """Данные callback_data, которые не дошли ни до одного обработчика."""
+    unrouted = []
+    for update in updates:
+        if await dp.feed_update(bot, update) is not True:
+            unrouted.append(update.callback_query.data)
+    return unrouted
+
+
+async def measure(dp, bot, updates):
+    unrouted = await check_routing(dp, bot, updates[:500])
+    if unrouted:
+        raise RuntimeError(f"Callbacks not dispatched: {sorted(set(unrouted))}")
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+def measure_codec(datas, count):
+    decoded = [cb.decode(data) for data in datas]
+    started = time.perf_counter()
+    for i in range(count):
+        callback_spec, values = decoded[i % len(decoded)]
+        cb.decode(callback_spec.pack(**values))
+    return (time.perf_counter() - started) / count * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Callback dispatch micro-benchmark")
+    parser.add_argument('--updates', type=int, default=20000)
+    args = parser.parse_args()
+
+    bot = Bot(token='42:stub')
+    packed = [spec.pack(**values) for spec, values in map(cb.decode, SAMPLE)]
+
+    legacy_us = await measure(legacy_dispatcher(), bot, make_updates(SAMPLE, args.updates))
+    table_us = await measure(table_dispatcher(), bot, make_updates(packed, args.updates))
+    codec_us = measure_codec(SAMPLE, args.updates)
+    await bot.session.close()
+
+    print(f"legacy F.data routing: {legacy_us:8.1f} us/update")
+    print(f"table dispatch:        {table_us:8.1f} us/update")
+    print(f"pack + decode:         {codec_us:8.1f} us/callback")
+    print(f"callback_data bytes:   legacy {sum(map(len, SAMPLE)) / len(SAMPLE):.1f}, "
+          f"packed {sum(map(len, packed)) / len(packed):.1f} (avg)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,291 @@
+"""
+Нагрузочный прогон воронки поиска: N синтетических пользователей проходят
+start_search -> тип аренды -> тип жилья -> район -> спальни -> ванные -> цена -> next_page x k -> fav
+через настоящий Dispatcher бота (все роутеры и middleware из bot.setup_dispatcher), заглушку Bot API
+(tools/stub_telegram.py) и локальную MySQL с тестовыми объектами.
+
+По каждому шагу (тег callback_data) выводятся p50/p95/p99 задержки, вызовы Bot API и SQL-запросы на шаг.
+Запросы и вызовы API фоновых задач (предвыборка страниц) засчитываются шагу, который их запустил.
+
+Запуск (БД из config.db_config, заглушка поднимается в этом же процессе):
+    python -m tools.load_test --seed 2000 --users 200 --pages 5
+    python -m tools.load_test --users 500 --api-url http://127.0.0.1:8081 --json run.json
+    python -m tools.load_test --cleanup
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import random
+import time
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+from aiohttp import web
+
+import app.callbacks as cb
+import bot as app_bot
+from database.profiler import query_counter
+from handlers.handlers_search import FACET_ITEMS
+from tools.stub_telegram import StubTelegram
+
+NAME_PREFIX = 'loadtest-'
+USER_ID_BASE = 9_000_000_000
+PHOTOS_PER_PROPERTY = 3
+
+# Шаги воронки: (выбор значения, продолжить, пропустить, значения фасета)
+FUNNEL = [
+    (cb.SELECT_RENT_TYPE, cb.CONTINUE_RENT_TYPE, cb.SKIP_RENT_TYPE, 'rent_types'),
+    (cb.TOGGLE_TYPE, cb.CONTINUE_TYPE, cb.SKIP_TYPE, 'types'),
+    (cb.TOGGLE_DISTRICT, cb.CONTINUE_DISTRICT, cb.SKIP_DISTRICT, 'districts'),
+    (cb.SELECT_BEDS, cb.CONTINUE_BEDS, cb.SKIP_BEDS, 'beds'),
+    (cb.SELECT_BATHS, cb.CONTINUE_BATHS, cb.SKIP_BATHS, 'baths'),
+    (cb.SELECT_PRICE, cb.CONTINUE_PRICE, cb.SKIP_PRICE, 'price_ranges'),
+]
+
+api_counter = contextvars.ContextVar('api_counter', default=None)
+
+
+class CountingRequestMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        counter = api_counter.get()
+        if counter is not None:
+            counter['api_calls'] = counter.get('api_calls', 0) + 1
+        return await make_request(bot, method)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def facet_values(key):
+    return [item_id for _, item_id in FACET_ITEMS[key]]
+
+
+async def seed(db, count, users):
+    """Досоздаёт тестовые объекты (name LIKE 'loadtest-%') до count и пользователей для прогона."""
+    row = await db.fetch_one("SELECT COUNT(*) FROM properties WHERE name LIKE %s", (NAME_PREFIX + '%',))
+    existing = row[0]
+    rng = random.Random(existing)
+    rows = []
+    for number in range(existing, count):
+        price = rng.choice([None, rng.randrange(10000, 250000, 500)])
+        photos = [f"https://example.com/{NAME_PREFIX}{number}-{photo}.jpg" for photo in range(PHOTOS_PER_PROPERTY)]
+        rows.append((
+            f"{NAME_PREFIX}{number}", rng.choice(facet_values('districts')).title(), rng.randrange(50, 3000, 50),
+            rng.choice(facet_values('types')), rng.choice(facet_values('rent_types')), price,
+            rng.randrange(800, 8000, 100), 5000, 10000, rng.randint(1, 6), rng.randint(1, 5),
+            rng.random() < 0.5, True, rng.random() < 0.5, "Синтетический объект для нагрузочного прогона", 'по счётчику',
+            *photos,
+        ))
+
+    if rows:
+        photo_columns = ", ".join(f"photo{photo + 1}" for photo in range(PHOTOS_PER_PROPERTY))
+        placeholders = ", ".join(["%s"] * len(rows[0]))
+        query = f"""
+        INSERT INTO properties (name, location, distance_to_sea, property_type, rent_type, monthly_price, daily_price,
+            booking_deposit_fixed, security_deposit, bedrooms, bathrooms, pool, kitchen, cleaning, description,
+            utility_bill, {photo_columns}, notified)
+        VALUES ({placeholders}, TRUE)
+        """
+        await db.bulk_write(query, rows, chunk_size=500)
+        logging.warning(f"Seeded {len(rows)} properties ({count} total)")
+
+    user_rows = [(USER_ID_BASE + number, f"{NAME_PREFIX}{number}") for number in range(users)]
+    await db.bulk_write("INSERT IGNORE INTO users (user_id, username) VALUES (%s, %s)", user_rows)
+
+
+async def cleanup(db):
+    low, high = USER_ID_BASE, USER_ID_BASE + 10_000_000
+    await db.execute_query("DELETE FROM favorites WHERE user_id BETWEEN %s AND %s", (low, high))
+    await db.execute_query("DELETE FROM users WHERE user_id BETWEEN %s AND %s", (low, high))
+    await db.execute_query("DELETE FROM properties WHERE name LIKE %s", (NAME_PREFIX + '%',))
+    logging.warning("Load test data removed")
+
+
+class LoadTest:
+    def __init__(self, bot, args):
+        self.bot = bot
+        self.args = args
+        self.update_ids = itertools.count(1)
+        self.samples = {}
+        self.empty_results = 0
+        self.errors = 0
+
+    def plan(self, rng):
+        steps = [cb.START_SEARCH.pack()]
+        for select, proceed, skip, key in FUNNEL:
+            if rng.random() < self.args.skip_rate:
+                steps.append(skip.pack())
+            else:
+                steps.append(select.pack(value=rng.choice(facet_values(key)), add=True))
+                steps.append(proceed.pack())
+        return steps
+
+    def update(self, user, message, data):
+        update_id = next(self.update_ids)
+        return Update(update_id=update_id, callback_query=CallbackQuery(
+            id=str(update_id), from_user=user, chat_instance=str(user.id), data=data, message=message,
+        ))
+
+    async def step(self, user, message, data):
+        counter = {}
+        query_token = query_counter.set(counter)
+        api_token = api_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            await app_bot.dp.feed_update(self.bot, self.update(user, message, data))
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Step {data} failed for user {user.id}: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            query_counter.reset(query_token)
+            api_counter.reset(api_token)
+        self.samples.setdefault(cb.decode(data)[0].legacy, []).append((elapsed, counter))
+        if self.args.think:
+            await asyncio.sleep(self.args.think / 1000)
+
+    async def walk(self, number):
+        rng = random.Random(number)
+        await asyncio.sleep(self.args.ramp * number / max(self.args.users, 1))
+        user = User(id=USER_ID_BASE + number, is_bot=False, first_name=f"{NAME_PREFIX}{number}")
+        chat = Chat(id=user.id, type='private')
+        message = Message(message_id=1, date=datetime.now(), chat=chat, text="Меню")
+
+        for data in self.plan(rng):
+            await self.step(user, message, data)
+
+        key = StorageKey(bot_id=self.bot.id, chat_id=chat.id, user_id=user.id)
+        if not (await app_bot.dp.storage.get_data(key)).get('keyset'):
+            self.empty_results += 1
+            return
+        for _ in range(self.args.pages):
+            await self.step(user, message, cb.NEXT_PAGE.pack())
+        keyset = (await app_bot.dp.storage.get_data(key)).get('keyset')
+        if keyset:
+            await self.step(user, message, cb.ADD_FAVORITE.pack(property_id=keyset[1]))
+
+    async def run(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self.walk(number) for number in range(self.args.users)))
+        elapsed = time.perf_counter() - started
+        # Даём фоновой предвыборке доработать, чтобы её вызовы попали в счётчики своих шагов
+        await asyncio.sleep(self.args.settle)
+        return elapsed
+
+    def report(self, elapsed):
+        rows = []
+        for label, samples in self.samples.items():
+            latencies = sorted(sample[0] * 1000 for sample in samples)
+            count = len(samples)
+            rows.append({
+                'step': label,
+                'count': count,
+                'p50_ms': round(percentile(latencies, 0.50), 2),
+                'p95_ms': round(percentile(latencies, 0.95), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'max_ms': round(latencies[-1], 2),
+                'api_per_step': round(sum(sample[1].get('api_calls', 0) for sample in samples) / count, 2),
+                'db_per_step': round(sum(sample[1].get('queries', 0) for sample in samples) / count, 2),
+            })
+        updates = sum(row['count'] for row in rows)
+        return {
+            'users': self.args.users,
+            'updates': updates,
+            'seconds': round(elapsed, 2),
+            'updates_per_second': round(updates / elapsed, 1) if elapsed else 0.0,
+            'errors': self.errors,
+            'empty_results': self.empty_results,
+            'steps': rows,
+            'db_pool': app_bot.db.pool_stats(),
+            'admission': app_bot.admission.stats(),
+            'album': app_bot.album_renderer.stats(),
+            'prefetch': app_bot.prefetcher.stats(),
+        }
+
+
+def print_report(report, api_calls):
+    print(f"{report['users']} users, {report['updates']} updates in {report['seconds']} s "
+          f"({report['updates_per_second']} updates/s), errors {report['errors']}, "
+          f"empty results {report['empty_results']}")
+    print(f"{'step':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'api/step':>10}"
+          f"{'db/step':>9}")
+    for row in report['steps']:
+        print(f"{row['step']:<28}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+              f"{row['max_ms']:>10}{row['api_per_step']:>10}{row['db_per_step']:>9}")
+    if api_calls:
+        print("Bot API calls: " + ", ".join(f"{method} {count}" for method, count in api_calls.most_common()))
+    for name in ('db_pool', 'admission', 'album', 'prefetch'):
+        print(f"{name}: {report[name]}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Search funnel load test")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--pages', type=int, default=5, help="next_page clicks per user")
+    parser.add_argument('--skip-rate', type=float, default=0.3, help="probability to skip each facet")
+    parser.add_argument('--ramp', type=float, default=0.0, help="seconds to start all users")
+    parser.add_argument('--think', type=float, default=0.0, help="milliseconds between a user's clicks")
+    parser.add_argument('--settle', type=float, default=1.0, help="seconds to wait for background tasks")
+    parser.add_argument('--seed', type=int, default=0, help="make sure this many test properties exist")
+    parser.add_argument('--database', help="database name instead of config.db_config['db']")
+    parser.add_argument('--api-url', help="external stub Bot API; by default one is started in-process")
+    parser.add_argument('--stub-port', type=int, default=8091)
+    parser.add_argument('--json', help="write the report to this file")
+    parser.add_argument('--cleanup', action='store_true', help="remove test data and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.database:
+        app_bot.db.db_config['db'] = args.database
+
+    if args.cleanup:
+        await app_bot.db.connect()
+        await cleanup(app_bot.db)
+        await app_bot.db.disconnect()
+        return
+
+    stub, runner, api_url = None, None, args.api_url
+    if api_url is None:
+        stub = StubTelegram()
+        runner = web.AppRunner(stub.build_app())
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', args.stub_port).start()
+        api_url = f"http://127.0.0.1:{args.stub_port}"
+
+    bot = Bot(token='42:loadtest', session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    bot.session.middleware(CountingRequestMiddleware())
+    try:
+        await app_bot.prepare_services()
+        if args.seed:
+            await seed(app_bot.db, args.seed, args.users)
+            # Каталог и кэш фото загружены до посева - перечитываем с новыми объектами
+            await app_bot.photo_cache.load()
+            await app_bot.catalog.load()
+        app_bot.setup_dispatcher()
+
+        load_test = LoadTest(bot, args)
+        report = load_test.report(await load_test.run())
+        print_report(report, stub.calls if stub else None)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2, default=str)
+    finally:
+        await bot.session.close()
+        if runner is not None:
+            await runner.cleanup()
+        await app_bot.db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
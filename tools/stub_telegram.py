@@ -0,0 +1,88 @@
+"""
+Заглушка Telegram Bot API для локальной проверки бота (webhook и нагрузочные прогоны).
+
+Отвечает на методы Bot API правдоподобными объектами и считает вызовы.
+Запуск:
+    python -m tools.stub_telegram --port 8081
+и в config.py: TELEGRAM_API_URL = 'http://127.0.0.1:8081'.
+"""
+import argparse
+import itertools
+import json
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}
+
+
+class StubTelegram:
+    def __init__(self):
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+
+    def _message(self, chat_id, **fields):
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id or 0), 'type': 'private'},
+            'from': BOT_USER,
+            **fields,
+        }
+
+    def _photo(self):
+        file_id = f"stub-file-{next(self._file_ids)}"
+        return [{'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 600}]
+
+    def result(self, method, params):
+        chat_id = params.get('chat_id')
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup'):
+            return self._message(chat_id, text=params.get('text', ''))
+        if method == 'sendMediaGroup':
+            media = json.loads(params.get('media', '[]'))
+            return [self._message(chat_id, photo=self._photo(), media_group_id='1') for _ in media]
+        if method == 'editMessageMedia':
+            return self._message(chat_id, photo=self._photo())
+        if method == 'getUpdates':
+            return []
+        return True
+
+    async def handle(self, request: web.Request):
+        method = request.match_info['method']
+        params = dict(await request.post())
+        self.calls[method] += 1
+        return web.json_response({'ok': True, 'result': self.result(method, params)})
+
+    async def stats(self, request: web.Request):
+        return web.json_response(dict(self.calls))
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+async def push_update(webhook_url, update, secret_token=None):
+    """Отправляет апдейт на webhook бота так же, как это делает Telegram."""
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret_token} if secret_token else {}
+    async with aiohttp.ClientSession() as session:
+        async with session.post(webhook_url, json=update, headers=headers) as response:
+            return response.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Telegram Bot API server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    web.run_app(StubTelegram().build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()